@@ -1,4 +1,10 @@
 import lgpio
+import argparse
+import asyncio
+import collections
+import heapq
+import os
+import re
 import time
 import threading
 import sys
@@ -18,14 +24,112 @@ from pins import *
 
 # --- Global Variables ---
 h = None  # Handle for the GPIO chip
-last_ir_send_time = 0
 IR_INTERVAL = 0.2  # 200ms in seconds
 
+# --- Sampling control (same ids as the generated Arduino firmware) ---
+CMD_STREAM_PERIOD = 10   # 10,<telemetry id>,<period ms>: set the period and resume
+CMD_STREAM_PAUSE = 11    # 11,<telemetry id>
+CMD_STREAM_RESUME = 12   # 12,<telemetry id>
+CMD_READ_NOW = 13        # 13,<telemetry id>: one reading now, sent before the ACK
+CMD_STREAM_DEADBAND = 14  # 14,<telemetry id>,<deadband x100>: only send moves beyond it (0 = every sample)
+CMD_STREAM_KEYFRAME = 15  # 15,<telemetry id>,<ms>: resend an unchanged value at least this often
+
+# telemetry id -> stream state; "read" is filled in once the sensor functions exist
+streams = {
+    40: {"period": IR_INTERVAL, "enabled": True, "read": None,
+         "deadband": 0.0, "keyframe": 5.0, "last_sent": None, "last_sent_at": 0.0},
+}
+stream_lock = threading.Lock()
+
+# Telemetry packets are "<id>,<value>,<t>;" with t the sample time in ms since
+# the driver started; samples due together go out as one line.
+SAMPLE_TIMESTAMPS = True
+BATCH_WINDOW = 0.002       # deadlines this close (s) are sampled in one wake-up
+JITTER_REPORT_INTERVAL = 60.0  # seconds between jitter reports (0 = never)
+JITTER_WINDOW = 1000       # lateness samples kept per stream
+START_TIME = time.monotonic()
+
+# --- Output ---
+# Protocol lines (replies and telemetry) go to stdout in stdio mode; in server
+# mode replies go to the client that sent the command and telemetry to every
+# subscribed client. Diagnostics always go to stderr, so they never interleave
+# with the protocol.
+telemetry_sink = None  # set by the server: called with each telemetry line
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+def send_reply(text):
+    print(text, flush=True)
+
+def send_telemetry(line):
+    if telemetry_sink is not None:
+        telemetry_sink(line)
+    else:
+        print(line, flush=True)
+
+SERVO_SETTLE = 0.5  # seconds the servo pulse is held before it is stopped
+
+class ActuatorScheduler:
+    """
+    Timer thread for the "stop" half of actuator commands. A command starts
+    its PWM and schedules the stop here, so it is acknowledged immediately and
+    the next command runs at once. Scheduling under a key that already has a
+    pending action replaces it: a second beep is not cut short by the first
+    one's stop.
+    """
+
+    def __init__(self):
+        self._heap = []      # (deadline, seq, key, action)
+        self._pending = {}   # key -> seq of its live entry
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="actuator-timers", daemon=True)
+        self._thread.start()
+
+    def schedule(self, key, delay, action):
+        with self._cond:
+            self._seq += 1
+            self._pending[key] = self._seq
+            heapq.heappush(self._heap, (time.monotonic() + delay, self._seq, key, action))
+            self._cond.notify()
+
+    def cancel(self, key):
+        with self._cond:
+            self._pending.pop(key, None)
+
+    def _next_due(self):
+        """Block until an action is due and return it (caller holds the condition)."""
+        while True:
+            if not self._heap:
+                self._cond.wait()
+                continue
+            deadline, seq, key, action = self._heap[0]
+            remaining = deadline - time.monotonic()
+            if remaining > 0:
+                self._cond.wait(remaining)
+                continue
+            heapq.heappop(self._heap)
+            if self._pending.get(key) == seq:  # not replaced or cancelled
+                del self._pending[key]
+                return action
+
+    def _run(self):
+        while True:
+            with self._cond:
+                action = self._next_due()
+            try:
+                action()
+            except Exception as e:
+                log(f"Scheduled actuator action failed: {e}")
+
+actuators = ActuatorScheduler()
+
 def setup():
     """
     Initializes GPIO using the lgpio library for Raspberry Pi 5.
     """
-    global h, last_ir_send_time
+    global h
 
     # Open the default GPIO chip (chip 0 on RPi 5)
     h = lgpio.gpiochip_open(0)
@@ -37,8 +141,8 @@ def setup():
     # The servo and buzzer pins are controlled via PWM functions,
     # which handle claiming the pins implicitly.
 
-    last_ir_send_time = time.time()
-    print("Setup complete using lgpio.")
+    streams[40]["read"] = ir_sensor_reading
+    log("Setup complete using lgpio.")
 
 def servo_write(angle):
     """
@@ -52,15 +156,14 @@ def servo_write(angle):
     pulse_width_us = int(500 + (angle / 180.0) * 2000)
 
     # Send the servo pulse. 50Hz is the standard frequency for servos.
-    if SERVO_PIN is not None:
-        lgpio.tx_servo(h, SERVO_PIN, pulse_width_us, 50)
-        print(f"Servo set to {angle} degrees (pulse width {pulse_width_us}us).")
-
-    # Allow time for the servo to move to the position
-    time.sleep(0.5)
+    if SERVO_PIN is None:
+        return
+    lgpio.tx_servo(h, SERVO_PIN, pulse_width_us, 50)
+    log(f"Servo set to {angle} degrees (pulse width {pulse_width_us}us).")
 
-    # Stop sending the PWM signal to prevent servo jitter and save power
-    lgpio.tx_servo(h, SERVO_PIN, 0, 50)
+    # Stop sending the PWM signal once the servo has had time to move, to
+    # prevent jitter and save power. A newer angle replaces the pending stop.
+    actuators.schedule("servo", SERVO_SETTLE, lambda: lgpio.tx_servo(h, SERVO_PIN, 0, 50))
 
 def ir_sensor_reading():
     """
@@ -75,6 +178,7 @@ def ir_sensor_reading():
 def buzzer_duration(duration_ms):
     """
     Turns on the buzzer for a specified duration using lgpio's PWM.
+    Returns at once; the stop is scheduled on the actuator timer.
     """
     if h is None: return
     frequency = 1000  # 1kHz
@@ -84,110 +188,449 @@ def buzzer_duration(duration_ms):
     if BUZZER_PIN is None:
         return
     lgpio.tx_pwm(h, BUZZER_PIN, frequency, duty_cycle)
-    time.sleep(duration_ms / 1000.0)
 
-    # Stop PWM signal (by setting duty cycle to 0)
-    lgpio.tx_pwm(h, BUZZER_PIN, frequency, 0)
-    print(f"Buzzer on for {duration_ms}ms.")
+    # Stop PWM signal (by setting duty cycle to 0) when the duration is up
+    actuators.schedule("buzzer", duration_ms / 1000.0, lambda: lgpio.tx_pwm(h, BUZZER_PIN, frequency, 0))
+    log(f"Buzzer on for {duration_ms}ms.")
 
 def led_on():
     """Turns the LED on."""
     if h is None: return
     if LED_PIN is None: return
     lgpio.gpio_write(h, LED_PIN, 1)
-    print("LED ON.")
+    log("LED ON.")
 
 def led_off():
     """Turns the LED off."""
     if h is None: return
     if LED_PIN is None: return
     lgpio.gpio_write(h, LED_PIN, 0)
-    print("LED OFF.")
+    log("LED OFF.")
 
-def process_command(cmd):
+def process_command(cmd, reply=None):
     """
-    Parses and executes a command received from standard input.
+    Parses and executes a command, sending its "A"/"E" reply through
+    `reply` (default: standard output).
     """
-    print(f"Processing command: '{cmd}'")
+    reply = reply or send_reply
+    log(f"Processing command: '{cmd}'")
     try:
-        command = 0
-        param = 0
-
-        # Split command and parameter if a comma is present
-        if ',' in cmd:
-            parts = cmd.split(',')
-            command = int(parts[0])
-            param = int(parts[1])
-        else:
-            command = int(cmd)
+        # "<command>[,<param>[,<param2>]]"
+        fields = [int(f) for f in cmd.rstrip(';').split(',')[:3]]
+        command = fields[0]
+        param = fields[1] if len(fields) > 1 else 0
+        param2 = fields[2] if len(fields) > 2 else 0
 
         # --- Command Handling ---
-        if command == 2:  # Piezo test
-            buzzer_duration(200)
-            print("A", flush=True)
+        if command == 2:  # Beep for <param> ms (200 if missing)
+            buzzer_duration(param if param > 0 else 200)
+            reply("A")
         elif command == 20:  # Servo write
             servo_write(param)
-            print("A", flush=True)
+            reply("A")
         elif command == 30:  # LED write
             if param == 1:
                 led_on()
             else:
                 led_off()
-            print("A", flush=True)
+            reply("A")
+        elif CMD_STREAM_PERIOD <= command <= CMD_STREAM_KEYFRAME:
+            reply("A" if sampling_command(command, param, param2) else "E")
         else:
-            print("E", flush=True) # Unknown command
-            print(f"Unknown command code: {command}")
+            reply("E") # Unknown command
+            log(f"Unknown command code: {command}")
 
     except (ValueError, IndexError) as e:
-        print("E", flush=True) # Malformed command
-        print(f"Error processing command '{cmd}': {e}")
+        reply("E") # Malformed command
+        log(f"Error processing command '{cmd}': {e}")
 
 
 def command_reader_thread():
     """
     A dedicated thread to read commands from standard input (e.g., SSH).
     """
-    print("\nReady for commands. Type a command and press Enter.")
+    log("\nReady for commands. Type a command and press Enter.")
     for line in sys.stdin:
         command = line.strip()
         if command:
             process_command(command)
 
+def sample_packet(telemetry_id, force=True):
+    """
+    Samples a stream and returns its "<id>,<value>[,<t>];" packet. Unless
+    forced, a value within the stream's deadband of the last sent one is
+    skipped ("" is returned) until its keyframe interval has passed. Returns
+    None for an unknown stream.
+    """
+    stream = streams.get(telemetry_id)
+    if stream is None or stream["read"] is None:
+        return None
+    value = stream["read"]()
+    now = time.monotonic()
+    with stream_lock:
+        if (not force and stream["deadband"] > 0 and stream["last_sent"] is not None
+                and abs(value - stream["last_sent"]) <= stream["deadband"]
+                and now - stream["last_sent_at"] < stream["keyframe"]):
+            return ""
+        stream["last_sent"] = value
+        stream["last_sent_at"] = now
+    if SAMPLE_TIMESTAMPS:
+        return f"{telemetry_id},{value},{int((now - START_TIME) * 1000)};"
+    return f"{telemetry_id},{value};"
+
+def report_sensor(telemetry_id, force=True):
+    """
+    Samples a stream and sends its packet at once (see sample_packet).
+    Returns False for an unknown stream.
+    """
+    packet = sample_packet(telemetry_id, force)
+    if packet is None:
+        return False
+    if packet:
+        send_telemetry(packet)
+    return True
+
+def sampling_command(command, telemetry_id, value):
+    """
+    Host-side control of the telemetry streams: set a period (and resume),
+    pause, resume, send one reading now, or set the deadband / keyframe interval.
+    """
+    if command == CMD_READ_NOW:
+        return report_sensor(telemetry_id)
+    with stream_lock:
+        stream = streams.get(telemetry_id)
+        if stream is None:
+            return False
+        if command == CMD_STREAM_PERIOD:
+            if value <= 0:
+                return False
+            stream["period"] = value / 1000.0
+            stream["enabled"] = True
+        elif command == CMD_STREAM_PAUSE:
+            stream["enabled"] = False
+        elif command == CMD_STREAM_RESUME:
+            stream["enabled"] = True
+        elif command == CMD_STREAM_DEADBAND:
+            if value < 0:
+                return False
+            stream["deadband"] = value / 100.0
+        elif command == CMD_STREAM_KEYFRAME:
+            if value <= 0:
+                return False
+            stream["keyframe"] = value / 1000.0
+    if command in (CMD_STREAM_PERIOD, CMD_STREAM_RESUME):
+        sensor_scheduler.reschedule(telemetry_id)
+    log(f"Stream {telemetry_id}: enabled={stream['enabled']} period={stream['period'] * 1000:.0f}ms "
+        f"deadband={stream['deadband']} keyframe={stream['keyframe']}s")
+    return True
+
+class SensorScheduler:
+    """
+    Periodic sampling of the telemetry streams, each at its own period.
+
+    Deadlines are absolute: a stream's next deadline is its previous one plus
+    its period, not "now" plus the period, so wake-up lateness does not add
+    up into drift. A stream that falls more than a period behind skips the
+    missed deadlines (counted as "missed") instead of bursting to catch up.
+    The thread sleeps until the earliest deadline, so it costs nothing while
+    idle. Streams due within BATCH_WINDOW of each other are sampled together
+    and written as a single line.
+
+    Lateness (wake-up time minus deadline) is kept per stream; jitter_stats()
+    summarises it and it is reported every JITTER_REPORT_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self._heap = []        # (deadline, telemetry id, generation)
+        self._generation = {}  # telemetry id -> generation of its live entry
+        self._cond = threading.Condition()
+        self._lateness = {}    # telemetry id -> recent lateness (s)
+        self._counts = {}      # telemetry id -> [samples, missed deadlines]
+
+    def reschedule(self, telemetry_id, first=None):
+        """(Re)start a stream's deadlines at `first` (default: one period from now)."""
+        with stream_lock:
+            stream = streams.get(telemetry_id)
+            if stream is None:
+                return
+            period = stream["period"]
+        if first is None:
+            first = time.monotonic() + period
+        with self._cond:
+            generation = self._generation.get(telemetry_id, 0) + 1
+            self._generation[telemetry_id] = generation
+            heapq.heappush(self._heap, (first, telemetry_id, generation))
+            self._cond.notify()
+
+    def _wait_due(self):
+        """Block until the earliest deadline and pop every live entry due by then."""
+        with self._cond:
+            while True:
+                while self._heap and self._heap[0][2] != self._generation.get(self._heap[0][1]):
+                    heapq.heappop(self._heap)  # replaced by a reschedule
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                now = time.monotonic()
+                remaining = self._heap[0][0] - now
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                due = []
+                while self._heap and self._heap[0][0] <= now + BATCH_WINDOW:
+                    entry = heapq.heappop(self._heap)
+                    if entry[2] == self._generation.get(entry[1]):
+                        due.append(entry)
+                return now, due
+
+    def _advance(self, deadline, telemetry_id, generation, now):
+        """Queue a stream's next deadline; a paused stream is dropped until it is resumed."""
+        with stream_lock:
+            stream = streams[telemetry_id]
+            enabled, period = stream["enabled"], stream["period"]
+        if not enabled:
+            return False
+        counts = self._counts.setdefault(telemetry_id, [0, 0])
+        counts[0] += 1
+        next_deadline = deadline + period
+        if next_deadline <= now:
+            missed = int((now - deadline) // period)
+            counts[1] += missed
+            next_deadline += missed * period
+        with self._cond:
+            if self._generation.get(telemetry_id) == generation:
+                heapq.heappush(self._heap, (next_deadline, telemetry_id, generation))
+        lateness = self._lateness.setdefault(telemetry_id, [])
+        lateness.append(max(0.0, now - deadline))
+        if len(lateness) > JITTER_WINDOW:
+            del lateness[:len(lateness) - JITTER_WINDOW]
+        return True
+
+    def jitter_stats(self):
+        """telemetry id -> sample count, missed deadlines and lateness p50 / p95 / max in ms."""
+        stats = {}
+        for telemetry_id, lateness in list(self._lateness.items()):
+            ordered = sorted(lateness)
+            if not ordered:
+                continue
+            samples, missed = self._counts.get(telemetry_id, (0, 0))
+            stats[telemetry_id] = {
+                "samples": samples,
+                "missed": missed,
+                "p50_ms": ordered[len(ordered) // 2] * 1000,
+                "p95_ms": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000,
+                "max_ms": ordered[-1] * 1000,
+            }
+        return stats
+
+    def report_jitter(self):
+        for telemetry_id, s in sorted(self.jitter_stats().items()):
+            log(f"Jitter {telemetry_id}: samples={s['samples']} missed={s['missed']} "
+                f"p50={s['p50_ms']:.2f}ms p95={s['p95_ms']:.2f}ms max={s['max_ms']:.2f}ms")
+
+    def run(self):
+        """Sample streams as they fall due, forever."""
+        start = time.monotonic()
+        for telemetry_id in list(streams):
+            self.reschedule(telemetry_id, first=start)
+        next_report = start + JITTER_REPORT_INTERVAL
+        while True:
+            now, due = self._wait_due()
+            batch = []
+            for deadline, telemetry_id, generation in due:
+                if self._advance(deadline, telemetry_id, generation, now):
+                    packet = sample_packet(telemetry_id, force=False)
+                    if packet:
+                        batch.append(packet)
+            if batch:
+                send_telemetry("".join(batch))
+            if JITTER_REPORT_INTERVAL and now >= next_report:
+                self.report_jitter()
+                next_report = now + JITTER_REPORT_INTERVAL
+
+sensor_scheduler = SensorScheduler()
+
 def main_loop():
     """
-    The main execution loop, responsible for periodically sending IR data.
+    The main execution loop, responsible for sending each enabled telemetry
+    stream at its configured period.
+    """
+    sensor_scheduler.run()
+
+# --- Server mode: Unix socket / TCP clients on one asyncio loop ---
+# Frames are the serial protocol's: the client sends "<command>[,<p1>[,<p2>]]"
+# terminated by ';' or a newline; the driver answers each command with an
+# "A" / "E" line on the same connection, in order, and writes telemetry lines
+# ("<id>,<value>,<t>;...") to every subscribed client.
+CMD_SUBSCRIBE = 18          # server mode: 18,<0|1> turns this client's telemetry off / on (default on)
+MAX_FRAME = 128             # bytes; a longer frame closes the connection
+CLIENT_TELEMETRY_LIMIT = 256  # telemetry lines queued per client; a slow client loses the oldest
+CLIENT_REPLY_LIMIT = 64     # unsent replies before a client's commands stop being read
+FRAME_DELIMITER = re.compile(rb"[;\n]")
+
+class Client:
+    """
+    One connection's outbox. Replies and telemetry queue separately so a slow
+    reader only ever loses telemetry (oldest first); replies are never dropped,
+    instead the client's commands are not read while too many are unsent.
+    Sequence numbers keep the two in the order they were produced.
     """
-    global last_ir_send_time
-    while True:
-        current_time = time.time()
-        # Check if it's time to send the IR reading
-        if current_time - last_ir_send_time >= IR_INTERVAL:
-            last_ir_send_time = current_time
-            ir_value = ir_sensor_reading()
 
-            # Construct and send the message to standard output
-            #message = f"40,{ir_value}"
-            #print(message, flush=True)
+    def __init__(self, writer, name):
+        self.writer = writer
+        self.name = name
+        self.subscribed = True
+        self.replies = collections.deque()
+        self.telemetry = collections.deque(maxlen=CLIENT_TELEMETRY_LIMIT)
+        self.dropped = 0
+        self._seq = 0
+        self._ready = asyncio.Event()
+        self._room = asyncio.Event()
+        self._room.set()
 
-        time.sleep(0.05)
+    def push(self, line, telemetry=False):
+        if telemetry:
+            if not self.subscribed:
+                return
+            if len(self.telemetry) == self.telemetry.maxlen:
+                self.dropped += 1
+            queue = self.telemetry
+        else:
+            queue = self.replies
+            if len(self.replies) >= CLIENT_REPLY_LIMIT:
+                self._room.clear()
+        self._seq += 1
+        queue.append((self._seq, (line + "\n").encode()))
+        self._ready.set()
+
+    async def wait_for_room(self):
+        await self._room.wait()
+
+    async def write_loop(self):
+        try:
+            while True:
+                await self._ready.wait()
+                while self.replies or self.telemetry:
+                    if self.replies and (not self.telemetry or self.replies[0][0] < self.telemetry[0][0]):
+                        self.writer.write(self.replies.popleft()[1])
+                    else:
+                        self.writer.write(self.telemetry.popleft()[1])
+                self._ready.clear()
+                await self.writer.drain()  # the socket's own backpressure
+                self._room.set()
+        except ConnectionError:
+            pass
+
+class DriverServer:
+    def __init__(self):
+        self.clients = set()
+        self.loop = None
+        self._loop_thread = None
+
+    def broadcast(self, line):
+        """Telemetry sink: safe to call from the sampling thread."""
+        if threading.get_ident() == self._loop_thread:
+            self._fan_out(line)  # e.g. a read-now packet, which must precede its ACK
+        else:
+            self.loop.call_soon_threadsafe(self._fan_out, line)
+
+    def _fan_out(self, line):
+        for client in self.clients:
+            client.push(line, telemetry=True)
+
+    def _handle(self, client, cmd):
+        if cmd.split(",", 1)[0].strip() == str(CMD_SUBSCRIBE):
+            value = cmd.split(",", 1)[1].strip() if "," in cmd else ""
+            if value in ("0", "1"):
+                client.subscribed = value == "1"
+                if not client.subscribed:
+                    client.telemetry.clear()
+                client.push("A")
+            else:
+                client.push("E")
+            return
+        process_command(cmd, reply=client.push)
+
+    async def _serve_client(self, reader, writer):
+        peer = writer.get_extra_info("peername") or "unix"
+        client = Client(writer, str(peer))
+        self.clients.add(client)
+        log(f"Client connected: {client.name}")
+        writer_task = asyncio.create_task(client.write_loop())
+        buffer = b""
+        try:
+            while True:
+                data = await reader.read(1024)
+                if not data:
+                    break
+                *frames, buffer = FRAME_DELIMITER.split(buffer + data)
+                if len(buffer) > MAX_FRAME:
+                    log(f"Client {client.name}: frame too long, closing")
+                    break
+                for frame in frames:
+                    cmd = frame.decode("utf-8", errors="replace").strip()
+                    if cmd:
+                        await client.wait_for_room()
+                        self._handle(client, cmd)
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(client)
+            writer_task.cancel()
+            writer.close()
+            log(f"Client disconnected: {client.name} (telemetry dropped: {client.dropped})")
+
+    async def serve(self, addresses):
+        global telemetry_sink
+        self.loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        telemetry_sink = self.broadcast
+        servers = []
+        for address in addresses:
+            if address.startswith("unix:"):
+                path = address[len("unix:"):]
+                if os.path.exists(path):
+                    os.unlink(path)
+                servers.append(await asyncio.start_unix_server(self._serve_client, path=path))
+            else:
+                host, _, port = address.removeprefix("tcp:").rpartition(":")
+                servers.append(await asyncio.start_server(self._serve_client, host or None, int(port)))
+            log(f"Listening on {address}")
+        # sampling starts once telemetry has somewhere to go
+        threading.Thread(target=main_loop, name="sensor-scheduler", daemon=True).start()
+        await asyncio.gather(*(server.serve_forever() for server in servers))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Raspberry Pi device driver (stdio or socket server).")
+    parser.add_argument("--listen", action="append", metavar="ADDRESS",
+                        help="serve clients instead of stdin/stdout: unix:/path/driver.sock or "
+                             "tcp:[host]:port (repeatable)")
+    return parser.parse_args(argv)
 
 
 if __name__ == '__main__':
+    args = parse_args()
     try:
         setup()
-        # Start the command reader in its own thread
-        reader = threading.Thread(target=command_reader_thread, daemon=True)
-        reader.start()
-        print("Starting main loop...")
-        main_loop()
+        if args.listen:
+            asyncio.run(DriverServer().serve(args.listen))
+        else:
+            # Start the command reader in its own thread
+            reader = threading.Thread(target=command_reader_thread, daemon=True)
+            reader.start()
+            log("Starting main loop...")
+            main_loop()
     except KeyboardInterrupt:
-        print("\nProgram interrupted. Cleaning up...")
+        log("\nProgram interrupted. Cleaning up...")
     except Exception as e:
-        print(f"An error occurred: {e}")
+        log(f"An error occurred: {e}")
     finally:
         # This cleanup is crucial to release GPIO resources.
         if h:
-            # Explicitly stop any running PWM signals
+            # Explicitly stop any running PWM signals (pending timed stops are dropped)
+            actuators.cancel("buzzer")
+            actuators.cancel("servo")
             if BUZZER_PIN is not None:
                 lgpio.tx_pwm(h, BUZZER_PIN, 1000, 0)
             if SERVO_PIN is not None:
@@ -195,4 +638,4 @@ if __name__ == '__main__':
 
             # Close the GPIO chip handle, which releases all claimed resources
             lgpio.gpiochip_close(h)
-            print("GPIO cleaned up. Exiting.")
\ No newline at end of file
+            log("GPIO cleaned up. Exiting.")
\ No newline at end of file
@@ -0,0 +1,71 @@
+# driver_jitter.py
+"""
+Sampling jitter harness for driver.py's sensor scheduler, runnable off the Pi.
+
+Loads the driver against the mocked lgpio of driver_latency.py, adds a few
+fake streams at different periods, runs the scheduler for a while and
+reports, per stream: samples sent against the count the period predicts
+(drift shows up as a shortfall), missed deadlines and wake-up lateness
+(p50 / p95 / max). Also prints the output lines written (one per batch) and
+the CPU time the process used per wall-clock second.
+
+    python driver_jitter.py --seconds 10
+"""
+
+import argparse
+import threading
+import time
+
+from driver_latency import load_driver
+
+# telemetry id -> period (s); 40 is the driver's own IR stream
+PERIODS = {40: 0.2, 50: 1.0, 60: 0.05, 70: 0.1}
+
+
+class LineCapture:
+    """Replaces print() in the driver module and counts telemetry lines and packets."""
+
+    def __init__(self):
+        self.lines = 0
+        self.packets = {}
+
+    def __call__(self, *args, **kwargs):
+        if not args or ";" not in str(args[0]):
+            return
+        self.lines += 1
+        for packet in str(args[0]).split(";")[:-1]:
+            telemetry_id = int(packet.split(",", 1)[0])
+            self.packets[telemetry_id] = self.packets.get(telemetry_id, 0) + 1
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    driver, _ = load_driver()
+    capture = LineCapture()
+    driver.print = capture
+    driver.JITTER_REPORT_INTERVAL = 0
+    driver.setup()
+    for telemetry_id, period in PERIODS.items():
+        stream = driver.streams.setdefault(telemetry_id, dict(driver.streams[40], read=lambda: 0))
+        stream["period"] = period
+
+    cpu0, wall0 = time.process_time(), time.monotonic()
+    threading.Thread(target=driver.main_loop, daemon=True).start()
+    time.sleep(args.seconds)
+    cpu, wall = time.process_time() - cpu0, time.monotonic() - wall0
+
+    print(f"{'stream':>6}{'period ms':>11}{'sent':>7}{'expected':>10}{'missed':>8}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+    for telemetry_id, s in sorted(driver.sensor_scheduler.jitter_stats().items()):
+        period = PERIODS[telemetry_id]
+        print(f"{telemetry_id:>6}{period * 1000:>11.0f}{capture.packets.get(telemetry_id, 0):>7}"
+              f"{int(wall / period) + 1:>10}{s['missed']:>8}"
+              f"{s['p50_ms']:>9.3f}{s['p95_ms']:>9.3f}{s['max_ms']:>9.3f}")
+    print(f"lines written: {capture.lines}   CPU: {cpu / wall * 1000:.1f} ms/s")
+
+
+if __name__ == "__main__":
+    main()
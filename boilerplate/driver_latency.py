@@ -0,0 +1,163 @@
+# driver_latency.py
+"""
+Command-to-ACK latency harness for driver.py, runnable off the Pi.
+
+Loads driver.py against a mocked lgpio (every call is recorded with its
+time) and a fixed pins module, then feeds command sequences through
+process_command() and measures, per command, the time from the call to its
+"A"/"E" line. It also checks the actuator timers: the scheduled buzzer and
+servo stops must land at their deadline, and a later command to another
+actuator must not wait for an earlier one to finish.
+
+    python driver_latency.py --rounds 50
+"""
+
+import argparse
+import statistics
+import sys
+import time
+import types
+
+BUZZER_PIN = 18
+SERVO_PIN = 12
+LED_PIN = 17
+
+SEQUENCES = {
+    # a long beep followed at once by other actuators
+    "beep-then-others": ["2,500", "30,1", "20,90", "30,0"],
+    # servo sweep: each angle replaces the previous pending stop
+    "servo-sweep": ["20,0", "20,45", "20,90", "20,135", "20,180"],
+    # back-to-back beeps: the last one's duration wins
+    "beep-retrigger": ["2,300", "2,300", "2,100"],
+}
+
+
+class FakeLgpio(types.ModuleType):
+    """Stands in for lgpio; records (time, call, args) for every call."""
+
+    def __init__(self):
+        super().__init__("lgpio")
+        self.calls = []
+
+    def _record(self, name, *args):
+        self.calls.append((time.perf_counter(), name, args))
+
+    def gpiochip_open(self, chip):
+        self._record("gpiochip_open", chip)
+        return 1
+
+    def gpiochip_close(self, h):
+        self._record("gpiochip_close", h)
+
+    def gpio_claim_output(self, h, pin):
+        self._record("gpio_claim_output", pin)
+
+    def gpio_write(self, h, pin, level):
+        self._record("gpio_write", pin, level)
+
+    def tx_pwm(self, h, pin, frequency, duty_cycle):
+        self._record("tx_pwm", pin, frequency, duty_cycle)
+
+    def tx_servo(self, h, pin, pulse_width, frequency):
+        self._record("tx_servo", pin, pulse_width, frequency)
+
+
+def load_driver():
+    """Import driver.py with the fake lgpio and pins modules in place."""
+    lgpio = FakeLgpio()
+    pins = types.ModuleType("pins")
+    pins.BUZZER_PIN, pins.SERVO_PIN, pins.LED_PIN = BUZZER_PIN, SERVO_PIN, LED_PIN
+    sys.modules["lgpio"] = lgpio
+    sys.modules["pins"] = pins
+    import driver
+    return driver, lgpio
+
+
+class AckCapture:
+    """Replaces print() in the driver module and timestamps every ACK line."""
+
+    def __init__(self):
+        self.acks = []
+
+    def __call__(self, *args, **kwargs):
+        if len(args) == 1 and args[0] in ("A", "E"):
+            self.acks.append((time.perf_counter(), args[0]))
+
+
+def run_sequence(driver, commands):
+    """Latencies (s) of one back-to-back run, and the call time of each command."""
+    capture = AckCapture()
+    driver.print = capture
+    latencies, started = [], []
+    for cmd in commands:
+        before = len(capture.acks)
+        t0 = time.perf_counter()
+        driver.process_command(cmd)
+        started.append(t0)
+        if len(capture.acks) > before:
+            latencies.append(capture.acks[before][0] - t0)
+    return latencies, started
+
+
+def stop_errors(lgpio, since, expected):
+    """
+    Error (s) of the first stop call made after `since` against the expected
+    time of the last one: negative when a replaced stop still fired early.
+    `expected` maps (call, pin) -> expected stop time.
+    """
+    errors = []
+    for (name, pin), due in expected.items():
+        stops = [t for t, n, args in lgpio.calls
+                 if t >= since and n == name and args[0] == pin and args[-2 if n == "tx_servo" else -1] == 0]
+        if stops:
+            errors.append(stops[0] - due)
+    return errors
+
+
+def expected_stops(driver, commands, started):
+    """When the last buzzer and servo stop of a sequence should happen."""
+    expected = {}
+    for cmd, t0 in zip(commands, started):
+        fields = [int(f) for f in cmd.split(",")]
+        if fields[0] == 2:
+            ms = fields[1] if len(fields) > 1 and fields[1] > 0 else 200
+            expected[("tx_pwm", BUZZER_PIN)] = t0 + ms / 1000.0
+        elif fields[0] == 20:
+            expected[("tx_servo", SERVO_PIN)] = t0 + driver.SERVO_SETTLE
+    return expected
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=20, help="runs of each sequence")
+    args = parser.parse_args(argv)
+
+    driver, lgpio = load_driver()
+    driver.print = AckCapture()
+    driver.setup()
+
+    print(f"{'sequence':<18}{'acks':>6}{'p50 us':>9}{'p95 us':>9}{'max us':>9}{'stop err ms':>14}{'stops':>7}")
+    for name, commands in SEQUENCES.items():
+        latencies, errors, stops = [], [], 0
+        for _ in range(args.rounds):
+            since = time.perf_counter()
+            lat, started = run_sequence(driver, commands)
+            latencies.extend(lat)
+            expected = expected_stops(driver, commands, started)
+            # wait for the last stop to fire before checking it
+            time.sleep(max(expected.values()) - time.perf_counter() + 0.05 if expected else 0)
+            errors.extend(stop_errors(lgpio, since, expected))
+            stops += len(expected)
+        latencies.sort()
+        late = max(errors, key=abs) * 1000 if errors else float("nan")
+        print(f"{name:<18}{len(latencies):>6}{statistics.median(latencies) * 1e6:>9.1f}"
+              f"{percentile(latencies, 0.95) * 1e6:>9.1f}{latencies[-1] * 1e6:>9.1f}"
+              f"{late:>14.2f}{f'{len(errors)}/{stops}':>7}")
+
+
+if __name__ == "__main__":
+    main()
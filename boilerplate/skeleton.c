@@ -0,0 +1,79 @@
+{{includes}}
+
+{{globals}}
+
+#define BASE_BAUD 9600
+#define BAUD_SWITCH_WINDOW_MS 1000  // an unverified baud switch reverts to BASE_BAUD after this
+unsigned long baudSwitchedAt = 0;   // millis() of the unverified switch, 0 = none
+
+void setup() {
+  Serial.begin(BASE_BAUD);
+{{setup}}
+}
+
+{{functions}}
+
+// ---- Command handling: "<command>[,<param>[,<param2>]];" -> "A" (done) / "E" (unknown) ----
+void dispatch(int command, long param, long param2) {
+  switch (command) {
+{{commands}}
+    case 16:  // link: switch to <param> baud (confirmed by a ping at the new rate)
+      if (param != 9600 && param != 115200 && param != 250000 && param != 1000000) {
+        Serial.println("E");
+        return;
+      }
+      Serial.println("A");
+      Serial.flush();
+      Serial.end();
+      Serial.begin(param);
+      baudSwitchedAt = millis() | 1;
+      return;
+    case 17:  // link: ping, echoes "P<param>" and confirms a baud switch
+      baudSwitchedAt = 0;
+      Serial.print('P');
+      Serial.println(param);
+      return;
+    default:
+      Serial.println("E");
+      return;
+  }
+  Serial.println("A");
+}
+
+void loop() {
+  // Commands are parsed as the bytes arrive: no line buffer, no atoi
+  static int command = 0;
+  static long params[2] = {0, 0};
+  static byte field = 0;  // 0 = command, 1 = param, 2 = param2
+  static bool negative = false;
+
+  while (Serial.available() > 0) {
+    char c = (char)Serial.read();
+    if (c >= '0' && c <= '9') {
+      if (field == 0) command = command * 10 + (c - '0');
+      else params[field - 1] = params[field - 1] * 10 + (c - '0');
+    } else if (c == '-' && field > 0) {
+      negative = true;
+    } else if (c == ',' || c == ';') {
+      if (negative) params[field - 1] = -params[field - 1];
+      negative = false;
+      if (c == ',') {
+        if (field < 2) field++;
+      } else {
+        dispatch(command, params[0], params[1]);
+        command = 0;
+        params[0] = 0;
+        params[1] = 0;
+        field = 0;
+      }
+    }
+  }
+
+  if (baudSwitchedAt && millis() - baudSwitchedAt >= BAUD_SWITCH_WINDOW_MS) {
+    Serial.end();
+    Serial.begin(BASE_BAUD);
+    baudSwitchedAt = 0;
+  }
+
+{{streams}}
+}
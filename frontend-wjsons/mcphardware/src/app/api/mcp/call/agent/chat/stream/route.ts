@@ -0,0 +1,27 @@
+export const dynamic = 'force-dynamic';
+
+// Pass-through of the agent's Server-Sent Events chat stream.
+export async function POST(req: Request) {
+  const body = await req.text();
+  const res = await fetch("http://localhost:5057/agent/chat/stream", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body,
+    signal: req.signal,
+  });
+
+  if (!res.ok || !res.body) {
+    return new Response(JSON.stringify({ error: await res.text() }), {
+      status: res.status || 502,
+      headers: { "content-type": "application/json" },
+    });
+  }
+
+  return new Response(res.body, {
+    headers: {
+      "content-type": "text/event-stream",
+      "cache-control": "no-cache, no-transform",
+      connection: "keep-alive",
+    },
+  });
+}
@@ -0,0 +1,30 @@
+import { NextResponse } from 'next/server';
+
+const base = (process.env.NEXT_PUBLIC_MAPPING_REGISTRY_BASE || '').replace(/\/$/,'');
+
+export const dynamic = 'force-dynamic';
+
+// Pass-through of the registry's Server-Sent Events mapping change stream.
+export async function GET(req: Request) {
+  if (!base) return NextResponse.json({ error: 'NEXT_PUBLIC_MAPPING_REGISTRY_BASE not set' }, { status: 500 });
+  const { searchParams } = new URL(req.url);
+  const since = searchParams.get('since');
+  const lastEventId = req.headers.get('last-event-id');
+
+  const r = await fetch(`${base}/mappings/stream${since ? `?since=${encodeURIComponent(since)}` : ''}`, {
+    cache: 'no-store',
+    headers: lastEventId ? { 'last-event-id': lastEventId } : {},
+    signal: req.signal,
+  });
+  if (!r.ok || !r.body) {
+    return NextResponse.json({ error: 'Upstream stream unavailable' }, { status: r.status || 502 });
+  }
+
+  return new Response(r.body, {
+    headers: {
+      'content-type': 'text/event-stream',
+      'cache-control': 'no-cache, no-transform',
+      connection: 'keep-alive',
+    },
+  });
+}
@@ -1,10 +1,23 @@
 'use client';
 import { useRef, useState } from 'react';
 import type { Tool } from '@/lib/api';
-import { jsonFetch } from '@/lib/api';
+import { readSSE } from '@/lib/api';
 import { Send } from 'lucide-react';
 import type { Mapping } from '@/types/mapping';
 
+// The agent keeps history, a token budget and a lock per session_id, so each
+// browser tab gets its own conversation (kept across reloads of that tab).
+const SESSION_KEY = 'hardware_chat_session';
+
+function tabSessionId(): string {
+  let id = sessionStorage.getItem(SESSION_KEY);
+  if (!id) {
+    id = `hardware_chat_${crypto.randomUUID()}`;
+    sessionStorage.setItem(SESSION_KEY, id);
+  }
+  return id;
+}
+
 export default function CommandChat({
   tools,
   callUrl,
@@ -67,16 +80,38 @@ export default function CommandChat({
 
       const contextualQuery = `${q}${hardwareContext}${availableTools}`;
 
-      // Call the Anthropic agent
-      const response = await jsonFetch<{ reply: string }>('/api/mcp/call/agent/chat', {
+      // Stream the Anthropic agent's reply: tokens as they arrive, plus tool progress
+      const res = await fetch('/api/mcp/call/agent/chat/stream', {
         method: 'POST',
+        headers: { 'content-type': 'application/json' },
         body: JSON.stringify({ 
           text: contextualQuery,
-          session_id: 'hardware_chat'
+          session_id: tabSessionId()
         })
       });
+      if (!res.ok) throw new Error(`${res.status} ${res.statusText}`);
+
+      let streamed = '';
+      let status = '';
+      let reply = '';
+      for await (const { event, data } of readSSE(res)) {
+        if (event === 'token') {
+          streamed += data.text;
+          updateLastMessage(streamed + status, true);
+        } else if (event === 'tool_start') {
+          status = `\n[running ${data.name}…]`;
+          updateLastMessage(streamed + status, true);
+        } else if (event === 'tool_end') {
+          status = `\n[${data.name} ${data.ok ? 'done' : 'failed'} in ${Math.round(data.ms)} ms]`;
+          updateLastMessage(streamed + status, true);
+        } else if (event === 'message') {
+          reply = data.reply;
+        } else if (event === 'error') {
+          throw new Error(data.detail || 'Agent error');
+        }
+      }
 
-      updateLastMessage(response.reply || 'I received your message but couldn\'t generate a response.');
+      updateLastMessage(reply || streamed || 'I received your message but couldn\'t generate a response.');
 
     } catch (err: any) {
       console.error('Agent error:', err);
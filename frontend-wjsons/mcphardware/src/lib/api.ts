@@ -10,4 +10,34 @@ name: string;
 description?: string;
 input_schema?: any;
 scopes?: string[];
-};
\ No newline at end of file
+};
+
+
+export type SSEEvent = { event: string; data: any };
+
+// Read a text/event-stream response body and yield parsed events.
+export async function* readSSE(res: Response): AsyncGenerator<SSEEvent> {
+if (!res.body) return;
+const reader = res.body.getReader();
+const decoder = new TextDecoder();
+let buf = '';
+while (true) {
+  const { value, done } = await reader.read();
+  if (done) break;
+  buf += decoder.decode(value, { stream: true });
+  let sep;
+  while ((sep = buf.indexOf('\n\n')) >= 0) {
+    const frame = buf.slice(0, sep);
+    buf = buf.slice(sep + 2);
+    let event = 'message';
+    const data: string[] = [];
+    for (const line of frame.split('\n')) {
+      if (line.startsWith('event:')) event = line.slice(6).trim();
+      else if (line.startsWith('data:')) data.push(line.slice(5).trimStart());
+    }
+    if (!data.length) continue;
+    try { yield { event, data: JSON.parse(data.join('\n')) }; }
+    catch { yield { event, data: data.join('\n') }; }
+  }
+}
+}
@@ -0,0 +1,206 @@
+# agent_bench.py
+"""
+Offline benchmark of the agent loops, with per-stage latency breakdowns.
+
+Runs against fake_anthropic.py (scripted tool_use/text replies, or a
+recorded cassette) and the hardware-free fake_mcp_server.py, so it needs no
+API key, network or board:
+
+  registry  drives POST /agent/chat of a spawned registry server and reads
+            the stage timings from GET /agent/metrics
+  agent     runs real_copy_of_server/agent.py's run_conversation() in this
+            process and reads its stage_timer directly
+
+    python bench/agent_bench.py --target both --concurrency 16 --requests 200
+    python bench/agent_bench.py --backend record --cassette bench/cassette.jsonl   # real API, needs ANTHROPIC_API_KEY
+    python bench/agent_bench.py --backend replay --cassette bench/cassette.jsonl
+
+Stages: format_tools_for_claude, serialize_tool_result(_for_claude),
+normalize_mcp_result, mcp_call_tool / mcp_read_resource (MCP round trips),
+llm_call, tool_round, and the whole turn (agent_turn / conversation).
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from loadtest_chat import BENCH_DIR, REGISTRY_DIR, percentile, spawn, wait_until_up
+
+sys.path.insert(0, str(REGISTRY_DIR))
+from stage_timing import format_table  # noqa: E402  (identical to agent.py's copy; see golden/check_golden.py)
+
+AGENT_DIR = REGISTRY_DIR.parent.parent / "real_copy_of_server"
+DEFAULT_PROMPTS = [
+    "What's the temperature in here?",
+    "Point the servo at the door.",
+    "Run the demo: check the temperature, beep and move the servo.",
+]
+
+
+def print_report(title: str, latencies: List[float], errors: int, elapsed: float, stages: Dict[str, Any],
+                 fake_stats: Dict[str, Any]) -> None:
+    total = len(latencies)
+    print(f"\n{title}")
+    print(f"  throughput   {total / elapsed if elapsed else 0.0:8.1f} conv/s  ({elapsed:.2f} s, {errors} errors)")
+    print(f"  end-to-end   p50 {percentile(latencies, 50) * 1000:7.1f} ms   p95 {percentile(latencies, 95) * 1000:7.1f} ms")
+    calls = fake_stats.get("calls") or 0
+    if calls:
+        print(f"  model calls  {calls}  (~{fake_stats.get('input_tokens', 0) / calls:.0f} prompt tokens per call)")
+    print(format_table(stages))
+
+
+async def fake_stats(fake_url: str, reset_from: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    async with httpx.AsyncClient(timeout=5.0) as client:
+        stats = (await client.get(f"{fake_url}/stats")).json()
+    if reset_from:
+        stats = {k: v - reset_from.get(k, 0) for k, v in stats.items()}
+    return stats
+
+
+async def drive(concurrency: int, total: int, one) -> tuple:
+    """Run `one(i)` for i in range(total) with `concurrency` workers; returns (latencies, errors, elapsed)."""
+    latencies: List[float] = []
+    errors = 0
+    next_i = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in next_i:
+            t0 = time.perf_counter()
+            try:
+                await one(i)
+            except Exception as e:
+                errors += 1
+                if errors == 1:
+                    print(f"  first error: {e}")
+            latencies.append(time.perf_counter() - t0)
+
+    t_start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - t_start
+
+
+# ---------------------------------------------------------------
+# Targets
+# ---------------------------------------------------------------
+async def bench_registry(args, fake_url: str, env: dict, procs: List[subprocess.Popen]) -> None:
+    env = dict(env)
+    env.update({
+        "ANTHROPIC_BASE_URL": fake_url,
+        "MCP_SERVER": str(BENCH_DIR / "fake_mcp_server.py"),
+        "FAST_PATH_ENABLED": "0",  # measure the Claude loop, not the shortcut
+        "LLM_MAX_CONCURRENCY": env.get("LLM_MAX_CONCURRENCY", str(args.concurrency)),
+    })
+    procs.append(spawn(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(args.registry_port), "--log-level", "warning"],
+        REGISTRY_DIR, env,
+    ))
+    base = f"http://127.0.0.1:{args.registry_port}"
+    await wait_until_up(f"{base}/health")
+
+    limits = httpx.Limits(max_connections=args.concurrency + 4, max_keepalive_connections=args.concurrency + 4)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=120.0) as client:
+        # first chat waits for the tool catalog cold start
+        await client.post("/agent/chat", json={"text": "warm up", "session_id": "bench-warmup"})
+        await client.delete("/agent/metrics/stages")
+        before = await fake_stats(fake_url)
+
+        async def one(i: int):
+            r = await client.post("/agent/chat", json={"text": args.prompts[i % len(args.prompts)],
+                                                       "session_id": f"bench-{i}"})
+            r.raise_for_status()
+
+        latencies, errors, elapsed = await drive(args.concurrency, args.requests, one)
+        stages = (await client.get("/agent/metrics")).json().get("stages", {})
+    print_report(f"registry /agent/chat: {args.requests} chats @ concurrency {args.concurrency}",
+                 latencies, errors, elapsed, stages, await fake_stats(fake_url, before))
+
+
+async def bench_agent(args, fake_url: str) -> None:
+    os.environ.setdefault("ANTHROPIC_API_KEY", "sk-fake-bench")
+    sys.path.insert(1, str(AGENT_DIR))
+    import anthropic
+    from fastmcp import Client
+
+    import agent
+    from stage_timing import stage_timer
+
+    # agent.py runs the sync client in worker threads; give every conversation one
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=args.concurrency + 4))
+    claude_client = anthropic.Anthropic(api_key=os.environ["ANTHROPIC_API_KEY"], base_url=fake_url)
+    mcp_client = Client(str(BENCH_DIR / "fake_mcp_server.py"))
+    async with mcp_client:
+        tools_payload, resource_tool_map = await agent.discover_tools(mcp_client, verbose=False)
+        before = await fake_stats(fake_url)
+        cache_totals = agent.new_cache_totals()
+
+        async def one(i: int):
+            await agent.run_conversation(mcp_client, claude_client, args.prompts[i % len(args.prompts)],
+                                         tools_payload, resource_tool_map, cache_totals, verbose=False)
+
+        latencies, errors, elapsed = await drive(args.concurrency, args.requests, one)
+    print_report(f"agent.py run_conversation: {args.requests} conversations @ concurrency {args.concurrency}",
+                 latencies, errors, elapsed, stage_timer.snapshot(), await fake_stats(fake_url, before))
+
+
+async def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=("registry", "agent", "both"), default="both")
+    parser.add_argument("--backend", choices=("script", "record", "replay"), default="script")
+    parser.add_argument("--script", default=str(BENCH_DIR / "scripts" / "hardware.json"))
+    parser.add_argument("--cassette", default=str(BENCH_DIR / "cassette.jsonl"))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="fake model latency per call")
+    parser.add_argument("--prompt", action="append", dest="prompts", help="chat text (repeatable)")
+    parser.add_argument("--registry-port", type=int, default=5157)
+    parser.add_argument("--fake-port", type=int, default=5199)
+    args = parser.parse_args(argv)
+    args.prompts = args.prompts or DEFAULT_PROMPTS
+
+    env = dict(os.environ)
+    env.update({
+        "FAKE_MODE": args.backend,
+        "FAKE_SCRIPT": str(Path(args.script).resolve()),
+        "FAKE_CASSETTE": str(Path(args.cassette).resolve()),
+        "FAKE_LATENCY_MS": str(args.latency_ms),
+        "FAKE_TOKEN_MS": "0",
+    })
+    if args.backend != "record":
+        env["ANTHROPIC_API_KEY"] = "sk-fake-bench"
+    elif not env.get("ANTHROPIC_API_KEY"):
+        parser.error("--backend record forwards to the real API and needs ANTHROPIC_API_KEY")
+    os.environ["ANTHROPIC_API_KEY"] = env["ANTHROPIC_API_KEY"]
+
+    procs: List[subprocess.Popen] = []
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    try:
+        procs.append(spawn(
+            [sys.executable, "-m", "uvicorn", "fake_anthropic:app", "--port", str(args.fake_port), "--log-level", "warning"],
+            BENCH_DIR, env,
+        ))
+        await wait_until_up(f"{fake_url}/stats")
+        if args.target in ("registry", "both"):
+            await bench_registry(args, fake_url, env, procs)
+        if args.target in ("agent", "both"):
+            await bench_agent(args, fake_url)
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            try:
+                p.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                p.kill()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,314 @@
+# fake_anthropic.py
+"""
+Minimal local stand-in for the Anthropic Messages API, for load tests and
+offline benchmarks.
+
+Returns a reply after a configurable latency, either as a single JSON message
+or (for `"stream": true`) as the same Server-Sent Events sequence the real
+API emits. Point the registry (or agent.py) at it with
+ANTHROPIC_BASE_URL=http://127.0.0.1:<port>.
+
+    python -m uvicorn fake_anthropic:app --port 5099
+
+Modes (FAKE_MODE):
+    script   (default) replies come from FAKE_SCRIPT, a JSON file of scenarios:
+                 [{"match": "temp", "steps": [
+                     {"tool_use": [{"name": "temp", "input": {}}]},
+                     {"text": "It is 23.5 C."}]}]
+             The first scenario whose `match` regex is found in the latest user
+             message is used; the step is the number of assistant rounds since
+             the last plain user message. A tool `name` that is not in the
+             request's tools is resolved to the first tool containing it, or
+             dropped if there is none.
+             Without a script every call answers "ok (fake reply)".
+    record   forwards each call to FAKE_UPSTREAM (default the real API, using
+             the caller's x-api-key) and appends request + response to
+             FAKE_CASSETTE (JSON lines).
+    replay   answers from FAKE_CASSETTE without network access. Requests are
+             matched exactly first, then by conversation shape (roles, block
+             types, tool names, first user message) so changing sensor values
+             in tool results still replay.
+
+Env:
+    FAKE_LATENCY_MS   simulated time to first token per call (default 300)
+    FAKE_TOKEN_MS     delay between streamed text deltas (default 5)
+    FAKE_ERROR_RATE   fraction of calls answered with 529 overloaded (default 0)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY_MS = float(os.getenv("FAKE_LATENCY_MS", "300"))
+TOKEN_MS = float(os.getenv("FAKE_TOKEN_MS", "5"))
+ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", "0"))
+MODE = os.getenv("FAKE_MODE", "script")
+SCRIPT_PATH = os.getenv("FAKE_SCRIPT")
+CASSETTE_PATH = os.getenv("FAKE_CASSETTE", "cassette.jsonl")
+UPSTREAM = os.getenv("FAKE_UPSTREAM", "https://api.anthropic.com")
+# forwarded to the upstream in record mode
+PASS_HEADERS = ("x-api-key", "authorization", "anthropic-version", "anthropic-beta")
+
+app = FastAPI(title="Fake Anthropic Messages API")
+stats = {"calls": 0, "errors": 0, "scripted": 0, "recorded": 0, "replayed": 0, "replay_misses": 0,
+         "input_tokens": 0}
+
+
+def estimate_input_tokens(body: Dict[str, Any]) -> int:
+    """~4 characters per token of everything the prompt carries, so prompt growth shows up in usage."""
+    prompt = {k: body.get(k) for k in ("system", "messages", "tools")}
+    return max(1, len(json.dumps(prompt, separators=(",", ":"), default=str)) // 4)
+
+
+def make_message(model: str, text: str, tool_uses: Optional[List[Dict[str, Any]]] = None,
+                 input_tokens: int = 10) -> Dict[str, Any]:
+    content: List[Dict[str, Any]] = [{"type": "text", "text": text}] if text else []
+    for tu in tool_uses or []:
+        content.append({"type": "tool_use", "id": f"toolu_fake_{uuid.uuid4().hex[:12]}",
+                        "name": tu["name"], "input": tu.get("input", {})})
+    return {
+        "id": f"msg_fake_{uuid.uuid4().hex[:12]}",
+        "type": "message",
+        "role": "assistant",
+        "model": model,
+        "content": content,
+        "stop_reason": "tool_use" if tool_uses else "end_turn",
+        "stop_sequence": None,
+        "usage": {"input_tokens": input_tokens, "output_tokens": max(1, len(text.split()) + 10 * len(tool_uses or []))},
+    }
+
+
+# ---------------------------------------------------------------
+# Scripted replies
+# ---------------------------------------------------------------
+def load_script(path: Optional[str]) -> List[Dict[str, Any]]:
+    if not path:
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        scenarios = json.load(f)
+    for sc in scenarios:
+        sc["_re"] = re.compile(sc.get("match", ""), re.I)
+    return scenarios
+
+
+SCRIPT = load_script(SCRIPT_PATH)
+
+
+def _text_of(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    return " ".join(b.get("text", "") for b in content or [] if isinstance(b, dict) and b.get("type") == "text")
+
+
+def _is_plain_user(m: Dict[str, Any]) -> bool:
+    if m.get("role") != "user":
+        return False
+    content = m.get("content")
+    return not (isinstance(content, list)
+                and any(isinstance(b, dict) and b.get("type") == "tool_result" for b in content))
+
+
+def script_step(messages: List[Dict[str, Any]]) -> int:
+    """Assistant rounds since the last plain user message (consecutive assistant messages count once)."""
+    step, prev_assistant = 0, False
+    for m in messages:
+        if _is_plain_user(m):
+            step, prev_assistant = 0, False
+        elif m.get("role") == "assistant":
+            if not prev_assistant:
+                step += 1
+            prev_assistant = True
+        else:
+            prev_assistant = False
+    return step
+
+
+def _resolve_tool(name: str, tools: List[Dict[str, Any]]) -> Optional[str]:
+    names = [t.get("name", "") for t in tools or []]
+    if not names or name in names:
+        return name
+    return next((n for n in names if name.lower() in n.lower()), None)
+
+
+def scripted_reply(body: Dict[str, Any]) -> Dict[str, Any]:
+    messages = body.get("messages") or []
+    model = body.get("model", "fake")
+    tokens = estimate_input_tokens(body)
+    last = next((m for m in reversed(messages) if _is_plain_user(m)), None)
+    question = _text_of(last.get("content")) if last else ""
+    scenario = next((sc for sc in SCRIPT if sc["_re"].search(question)), None)
+    if scenario is None:
+        return make_message(model, "ok (fake reply)", input_tokens=tokens)
+
+    steps = scenario.get("steps") or []
+    step = script_step(messages)
+    if step >= len(steps) or (body.get("tool_choice") or {}).get("type") == "none":
+        return make_message(model, steps[-1].get("text", "done (fake)") if steps else "done (fake)", input_tokens=tokens)
+    spec = steps[step]
+    # tools the caller doesn't offer (e.g. resources in the registry) are skipped
+    tool_uses = []
+    for tu in spec.get("tool_use", []):
+        name = _resolve_tool(tu["name"], body.get("tools"))
+        if name is not None:
+            tool_uses.append(dict(tu, name=name))
+    stats["scripted"] += 1
+    return make_message(model, spec.get("text", "") or ("" if tool_uses else "done (fake)"), tool_uses,
+                        input_tokens=tokens)
+
+
+# ---------------------------------------------------------------
+# Cassettes
+# ---------------------------------------------------------------
+def _strip_cache_control(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return {k: _strip_cache_control(v) for k, v in obj.items() if k != "cache_control"}
+    if isinstance(obj, list):
+        return [_strip_cache_control(v) for v in obj]
+    return obj
+
+
+def exact_key(body: Dict[str, Any]) -> str:
+    request = {k: body.get(k) for k in ("model", "system", "messages", "tools", "tool_choice")}
+    canonical = json.dumps(_strip_cache_control(request), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def shape_key(body: Dict[str, Any]) -> str:
+    """Roles, block types and tool names of the conversation plus the first user message."""
+    messages = body.get("messages") or []
+    shape = []
+    for m in messages:
+        content = m.get("content")
+        if isinstance(content, str):
+            shape.append((m.get("role"), "text"))
+        else:
+            shape.append((m.get("role"), tuple(
+                f"{b.get('type')}:{b.get('name', '')}" for b in content or [] if isinstance(b, dict))))
+    first = next((m for m in messages if _is_plain_user(m)), None)
+    basis = json.dumps([_text_of(first.get("content")) if first else "", shape,
+                        sorted(t.get("name", "") for t in body.get("tools") or [])], default=str)
+    return hashlib.sha256(basis.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    def __init__(self, path: str):
+        self.path = path
+        self.exact: Dict[str, Dict[str, Any]] = {}
+        self.by_shape: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+
+    def _index(self, entry: Dict[str, Any]) -> None:
+        self.exact[entry["key"]] = entry["response"]
+        self.by_shape.setdefault(entry["shape"], entry["response"])
+
+    def lookup(self, body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return self.exact.get(exact_key(body)) or self.by_shape.get(shape_key(body))
+
+    def append(self, body: Dict[str, Any], response: Dict[str, Any]) -> None:
+        entry = {"key": exact_key(body), "shape": shape_key(body), "request": body, "response": response}
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, default=str) + "\n")
+        self._index(entry)
+
+
+cassette = Cassette(CASSETTE_PATH) if MODE in ("record", "replay") else None
+
+
+async def record_reply(request: Request, body: Dict[str, Any]):
+    """Forward to the real API (always non-streaming; streams are replayed locally) and record it."""
+    headers = {h: request.headers[h] for h in PASS_HEADERS if h in request.headers}
+    upstream_body = dict(body, stream=False)
+    async with httpx.AsyncClient(base_url=UPSTREAM, timeout=120.0) as client:
+        r = await client.post("/v1/messages", json=upstream_body, headers=headers)
+    if r.status_code != 200:
+        return JSONResponse(r.json(), status_code=r.status_code)
+    message = r.json()
+    cassette.append(body, message)
+    stats["recorded"] += 1
+    return message
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_message(message: Dict[str, Any]) -> AsyncIterator[str]:
+    """Replay a complete message as Messages API stream events."""
+    head = dict(message, content=[], stop_reason=None, usage=dict(message["usage"], output_tokens=0))
+    yield _sse("message_start", {"type": "message_start", "message": head})
+    for index, block in enumerate(message["content"]):
+        if block["type"] == "text":
+            yield _sse("content_block_start", {"type": "content_block_start", "index": index,
+                                               "content_block": {"type": "text", "text": ""}})
+            words = block["text"].split(" ")
+            for i, word in enumerate(words):
+                if TOKEN_MS:
+                    await asyncio.sleep(TOKEN_MS / 1000.0)
+                yield _sse("content_block_delta", {"type": "content_block_delta", "index": index,
+                                                   "delta": {"type": "text_delta", "text": word if i == 0 else " " + word}})
+        elif block["type"] == "tool_use":
+            yield _sse("content_block_start", {"type": "content_block_start", "index": index,
+                                               "content_block": dict(block, input={})})
+            yield _sse("content_block_delta", {"type": "content_block_delta", "index": index,
+                                               "delta": {"type": "input_json_delta", "partial_json": json.dumps(block["input"])}})
+        yield _sse("content_block_stop", {"type": "content_block_stop", "index": index})
+    yield _sse("message_delta", {"type": "message_delta",
+                                 "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+                                 "usage": {"output_tokens": message["usage"]["output_tokens"]}})
+    yield _sse("message_stop", {"type": "message_stop"})
+
+
+@app.post("/v1/messages")
+async def create_message(request: Request):
+    body = await request.json()
+    stats["calls"] += 1
+    if MODE != "record":
+        await asyncio.sleep(LATENCY_MS / 1000.0)
+
+    if ERROR_RATE and random.random() < ERROR_RATE:
+        stats["errors"] += 1
+        return JSONResponse(
+            {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded (fake)"}},
+            status_code=529,
+        )
+
+    stats["input_tokens"] += estimate_input_tokens(body)
+    if MODE == "record":
+        message = await record_reply(request, body)
+        if isinstance(message, JSONResponse):
+            stats["errors"] += 1
+            return message
+    elif MODE == "replay":
+        message = cassette.lookup(body)
+        if message is None:
+            stats["replay_misses"] += 1
+            return JSONResponse(
+                {"type": "error", "error": {"type": "invalid_request_error", "message": "No cassette entry for request"}},
+                status_code=400,
+            )
+        stats["replayed"] += 1
+        message = dict(message, usage=dict(message.get("usage") or {}))
+    else:
+        message = scripted_reply(body)
+
+    if body.get("stream"):
+        return StreamingResponse(stream_message(message), media_type="text/event-stream")
+    return message
+
+
+@app.get("/stats")
+def get_stats():
+    return stats
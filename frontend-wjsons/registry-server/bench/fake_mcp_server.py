@@ -0,0 +1,44 @@
+# fake_mcp_server.py
+"""
+Hardware-free MCP server exposing the same tool names as the real one, for
+load tests and benchmarks. Each tool (and the LM35 resource) sleeps
+FAKE_TOOL_LATENCY_MS to stand in for the serial round trip.
+
+Use as MCP_SERVER=<path to this file>.
+"""
+
+import asyncio
+import os
+import time
+
+from fastmcp import FastMCP
+
+TOOL_LATENCY_MS = float(os.getenv("FAKE_TOOL_LATENCY_MS", "20"))
+
+mcp = FastMCP("Fake Hardware MCP Server")
+
+
+@mcp.tool
+async def piezo_beep(duration: int = 500) -> dict:
+    """Beep the piezo buzzer for `duration` milliseconds."""
+    await asyncio.sleep(TOOL_LATENCY_MS / 1000.0)
+    return {"ok": True, "message": f"Sent beep for {duration}ms", "response": "A"}
+
+
+@mcp.tool
+async def control_servo(position: int) -> dict:
+    """Control servo motor position - position in degrees (0-180)."""
+    await asyncio.sleep(TOOL_LATENCY_MS / 1000.0)
+    return {"ok": True, "message": f"Servo set to {position} degrees", "position": position, "response": "A"}
+
+
+@mcp.resource("sensor://temp/LM35", mime_type="application/json")
+async def lm35_temperature() -> dict:
+    """Read LM35 temperature sensor (degrees Celsius)."""
+    await asyncio.sleep(TOOL_LATENCY_MS / 1000.0)
+    return {"sensor": "temp_lm35", "value": 23.5, "unit": "°C", "samples": 5,
+            "timestamp": time.time() - 0.2, "staleness_s": 0.2}
+
+
+if __name__ == "__main__":
+    mcp.run()
@@ -0,0 +1,175 @@
+# loadtest_chat.py
+"""
+Load test for /agent/chat against a local fake Anthropic endpoint.
+
+Starts fake_anthropic.py and the registry server (with the hardware-free
+fake_mcp_server.py as its MCP backend), fires --requests chats at
+--concurrency, and meanwhile probes /health to show the event loop stays
+responsive while LLM calls are in flight.
+
+    python bench/loadtest_chat.py --concurrency 50 --requests 500 --latency-ms 300
+
+Pass --registry-url to drive an already-running registry instead.
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import httpx
+
+BENCH_DIR = Path(__file__).resolve().parent
+REGISTRY_DIR = BENCH_DIR.parent
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+async def wait_until_up(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                r = await client.get(url, timeout=1.0)
+                if r.status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def spawn(args: List[str], cwd: Path, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(args, cwd=str(cwd), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def run_load(base: str, concurrency: int, total: int) -> dict:
+    latencies: List[float] = []
+    health: List[float] = []
+    errors = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+    done = asyncio.Event()
+
+    limits = httpx.Limits(max_connections=concurrency + 4, max_keepalive_connections=concurrency + 4)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=120.0) as client:
+
+        async def worker():
+            nonlocal errors
+            while True:
+                try:
+                    i = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                t0 = time.perf_counter()
+                try:
+                    r = await client.post("/agent/chat", json={"text": f"load test message {i}", "session_id": f"lt-{i}"})
+                    if r.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - t0)
+
+        async def health_probe():
+            while not done.is_set():
+                t0 = time.perf_counter()
+                try:
+                    await client.get("/health")
+                    health.append(time.perf_counter() - t0)
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.05)
+
+        probe = asyncio.create_task(health_probe())
+        t_start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t_start
+        done.set()
+        await probe
+
+    return {
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "rps": total / elapsed if elapsed else 0.0,
+        "chat_p50_ms": percentile(latencies, 50) * 1000,
+        "chat_p95_ms": percentile(latencies, 95) * 1000,
+        "health_p50_ms": percentile(health, 50) * 1000,
+        "health_p95_ms": percentile(health, 95) * 1000,
+        "health_max_ms": (max(health) if health else float("nan")) * 1000,
+        "health_samples": len(health),
+    }
+
+
+async def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="fake model latency per call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of fake 529 responses")
+    parser.add_argument("--registry-url", help="use an already-running registry server")
+    parser.add_argument("--registry-port", type=int, default=5157)
+    parser.add_argument("--fake-port", type=int, default=5199)
+    args = parser.parse_args(argv)
+
+    procs: List[subprocess.Popen] = []
+    base = args.registry_url
+    try:
+        if not base:
+            env = dict(os.environ)
+            env.update({
+                "FAKE_LATENCY_MS": str(args.latency_ms),
+                "FAKE_ERROR_RATE": str(args.error_rate),
+            })
+            procs.append(spawn(
+                [sys.executable, "-m", "uvicorn", "fake_anthropic:app", "--port", str(args.fake_port), "--log-level", "warning"],
+                BENCH_DIR, env,
+            ))
+            env.update({
+                "ANTHROPIC_API_KEY": "sk-fake-load-test",
+                "ANTHROPIC_BASE_URL": f"http://127.0.0.1:{args.fake_port}",
+                "MCP_SERVER": str(BENCH_DIR / "fake_mcp_server.py"),
+                "LLM_MAX_CONCURRENCY": env.get("LLM_MAX_CONCURRENCY", str(args.concurrency)),
+            })
+            procs.append(spawn(
+                [sys.executable, "-m", "uvicorn", "server:app", "--port", str(args.registry_port), "--log-level", "warning"],
+                REGISTRY_DIR, env,
+            ))
+            base = f"http://127.0.0.1:{args.registry_port}"
+            await wait_until_up(f"http://127.0.0.1:{args.fake_port}/stats")
+        await wait_until_up(f"{base}/health")
+
+        # warm up: first chat waits for the tool catalog cold start
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            await client.post(f"{base}/agent/chat", json={"text": "warm up"})
+
+        res = await run_load(base, args.concurrency, args.requests)
+        print(f"/agent/chat load test: {res['requests']} requests @ concurrency {args.concurrency}, "
+              f"fake model latency {args.latency_ms:.0f} ms")
+        print(f"  throughput   {res['rps']:8.1f} req/s  ({res['elapsed_s']:.2f} s, {res['errors']} errors)")
+        print(f"  chat         p50 {res['chat_p50_ms']:7.1f} ms   p95 {res['chat_p95_ms']:7.1f} ms")
+        print(f"  /health      p50 {res['health_p50_ms']:7.1f} ms   p95 {res['health_p95_ms']:7.1f} ms   "
+              f"max {res['health_max_ms']:.1f} ms  ({res['health_samples']} probes during load)")
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            try:
+                p.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                p.kill()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
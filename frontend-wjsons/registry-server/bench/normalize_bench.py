@@ -0,0 +1,67 @@
+# normalize_bench.py
+"""
+Micro-benchmark: cost of turning one MCP result into a tool_result in agent.py.
+
+Times agent.normalize_mcp_result() and agent.compact_result_text() on the
+result shapes the hardware server produces - a structured tool result, a
+JSON sensor reading, a reading with no value - plus the plain-text and dict
+fallbacks. Result objects are stand-ins with the attributes fastmcp's
+CallToolResult / TextResourceContents expose, so no server is needed.
+
+    python bench/normalize_bench.py --number 100000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import timeit
+from pathlib import Path
+from types import SimpleNamespace
+
+AGENT_DIR = Path(__file__).resolve().parents[3] / "real_copy_of_server"
+
+
+def sample_results():
+    reading = {"sensor": "temp_lm35", "value": 23.51, "unit": "°C", "samples": 5,
+               "timestamp": time.time() - 0.2, "staleness_s": 0.2}
+    empty = {"sensor": "ir_distance", "value": None, "unit": "cm", "samples": 0, "timestamp": None, "staleness_s": None}
+    command = {"ok": True, "message": "Sent beep for 500ms", "response": "A"}
+    return {
+        "tool (structured)": SimpleNamespace(
+            is_error=False, structured_content=command,
+            content=[SimpleNamespace(type="text", text=json.dumps(command))]),
+        "resource (JSON reading)": [SimpleNamespace(
+            uri="sensor://temp/LM35", mimeType="application/json", text=json.dumps(reading))],
+        "resource (no value)": [SimpleNamespace(
+            uri="sensor://ir/GP2Y0A21YK0F", mimeType="application/json", text=json.dumps(empty))],
+        "tool (text only)": SimpleNamespace(
+            is_error=False, structured_content=None, content=[SimpleNamespace(type="text", text="Servo set to 90 degrees")]),
+        "plain string": "12.34 cm",
+        "dict": command,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=50000, help="calls per shape")
+    parser.add_argument("--repeat", type=int, default=5, help="best of N runs")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("ANTHROPIC_API_KEY", "sk-fake-bench")
+    sys.path.insert(0, str(AGENT_DIR))
+    import agent
+
+    # time the normalizer itself, not the stage_timer wrapper around it
+    normalize = agent.normalize_mcp_result.__wrapped__
+    print(f"{'shape':<26}{'normalize µs':>14}{'+ encode µs':>14}  tool_result content")
+    for name, raw in sample_results().items():
+        n = min(timeit.repeat(lambda: normalize(raw), number=args.number, repeat=args.repeat))
+        e = min(timeit.repeat(lambda: agent.compact_result_text(normalize(raw)), number=args.number, repeat=args.repeat))
+        text = agent.compact_result_text(normalize(raw))
+        print(f"{name:<26}{n / args.number * 1e6:>14.2f}{e / args.number * 1e6:>14.2f}  {text[:60]}")
+
+
+if __name__ == "__main__":
+    main()
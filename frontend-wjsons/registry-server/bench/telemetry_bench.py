@@ -0,0 +1,95 @@
+# telemetry_bench.py
+"""
+Offline benchmark: full-rate vs deadband (change-only) telemetry.
+
+Simulates slow-moving sensors sampled at the stream period, applies the
+firmware's send rule (a value is sent when it moves beyond the deadband from
+the last sent value, or when the keyframe interval has passed), and feeds
+the resulting packets through real_copy_of_server/readQueue's parser and
+ingest. Reports link bytes, packets, host ingest time, and the error of the
+stored (held) series against the true samples at the same times.
+
+    python bench/telemetry_bench.py --seconds 600
+"""
+
+import argparse
+import math
+import random
+import sys
+import time
+from pathlib import Path
+
+AGENT_DIR = Path(__file__).resolve().parents[3] / "real_copy_of_server"
+
+# (name, telemetry id, period ms, deadband, value generator(t) -> value as the firmware prints it)
+SENSORS = [
+    ("ir_distance", 40, 200, 1.0, lambda t, rnd: int(60 + 5 * math.sin(t / 60) + rnd.choice((0, 0, 0, 1)))),
+    ("temp_lm35", 50, 1000, 0.25, lambda t, rnd: round(22 + t / 900 + rnd.gauss(0, 0.05), 2)),
+]
+
+
+def packets(sensor, seconds, deadband, keyframe_ms, rnd):
+    """(true series, sent packets) for one sensor; deadband 0 sends every sample."""
+    _, tid, period_ms, _, gen = sensor
+    truth, sent = [], []
+    last_sent, last_sent_at = None, -1e9
+    for k in range(int(seconds * 1000 / period_ms)):
+        t = k * period_ms / 1000.0
+        value = gen(t, rnd)
+        truth.append((value, t))
+        if (deadband > 0 and last_sent is not None and abs(value - last_sent) <= deadband
+                and (t - last_sent_at) * 1000 < keyframe_ms):
+            continue
+        last_sent, last_sent_at = value, t
+        sent.append((f"{tid},{value};".encode(), t))
+    return truth, sent
+
+
+def ingest(readQueue, tid, period_ms, deadband, keyframe_ms, sent, truth):
+    """
+    Parse and store every packet as the reader thread would. Returns (seconds,
+    mean abs error of the stored series vs the true samples at the same times,
+    samples rebuilt by hold). Only the newest MAX_RECENT of a long hold are stored.
+    """
+    readQueue._recent_values.pop(tid, None)
+    readQueue._stream_config.pop(tid, None)
+    readQueue._ingest_stats.pop(tid, None)
+    readQueue.set_stream_config(tid, period_ms=period_ms, deadband=deadband, keyframe_ms=keyframe_ms)
+    reconstructed = {}
+    t0 = time.perf_counter()
+    for raw, t in sent:
+        id_int, value = readQueue._process_raw(raw[:-1].decode())
+        with readQueue._recent_lock:
+            readQueue._store(id_int, value, t)
+            for v, ts in readQueue._recent_values[id_int]:
+                reconstructed[round(ts, 3)] = v
+    elapsed = time.perf_counter() - t0
+    errors = [abs(v - reconstructed[round(t, 3)]) for v, t in truth if round(t, 3) in reconstructed]
+    held = readQueue.get_ingest_stats()[tid]["held"]
+    return elapsed, (sum(errors) / len(errors) if errors else float("nan")), held
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=600.0, help="simulated time per sensor")
+    parser.add_argument("--keyframe-ms", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(AGENT_DIR))
+    import logging
+    logging.disable(logging.CRITICAL)
+    import readQueue
+
+    print(f"{'sensor':<14}{'mode':<10}{'packets':>9}{'bytes':>9}{'ingest ms':>11}{'held':>8}{'mean |err|':>12}")
+    for sensor in SENSORS:
+        name, tid, period_ms, deadband, _ = sensor
+        for mode, db in (("full", 0.0), ("deadband", deadband)):
+            truth, sent = packets(sensor, args.seconds, db, args.keyframe_ms, random.Random(args.seed))
+            elapsed, err, held = ingest(readQueue, tid, period_ms, db, args.keyframe_ms, sent, truth)
+            print(f"{name:<14}{mode:<10}{len(sent):>9}{sum(len(r) for r, _ in sent):>9}"
+                  f"{elapsed * 1000:>11.1f}{held:>8}{err:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
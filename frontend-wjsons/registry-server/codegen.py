@@ -0,0 +1,208 @@
+# codegen.py
+"""
+Code generation engine behind POST /generate-code.
+
+The UI regenerates code constantly, usually for a mapping set it has already
+generated. The engine keeps:
+- the Arduino firmware skeleton in memory, split into literal and slot lines
+  once and re-read only when the file's mtime/size changes (checked at most
+  once per `check_interval`); which drivers fill the slots is decided by the
+  parts catalog in firmware.py;
+- precomputed board pin tables (board position -> pin name/number);
+- an LRU of generated artifacts keyed by a content hash of the normalized
+  mappings, the board id and the template version, so a repeated request is
+  a hash and a dict lookup.
+
+Mappings are normalized (only the fields that affect the output, in a
+canonical order) before hashing *and* generating, so the same set always
+produces the same code regardless of the order the UI sent it in.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from firmware import FALLBACK_SKELETON, Skeleton, compile_skeleton, firmware_parts, firmware_slots, render_skeleton
+from pi_script import generate_pi_script
+
+PinName = Union[int, str]
+
+# Arduino Leonardo R3: board position (as numbered in the UI) -> actual I/O pin.
+# Power, reset, AREF, I2C and serial headers are not listed, so they keep the
+# position passthrough instead of becoming a #define like "GND".
+LEONARDO_PINS: Dict[int, PinName] = {
+    # Top row (left to right): SCL SDA AREF GND 13 12 11 10 9 8 7 6 5 4 3 2 1 0
+    5: 13, 6: 12, 7: 11, 8: 10, 9: 9, 10: 8, 11: 7, 12: 6,
+    13: 5, 14: 4, 15: 3, 16: 2, 17: 1, 18: 0,
+    # Bottom row: TX0 RX0 RESET GND 5V 3.3V Vin A0 A1 A2 A3 A4 A5
+    26: "A0", 27: "A1", 28: "A2", 29: "A3", 30: "A4", 31: "A5",
+}
+PIN_TABLES: Dict[str, Dict[int, PinName]] = {"leonardo": LEONARDO_PINS}
+
+
+def get_actual_pin_number(board_id: str, board_position: int) -> PinName:
+    """Board position -> actual pin for boards with a pin table; other boards use the position as-is."""
+    table = PIN_TABLES.get(board_id)
+    return table.get(board_position, board_position) if table else board_position
+
+
+def is_raspberry_pi(board_id: str) -> bool:
+    return board_id.startswith("pi") or "raspberry" in board_id.lower()
+
+
+class TemplateFile:
+    """A template file kept in memory; reloaded when its mtime or size changes."""
+
+    def __init__(self, path: Path, fallback: str = "", check_interval: float = 1.0):
+        self.path = Path(path)
+        self.fallback = fallback
+        self.check_interval = check_interval
+        self.text = fallback
+        self.version = ""
+        self.loads = 0
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            st = os.stat(self.path)
+            stamp = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            stamp = None
+        if stamp != self._stamp or not self.version:
+            self.text = self.path.read_text() if stamp else self.fallback
+            self.version = hashlib.sha256(self.text.encode("utf-8")).hexdigest()[:16]
+            self._stamp = stamp
+            self.loads += 1
+        self._checked = time.monotonic()
+
+    def get(self) -> Tuple[str, str]:
+        """(text, version), re-checking the file at most every `check_interval` seconds."""
+        if time.monotonic() - self._checked >= self.check_interval:
+            with self._lock:
+                if time.monotonic() - self._checked >= self.check_interval:
+                    self._load()
+        return self.text, self.version
+
+
+# -------------------------------------------------------------------
+# Normalization
+# -------------------------------------------------------------------
+def normalize_mappings(mappings: List[Any]) -> List[Dict[str, Any]]:
+    """Output-relevant fields of each mapping (pydantic model or dict), in canonical order."""
+    out = []
+    for m in mappings:
+        d = m.model_dump() if hasattr(m, "model_dump") else dict(m)
+        out.append({
+            "partId": d.get("partId", ""),
+            "role": d.get("role", ""),
+            "pins": list(d.get("pins") or []),
+            "label": d.get("label"),
+        })
+    out.sort(key=lambda d: (d["partId"], d["role"], json.dumps(d["pins"], default=str), d["label"] or ""))
+    return out
+
+
+def mappings_key(board_id: str, template_version: str, mappings: List[Dict[str, Any]]) -> str:
+    canonical = json.dumps([board_id, template_version, mappings], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+# -------------------------------------------------------------------
+# Generators (take normalized mappings)
+# -------------------------------------------------------------------
+def generate_arduino_code(mappings: List[Dict[str, Any]], board_id: str, skeleton: Skeleton) -> str:
+    """Sketch with pin definitions and only the drivers/commands/streams of the mapped parts."""
+    defines, parts = firmware_parts(mappings)
+    return "\n".join([
+        f"// Generated Arduino code for {board_id}",
+        "// Pin Definitions",
+        *defines,
+        "",
+        render_skeleton(skeleton, firmware_slots(parts)),
+        "",
+    ])
+
+
+def generate_raspberry_pi_code(mappings: List[Dict[str, Any]], board_id: str) -> str:
+    """Event-driven lgpio control script for a Raspberry Pi (catalog in pi_script.py)."""
+    return generate_pi_script(mappings, board_id)
+
+
+# -------------------------------------------------------------------
+# Engine
+# -------------------------------------------------------------------
+class CodegenEngine:
+    """
+    Generates code for a board and caches the result by content hash.
+
+    Thread-safe: the /generate-code route is a sync endpoint and runs in
+    FastAPI's worker threads.
+    """
+
+    def __init__(self, skeleton_path: Path, cache_size: int = 256, check_interval: float = 1.0):
+        self.template = TemplateFile(skeleton_path, FALLBACK_SKELETON, check_interval)
+        self._skeleton: Tuple[str, Skeleton] = ("", [])
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def generate(self, mappings: List[Any], board_id: str) -> Tuple[str, str, bool]:
+        """(code, file extension, served from cache) for a mapping set."""
+        normalized = normalize_mappings(mappings)
+        pi = is_raspberry_pi(board_id)
+        text, version = ("", "") if pi else self.template.get()
+        key = mappings_key(board_id, version, normalized)
+
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return hit[0], hit[1], True
+
+        if pi:
+            artifact = (generate_raspberry_pi_code(normalized, board_id), "py")
+        else:
+            artifact = (generate_arduino_code(normalized, board_id, self._compiled(text, version)), "ino")
+
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = artifact
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return artifact[0], artifact[1], False
+
+    def _compiled(self, text: str, version: str) -> Skeleton:
+        """The skeleton split into literal and slot lines, redone only when the template changes."""
+        compiled_version, skeleton = self._skeleton
+        if compiled_version != version:
+            skeleton = compile_skeleton(text)
+            self._skeleton = (version, skeleton)
+        return skeleton
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "template_version": self.template.version,
+                "template_loads": self.template.loads,
+            }
@@ -0,0 +1,271 @@
+# fast_router.py
+"""
+Deterministic fast path for simple hardware commands.
+
+"beep for 500 ms", "set servo to 90" or "what's the temperature" do not need
+a Claude round trip. The router matches the user's text against a small table
+of high-confidence intent patterns, binds the intent to a tool (or resource)
+that actually exists in the live catalog and whose input schema has the
+parameter the intent fills, calls it directly over the MCP pool and formats the
+reply from a template.
+
+Anything that doesn't fully match - extra clauses, several numbers, unknown
+parameters, out-of-range values, no suitable tool - returns None and the
+caller falls back to Claude.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from mcp_pool import MCPSessionPool
+
+# leading politeness that doesn't change the command
+_PREFIX = re.compile(r"^(?:hey|hi|ok|okay)?[\s,]*(?:please\s+|can you\s+|could you\s+|would you\s+)*", re.I)
+_SUFFIX = re.compile(r"[\s,]*(?:please|thanks|thank you)?[\s.!?]*$", re.I)
+# several commands in one sentence are left to Claude
+_COMPOUND = re.compile(r"\b(?:and|then|after|before|while|if|unless|twice|times)\b|[;&]", re.I)
+
+
+@dataclass
+class Intent:
+    name: str
+    pattern: re.Pattern
+    # which catalog entry can serve it
+    tool_words: Tuple[str, ...] = ()        # tool name must contain one of these
+    param_names: Tuple[str, ...] = ()       # integer schema property to fill (first found wins)
+    resource_words: Tuple[str, ...] = ()    # or: resource URI must contain one of these
+    # argument extraction and validation
+    value: Optional[Callable[[re.Match], Optional[int]]] = None
+    bounds: Tuple[int, int] = (0, 0)
+    reply: str = ""
+    error_reply: str = ""
+
+
+def _beep_ms(m: re.Match) -> Optional[int]:
+    if m.group("num") is None:
+        return None  # use the tool's default
+    num = float(m.group("num"))
+    unit = (m.group("unit") or "ms").lower()
+    return int(num * 1000) if unit.startswith("s") else int(num)
+
+
+INTENTS: List[Intent] = [
+    Intent(
+        name="beep",
+        pattern=re.compile(
+            r"^(?:beep|buzz|sound the (?:buzzer|piezo)|make (?:a )?(?:beep|sound))"
+            r"(?:\s+(?:for\s+)?(?P<num>\d+(?:\.\d+)?)\s*(?P<unit>ms|milliseconds?|s|secs?|seconds?)?)?$",
+            re.I,
+        ),
+        tool_words=("beep", "buzz", "piezo"),
+        param_names=("duration", "duration_ms", "ms"),
+        value=_beep_ms,
+        bounds=(1, 10000),
+        reply="Beeped for {value} ms.",
+        error_reply="Couldn't beep: {error}",
+    ),
+    Intent(
+        name="servo",
+        pattern=re.compile(
+            r"^(?:set|move|turn|rotate|point)?\s*(?:the\s+)?servo(?:\s+motor)?\s*(?:to|at)?\s*"
+            r"(?P<num>\d+)\s*(?:°|deg|degrees?)?$",
+            re.I,
+        ),
+        tool_words=("servo",),
+        param_names=("position", "angle", "degrees"),
+        value=lambda m: int(m.group("num")),
+        bounds=(0, 180),
+        reply="Servo set to {value}°.",
+        error_reply="Couldn't move the servo: {error}",
+    ),
+    Intent(
+        name="temperature",
+        pattern=re.compile(
+            r"^(?:what(?:'s| is)\s+the\s+|read\s+(?:the\s+)?|get\s+(?:the\s+)?|current\s+)?"
+            r"temp(?:erature)?(?:\s+(?:now|right now|reading))?$",
+            re.I,
+        ),
+        tool_words=("temp",),
+        resource_words=("temp",),
+        reply="Temperature: {result}",
+        error_reply="Couldn't read the temperature: {error}",
+    ),
+    Intent(
+        name="distance",
+        pattern=re.compile(
+            r"^(?:what(?:'s| is)\s+the\s+|read\s+(?:the\s+)?|get\s+(?:the\s+)?|current\s+)?"
+            r"(?:(?P<which>ir|ultrasonic)\s+)?distance(?:\s+(?:now|right now|reading))?$",
+            re.I,
+        ),
+        tool_words=("distance",),
+        resource_words=("/ir/", "ultrasonic", "distance"),
+        reply="Distance: {result}",
+        error_reply="Couldn't read the distance: {error}",
+    ),
+]
+
+
+@dataclass
+class Route:
+    intent: Intent
+    kind: str                      # "tool" or "resource"
+    target: str                    # tool name or resource URI
+    args: Dict[str, Any] = field(default_factory=dict)
+    value: Optional[int] = None
+
+
+def normalize(text: str) -> str:
+    # the chat UI appends hardware/tool context after a blank line; only the command counts
+    first = text.split("\n\n", 1)[0].strip()
+    first = _PREFIX.sub("", first, count=1)
+    first = _SUFFIX.sub("", first, count=1)
+    return re.sub(r"\s+", " ", first).strip()
+
+
+def _schema_int_param(tool: Dict[str, Any], names: Tuple[str, ...]) -> Optional[str]:
+    props = (tool.get("input_schema") or {}).get("properties") or {}
+    for name in names:
+        if name in props and props[name].get("type", "integer") in ("integer", "number"):
+            return name
+    return None
+
+
+def _other_required(tool: Dict[str, Any], param: Optional[str]) -> bool:
+    required = (tool.get("input_schema") or {}).get("required") or []
+    return any(r != param for r in required)
+
+
+class FastRouter:
+    def __init__(self, intents: List[Intent] = INTENTS):
+        self.intents = intents
+        self.stats: Dict[str, Any] = {"routed": 0, "fallback": 0, "errors": 0, "by_intent": {}, "total_ms": 0.0}
+
+    def match(self, text: str, tools: List[Dict[str, Any]], resources: List[str]) -> Optional[Route]:
+        command = normalize(text)
+        if not command or _COMPOUND.search(command):
+            return None
+        for intent in self.intents:
+            m = intent.pattern.match(command)
+            if not m:
+                continue
+            route = self._bind(intent, m, tools, resources)
+            if route is not None:
+                return route
+        return None
+
+    def _bind(self, intent: Intent, m: re.Match, tools: List[Dict[str, Any]], resources: List[str]) -> Optional[Route]:
+        value = intent.value(m) if intent.value else None
+        if value is not None and not (intent.bounds[0] <= value <= intent.bounds[1]):
+            return None
+        which = m.groupdict().get("which")
+        tool_words = (which.lower(),) if which else intent.tool_words
+        resource_words = (which.lower(),) if which else intent.resource_words
+
+        candidates = [t for t in tools if any(w in t.get("name", "").lower() for w in tool_words)]
+        if len(candidates) > 1:
+            return None  # ambiguous
+        if len(candidates) == 1:
+            tool = candidates[0]
+            props = (tool.get("input_schema") or {}).get("properties") or {}
+            param = _schema_int_param(tool, intent.param_names) if intent.param_names else None
+            if intent.param_names and param is None:
+                return None
+            if _other_required(tool, param):
+                return None
+            if param is not None and value is None:
+                value = props[param].get("default")
+                if not isinstance(value, int):
+                    return None  # nothing said and no default: not high confidence
+            args = {param: value} if param is not None else {}
+            return Route(intent, "tool", tool["name"], args, value)
+
+        if intent.param_names and value is not None:
+            return None  # a parameterized command needs a tool
+        uris = [u for u in resources if any(w in u.lower() for w in resource_words)]
+        if len(uris) == 1:
+            return Route(intent, "resource", uris[0])
+        return None
+
+    async def execute(self, route: Route, pool: MCPSessionPool) -> Tuple[str, bool]:
+        """Run the routed call and format the reply. Returns (reply, ok)."""
+        t0 = time.perf_counter()
+        warning = ""
+        try:
+            async with pool.session() as mcp:
+                if route.kind == "tool":
+                    result = await mcp.call_tool(route.target, route.args)
+                    ok, text, warning = _tool_outcome(result)
+                else:
+                    contents = await mcp.read_resource(route.target)
+                    ok, text = True, _reading_text(contents)
+        except Exception as e:
+            ok, text = False, str(e)
+
+        intent = route.intent
+        stat = self.stats["by_intent"].setdefault(intent.name, {"routed": 0, "errors": 0})
+        stat["routed"] += 1
+        self.stats["routed"] += 1
+        self.stats["total_ms"] += (time.perf_counter() - t0) * 1000
+        if not ok:
+            stat["errors"] += 1
+            self.stats["errors"] += 1
+            return intent.error_reply.format(error=text), False
+        reply = intent.reply.format(value=route.value, result=text)
+        if warning:
+            reply += f" (warning: {warning})"
+        return reply, True
+
+    def record_fallback(self) -> None:
+        self.stats["fallback"] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        routed, fallback = self.stats["routed"], self.stats["fallback"]
+        total = routed + fallback
+        return {
+            "routed": routed,
+            "fallback": fallback,
+            "errors": self.stats["errors"],
+            "routing_rate": routed / total if total else 0.0,
+            "avg_routed_ms": self.stats["total_ms"] / routed if routed else 0.0,
+            "by_intent": self.stats["by_intent"],
+        }
+
+
+def _reading_text(contents: List[Any]) -> str:
+    """"23.5 °C" from a sensor resource (a JSON reading with value/unit, or plain text)."""
+    parts = []
+    for c in contents or []:
+        text = getattr(c, "text", "") or ""
+        if getattr(c, "mimeType", None) == "application/json":
+            try:
+                data = json.loads(text)
+            except ValueError:
+                data = None
+            if isinstance(data, dict) and "value" in data:
+                text = "No value" if data["value"] is None else f"{data['value']} {data.get('unit', '')}".strip()
+        parts.append(text)
+    return " ".join(parts).strip() or "No value"
+
+
+def _tool_outcome(result: Any) -> Tuple[bool, str, str]:
+    """(ok, text, warning) from a CallToolResult of the hardware tools (dicts with message/error/warning)."""
+    if getattr(result, "is_error", False):
+        return False, " ".join(getattr(b, "text", "") for b in (result.content or [])) or "tool error", ""
+    data = getattr(result, "structured_content", None)
+    if not isinstance(data, dict):
+        for block in getattr(result, "content", None) or []:
+            try:
+                data = json.loads(getattr(block, "text", ""))
+                break
+            except (TypeError, ValueError):
+                continue
+    if isinstance(data, dict):
+        if data.get("error"):
+            return False, str(data["error"]), ""
+        return True, str(data.get("message") or ""), str(data.get("warning") or "")
+    return True, "", ""
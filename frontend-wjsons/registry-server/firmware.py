@@ -0,0 +1,407 @@
+# firmware.py
+"""
+Part-aware Arduino firmware generation.
+
+FIRMWARE_PARTS describes, per partId (the ids in the UI's boards.ts), the pin
+macros, includes, globals, setup lines, helper functions, serial commands and
+telemetry streams that part needs. A sketch is the firmware skeleton
+(boilerplate/skeleton.c) with its `{{slot}}` lines filled from the mapped
+parts only: a buzzer-only board gets no Servo library, no IR streaming and a
+one-case dispatch switch.
+
+Command and telemetry ids are the serial protocol shared with
+real_copy_of_server: tools.py sends "2,<ms>;" (beep) and "20,<deg>;" (servo),
+resources.py reads 40 (IR), 50 (LM35) and 60 (HC-SR04), and sampling.py sets
+stream periods, deadbands and keyframes with commands 10-15. The skeleton
+itself handles the link commands of link.py (16 set baud, 17 ping). Keep
+them in sync.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+# Serial protocol ids (see real_copy_of_server/tools.py and resources.py)
+CMD_BEEP = 2
+CMD_SERVO = 20
+CMD_LED = 30
+# Sampling control, emitted whenever the board has a telemetry stream
+CMD_STREAM_PERIOD = 10   # 10,<telemetry id>,<period ms>;  set the period and resume
+CMD_STREAM_PAUSE = 11    # 11,<telemetry id>;
+CMD_STREAM_RESUME = 12   # 12,<telemetry id>;
+CMD_READ_NOW = 13        # 13,<telemetry id>;  one reading now, sent before the ACK
+CMD_STREAM_DEADBAND = 14  # 14,<telemetry id>,<deadband x100>;  only send moves beyond it (0 = every sample)
+CMD_STREAM_KEYFRAME = 15  # 15,<telemetry id>,<ms>;  resend an unchanged value at least this often
+DEFAULT_KEYFRAME_MS = 5000
+TELEMETRY_IR = 40
+TELEMETRY_LM35 = 50
+TELEMETRY_ULTRASONIC = 60
+# Edge events of the generated Raspberry Pi scripts (pi_script.py)
+TELEMETRY_BUTTON = 70         # 1 pressed / 0 released
+TELEMETRY_DIGITAL_INPUT = 71  # new level
+
+
+@dataclass(frozen=True)
+class Stream:
+    telemetry_id: int
+    interval_ms: int  # default period; the host can change it with CMD_STREAM_PERIOD
+    expr: str         # C expression producing the value
+    ctype: str        # C type of `expr`; the value is printed in this type
+
+
+@dataclass(frozen=True)
+class FirmwarePart:
+    part_id: str
+    pins: Tuple[str, ...]                          # macro per pin, in mapping pin order
+    includes: Tuple[str, ...] = ()
+    globals: Tuple[str, ...] = ()
+    setup: Tuple[str, ...] = ()
+    functions: str = ""
+    commands: Dict[int, Tuple[str, Tuple[str, ...]]] = field(default_factory=dict)  # id -> (comment, body)
+    streams: Tuple[Stream, ...] = ()
+
+
+FIRMWARE_PARTS: Dict[str, FirmwarePart] = {p.part_id: p for p in (
+    FirmwarePart(
+        "led", ("LED_PIN",),
+        setup=("pinMode(LED_PIN, OUTPUT);",),
+        commands={CMD_LED: ("LED on (1) / off", ("digitalWrite(LED_PIN, param == 1 ? HIGH : LOW);",))},
+    ),
+    FirmwarePart(
+        "Piezo_Buzzer", ("PIEZO_BUZZER_PIN",),
+        setup=("pinMode(PIEZO_BUZZER_PIN, OUTPUT);",),
+        # tone() with a duration stops itself, so the ACK does not wait for the beep
+        commands={CMD_BEEP: ("beep for <param> ms (200 if missing)",
+                             ("tone(PIEZO_BUZZER_PIN, 1000, param > 0 ? param : 200);",))},
+    ),
+    FirmwarePart(
+        "Micro_Servo_SG90", ("MICRO_SERVO_SG90_PIN",),
+        includes=("#include <Servo.h>",),
+        globals=("Servo turretServo;",),
+        setup=("turretServo.attach(MICRO_SERVO_SG90_PIN);",),
+        commands={CMD_SERVO: ("servo angle <param> degrees", ("turretServo.write(constrain(param, 0, 180));",))},
+    ),
+    FirmwarePart(
+        "IR_GP2Y0A21YK0F", ("IR_GP2Y0A21YK0F_PIN",),
+        functions="""int irSensorReading() {
+  int raw = analogRead(IR_GP2Y0A21YK0F_PIN);
+  float voltage = raw * (5.0 / 1023.0);  // convert ADC to voltage (assuming 5V ref)
+
+  if (voltage <= 0.42) {
+    return -1; // out of range / invalid
+  }
+
+  float distance_cm = 27.86 / (voltage - 0.42);
+  return (int)distance_cm;
+}""",
+        streams=(Stream(TELEMETRY_IR, 200, "irSensorReading()", "int"),),
+    ),
+    FirmwarePart(
+        "LM35", ("LM35_PIN",),
+        functions="""float lm35Reading() {
+  return analogRead(LM35_PIN) * (500.0 / 1023.0);  // 10 mV per degree C at a 5V reference
+}""",
+        streams=(Stream(TELEMETRY_LM35, 1000, "lm35Reading()", "float"),),
+    ),
+    FirmwarePart(
+        "hcsr04", ("HCSR04_TRIGGER_PIN", "HCSR04_ECHO_PIN"),
+        setup=("pinMode(HCSR04_TRIGGER_PIN, OUTPUT);", "pinMode(HCSR04_ECHO_PIN, INPUT);"),
+        functions="""long ultrasonicReading() {
+  digitalWrite(HCSR04_TRIGGER_PIN, LOW);
+  delayMicroseconds(2);
+  digitalWrite(HCSR04_TRIGGER_PIN, HIGH);
+  delayMicroseconds(10);
+  digitalWrite(HCSR04_TRIGGER_PIN, LOW);
+  unsigned long echo = pulseIn(HCSR04_ECHO_PIN, HIGH, 25000UL);  // ~4 m; bounds the loop stall
+  if (echo == 0) {
+    return -1; // no echo / out of range
+  }
+  return echo / 58;  // cm
+}""",
+        streams=(Stream(TELEMETRY_ULTRASONIC, 200, "ultrasonicReading()", "long"),),
+    ),
+)}
+
+FALLBACK_SKELETON = """{{includes}}
+
+{{globals}}
+
+#define BASE_BAUD 9600
+#define BAUD_SWITCH_WINDOW_MS 1000  // an unverified baud switch reverts to BASE_BAUD after this
+unsigned long baudSwitchedAt = 0;   // millis() of the unverified switch, 0 = none
+
+void setup() {
+  Serial.begin(BASE_BAUD);
+{{setup}}
+}
+
+{{functions}}
+
+// ---- Command handling: "<command>[,<param>[,<param2>]];" -> "A" (done) / "E" (unknown) ----
+void dispatch(int command, long param, long param2) {
+  switch (command) {
+{{commands}}
+    case 16:  // link: switch to <param> baud (confirmed by a ping at the new rate)
+      if (param != 9600 && param != 115200 && param != 250000 && param != 1000000) {
+        Serial.println("E");
+        return;
+      }
+      Serial.println("A");
+      Serial.flush();
+      Serial.end();
+      Serial.begin(param);
+      baudSwitchedAt = millis() | 1;
+      return;
+    case 17:  // link: ping, echoes "P<param>" and confirms a baud switch
+      baudSwitchedAt = 0;
+      Serial.print('P');
+      Serial.println(param);
+      return;
+    default:
+      Serial.println("E");
+      return;
+  }
+  Serial.println("A");
+}
+
+void loop() {
+  // Commands are parsed as the bytes arrive: no line buffer, no atoi
+  static int command = 0;
+  static long params[2] = {0, 0};
+  static byte field = 0;  // 0 = command, 1 = param, 2 = param2
+  static bool negative = false;
+
+  while (Serial.available() > 0) {
+    char c = (char)Serial.read();
+    if (c >= '0' && c <= '9') {
+      if (field == 0) command = command * 10 + (c - '0');
+      else params[field - 1] = params[field - 1] * 10 + (c - '0');
+    } else if (c == '-' && field > 0) {
+      negative = true;
+    } else if (c == ',' || c == ';') {
+      if (negative) params[field - 1] = -params[field - 1];
+      negative = false;
+      if (c == ',') {
+        if (field < 2) field++;
+      } else {
+        dispatch(command, params[0], params[1]);
+        command = 0;
+        params[0] = 0;
+        params[1] = 0;
+        field = 0;
+      }
+    }
+  }
+
+  if (baudSwitchedAt && millis() - baudSwitchedAt >= BAUD_SWITCH_WINDOW_MS) {
+    Serial.end();
+    Serial.begin(BASE_BAUD);
+    baudSwitchedAt = 0;
+  }
+
+{{streams}}
+}"""
+
+_SLOT = re.compile(r"^\{\{(\w+)\}\}$")
+Skeleton = List[Tuple[bool, str]]  # (is_slot, literal line or slot name)
+
+
+def compile_skeleton(text: str) -> Skeleton:
+    """Split a skeleton once into literal lines and `{{slot}}` lines."""
+    out: Skeleton = []
+    for line in text.splitlines():
+        m = _SLOT.match(line.strip())
+        out.append((True, m.group(1)) if m else (False, line))
+    return out
+
+
+def render_skeleton(skeleton: Skeleton, slots: Dict[str, List[str]]) -> str:
+    """Fill slot lines; blank lines left around empty slots collapse (none before a closing brace)."""
+    lines: List[str] = []
+    for is_slot, value in skeleton:
+        for line in (slots.get(value, []) if is_slot else [value]):
+            if line.startswith("}") and lines and not lines[-1]:
+                lines.pop()
+            if line or (lines and lines[-1]):
+                lines.append(line)
+    while lines and not lines[-1]:
+        lines.pop()
+    return "\n".join(lines)
+
+
+def macro_name(part_id: str) -> str:
+    """`#define` name for a part without a catalog entry."""
+    return re.sub(r"\W", "_", part_id).upper() + "_PIN"
+
+
+def firmware_parts(mappings: List[Dict[str, Any]]) -> Tuple[List[str], List[FirmwarePart]]:
+    """
+    Pin definitions and the catalog parts to build, from normalized mappings.
+    Catalog parts are single-instance (the protocol has no device index): a
+    second mapping of the same part only gets a numbered pin macro.
+    """
+    defines: List[str] = []
+    parts: List[FirmwarePart] = []
+    seen: Dict[str, int] = {}
+    for m in mappings:
+        pins = m["pins"]
+        if not pins:
+            continue
+        part = FIRMWARE_PARTS.get(m["partId"])
+        n = seen[m["partId"]] = seen.get(m["partId"], 0) + 1
+        if part is None or n > 1 or len(pins) < len(part.pins):
+            suffix = f"_{n}" if n > 1 else ""
+            defines.append(f"#define {macro_name(m['partId'])}{suffix} {pins[0]}")
+            continue
+        defines.extend(f"#define {macro} {pin}" for macro, pin in zip(part.pins, pins))
+        parts.append(part)
+    return defines, parts
+
+
+def firmware_slots(parts: List[FirmwarePart]) -> Dict[str, List[str]]:
+    includes = sorted({inc for p in parts for inc in p.includes})
+    globals_ = [g for p in parts for g in p.globals]
+    setup = ["  " + s for p in parts for s in p.setup]
+    functions: List[str] = []
+    for p in parts:
+        if p.functions:
+            functions.extend(p.functions.splitlines() + [""])
+
+    commands: List[str] = []
+    for cmd_id, (comment, body) in sorted((c for p in parts for c in p.commands.items()), key=lambda c: c[0]):
+        commands.append(f"    case {cmd_id}:  // {comment}")
+        commands.extend("      " + line for line in body)
+        commands.append("      break;")
+
+    streams: List[str] = []
+    all_streams = [s for p in parts for s in p.streams]
+    if all_streams:
+        sampling_globals, sampling_functions, sampling_commands, streams = _sampling_code(all_streams)
+        globals_.extend(sampling_globals)
+        functions.extend(sampling_functions)
+        commands.extend(sampling_commands)
+    return {"includes": includes, "globals": globals_, "setup": setup, "functions": functions,
+            "commands": commands, "streams": streams}
+
+
+def _sampling_code(streams: List[Stream]) -> Tuple[List[str], List[str], List[str], List[str]]:
+    """
+    Stream table, reportSensor()/samplingCommand() and their dispatch cases,
+    and the loop body that samples each enabled stream when its period is due.
+    With a deadband set, a sample is only sent when it moved beyond it since
+    the last sent value, or when no value was sent for keyframeMs.
+    """
+    globals_ = [
+        "",
+        "struct SensorStream {",
+        "  int id;",
+        "  unsigned long periodMs;",
+        "  unsigned long last;",
+        "  bool enabled;",
+        "  float deadband;           // 0 = send every sample",
+        "  unsigned long keyframeMs;",
+        "  float lastSent;",
+        "  unsigned long lastSentAt;",
+        "};",
+        "",
+        "SensorStream streams[] = {",
+        *(f"  {{{s.telemetry_id}, {s.interval_ms}, 0, true, 0, {DEFAULT_KEYFRAME_MS}, 0, 0}}," for s in streams),
+        "};",
+        "const byte STREAM_COUNT = sizeof(streams) / sizeof(streams[0]);",
+    ]
+
+    functions = [
+        "bool shouldSend(SensorStream *s, float value, bool force) {",
+        "  unsigned long now = millis();",
+        "  if (!force && s->deadband > 0 && fabs(value - s->lastSent) <= s->deadband",
+        "      && now - s->lastSentAt < s->keyframeMs) {",
+        "    return false;",
+        "  }",
+        "  s->lastSent = value;",
+        "  s->lastSentAt = now;",
+        "  return true;",
+        "}",
+        "",
+        "void reportSensor(SensorStream *s, bool force) {",
+        "  switch (s->id) {",
+    ]
+    for s in streams:
+        functions.extend([
+            f"    case {s.telemetry_id}: {{",
+            f"      {s.ctype} value = {s.expr};",
+            "      if (!shouldSend(s, value, force)) return;",
+            f"      Serial.print(\"{s.telemetry_id},\");",
+            "      Serial.print(value);",
+            "      break;",
+            "    }",
+        ])
+    functions.extend([
+        "  }",
+        "  Serial.print(';');",
+        "}",
+        "",
+        "SensorStream *findStream(long id) {",
+        "  for (byte i = 0; i < STREAM_COUNT; i++) {",
+        "    if (streams[i].id == id) return &streams[i];",
+        "  }",
+        "  return NULL;",
+        "}",
+        "",
+        "bool samplingCommand(int command, long id, long value) {",
+        "  SensorStream *s = findStream(id);",
+        "  if (s == NULL) return false;",
+        "  switch (command) {",
+        f"    case {CMD_STREAM_PERIOD}:  // <id>,<ms>: set the period and resume",
+        "      if (value <= 0) return false;",
+        "      s->periodMs = value;",
+        "      s->enabled = true;",
+        "      break;",
+        f"    case {CMD_STREAM_PAUSE}:",
+        "      s->enabled = false;",
+        "      break;",
+        f"    case {CMD_STREAM_RESUME}:",
+        "      s->enabled = true;",
+        "      break;",
+        f"    case {CMD_READ_NOW}:",
+        "      reportSensor(s, true);",
+        "      break;",
+        f"    case {CMD_STREAM_DEADBAND}:  // <id>,<deadband x100>",
+        "      if (value < 0) return false;",
+        "      s->deadband = value / 100.0;",
+        "      break;",
+        f"    case {CMD_STREAM_KEYFRAME}:  // <id>,<ms>",
+        "      if (value <= 0) return false;",
+        "      s->keyframeMs = value;",
+        "      break;",
+        "  }",
+        "  return true;",
+        "}",
+        "",
+    ])
+
+    commands = [
+        f"    case {CMD_STREAM_PERIOD}:  // sampling: period / pause / resume / read now / deadband / keyframe",
+        f"    case {CMD_STREAM_PAUSE}:",
+        f"    case {CMD_STREAM_RESUME}:",
+        f"    case {CMD_READ_NOW}:",
+        f"    case {CMD_STREAM_DEADBAND}:",
+        f"    case {CMD_STREAM_KEYFRAME}:",
+        "      if (!samplingCommand(command, param, param2)) {",
+        "        Serial.println(\"E\");",
+        "        return;",
+        "      }",
+        "      break;",
+    ]
+
+    loop = [
+        "  unsigned long now = millis();",
+        "  for (byte i = 0; i < STREAM_COUNT; i++) {",
+        "    if (streams[i].enabled && now - streams[i].last >= streams[i].periodMs) {",
+        "      streams[i].last = now;",
+        "      reportSensor(&streams[i], false);",
+        "    }",
+        "  }",
+    ]
+    return globals_, functions, commands, loop
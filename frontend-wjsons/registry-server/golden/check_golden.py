@@ -0,0 +1,112 @@
+# check_golden.py
+"""
+Golden-file check for /generate-code output.
+
+Every golden/cases/<name>.json ({"boardId", "mappings"}) is generated through
+CodegenEngine with the real boilerplate/skeleton.c and compared with
+golden/expected/<name>.<ino|py>. Also checks that mapping order does not
+change the output, that every command id tools.py sends has a handler in
+the firmware parts catalog, and that a mapping of every catalog part enables
+every resource in resources.py (its "hardware" is a partId whose firmware
+streams the resource's telemetry id). Also checks that the modules shared
+with real_copy_of_server (SHARED_MODULES) are still identical copies.
+
+    python golden/check_golden.py            # exit 1 and print a diff on mismatch
+    python golden/check_golden.py --update   # rewrite the expected files after an intended change
+"""
+
+import argparse
+import difflib
+import json
+import re
+import sys
+from pathlib import Path
+
+GOLDEN_DIR = Path(__file__).resolve().parent
+REGISTRY_DIR = GOLDEN_DIR.parent
+REPO_DIR = REGISTRY_DIR.parent.parent
+sys.path.insert(0, str(REGISTRY_DIR))
+
+from codegen import CodegenEngine  # noqa: E402
+from firmware import FIRMWARE_PARTS  # noqa: E402
+
+SKELETON_FILE = REPO_DIR / "boilerplate" / "skeleton.c"
+TOOLS_FILE = REPO_DIR / "real_copy_of_server" / "tools.py"
+RESOURCES_FILE = REPO_DIR / "real_copy_of_server" / "resources.py"
+# copied verbatim into real_copy_of_server, which runs from its own directory
+SHARED_MODULES = ("stage_timing.py", "tool_executor.py")
+
+
+def check_protocol() -> list:
+    """Command ids in tools.py ("command": N / *_command_id = N) without a firmware handler."""
+    source = TOOLS_FILE.read_text()
+    sent = {int(n) for n in re.findall(r'(?:"command":\s*|_command_id\s*=\s*)(\d+)', source)}
+    handled = {cmd for part in FIRMWARE_PARTS.values() for cmd in part.commands}
+    return sorted(sent - handled)
+
+
+def check_resources() -> list:
+    """Resources in resources.py a full catalog mapping set would leave disabled or without their stream."""
+    source = RESOURCES_FILE.read_text()
+    specs = re.findall(r'"name":\s*"(\w+)"[^{}]*?"hardware":\s*"([^"]+)"[^{}]*?"telemetry_id":\s*(\d+)', source)
+    broken = []
+    for name, hardware, telemetry_id in specs:
+        part = FIRMWARE_PARTS.get(hardware)  # register_resources() enables a spec when its partId is mapped
+        if part is None or int(telemetry_id) not in {s.telemetry_id for s in part.streams}:
+            broken.append(f"{name} ({hardware!r}, telemetry {telemetry_id})")
+    return broken
+
+
+def check_shared_modules() -> list:
+    """SHARED_MODULES whose registry-server and real_copy_of_server copies differ."""
+    agent_dir = REPO_DIR / "real_copy_of_server"
+    return [name for name in SHARED_MODULES
+            if (REGISTRY_DIR / name).read_bytes() != (agent_dir / name).read_bytes()]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--update", action="store_true", help="write the current output as the expected files")
+    args = parser.parse_args(argv)
+
+    engine = CodegenEngine(SKELETON_FILE, check_interval=0.0)
+    failures = 0
+    for case in sorted((GOLDEN_DIR / "cases").glob("*.json")):
+        spec = json.loads(case.read_text())
+        code, ext, _ = engine.generate(spec["mappings"], spec["boardId"])
+        expected_file = GOLDEN_DIR / "expected" / f"{case.stem}.{ext}"
+
+        if args.update:
+            expected_file.write_text(code)
+            print(f"updated  {expected_file.relative_to(GOLDEN_DIR)}")
+            continue
+
+        engine.clear()
+        reordered, _, _ = engine.generate(list(reversed(spec["mappings"])), spec["boardId"])
+        expected = expected_file.read_text() if expected_file.exists() else ""
+        if code == expected and reordered == code:
+            print(f"ok       {case.stem}")
+            continue
+        failures += 1
+        print(f"FAILED   {case.stem}" + ("" if reordered == code else "  (output depends on mapping order)"))
+        sys.stdout.writelines(difflib.unified_diff(
+            expected.splitlines(True), code.splitlines(True),
+            fromfile=f"expected/{expected_file.name}", tofile="generated"))
+
+    missing = check_protocol()
+    if missing:
+        failures += 1
+        print(f"FAILED   protocol: tools.py sends command id(s) {missing} with no firmware handler")
+    disabled = check_resources()
+    if disabled:
+        failures += 1
+        print(f"FAILED   resources: {', '.join(disabled)} not enabled by a catalog partId that streams it")
+    diverged = check_shared_modules()
+    if diverged:
+        failures += 1
+        print(f"FAILED   shared modules: {', '.join(diverged)} differ from the real_copy_of_server copies")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+# Generated Python code for pi5
+# Hardware control script (lgpio, event driven: inputs are handled in edge
+# callbacks; events go to stdout as "<id>,<value>,<t>;", t = ms since start)
+
+import signal
+import sys
+import threading
+import time
+
+import lgpio
+
+# Pin definitions (BCM)
+BUTTON_PIN = 27  # start
+HCSR04_TRIGGER_PIN = 23  # Trigger
+HCSR04_ECHO_PIN = 24  # Echo
+LED_PIN = 17  # Light
+
+BUTTON_DEBOUNCE_US = 5000
+ULTRASONIC_PERIOD_US = 100000
+ULTRASONIC_MAX_ECHO_US = 25000
+echo_rise = None  # tick of the echo's rising edge
+
+h = None  # GPIO chip handle
+callbacks = []
+START_NS = time.time_ns()  # lgpio edge ticks are in the same clock
+_out_lock = threading.Lock()
+
+def send_telemetry(telemetry_id, value, tick):
+    """One "<id>,<value>,<t>;" packet; `tick` is the edge time from lgpio (ns)."""
+    with _out_lock:
+        print(f"{telemetry_id},{value},{(tick - START_NS) // 1000000};", flush=True)
+
+def setup():
+    global h
+    h = lgpio.gpiochip_open(0)
+    lgpio.gpio_claim_alert(h, BUTTON_PIN, lgpio.BOTH_EDGES, lgpio.SET_PULL_UP)
+    lgpio.gpio_set_debounce_micros(h, BUTTON_PIN, BUTTON_DEBOUNCE_US)
+    lgpio.gpio_claim_output(h, HCSR04_TRIGGER_PIN)
+    lgpio.gpio_claim_alert(h, HCSR04_ECHO_PIN, lgpio.BOTH_EDGES)
+    lgpio.gpio_claim_output(h, LED_PIN)
+
+def on_button(chip, gpio, level, tick):
+    """Button edge (active low): 1 = pressed, 0 = released."""
+    if level != 2:  # 2 = watchdog timeout, not an edge
+        send_telemetry(70, 1 if level == 0 else 0, tick)
+
+def on_echo(chip, gpio, level, tick):
+    """Echo pulse width from the edge timestamps -> distance in cm (-1 = nothing in range)."""
+    global echo_rise
+    if level == 1:
+        echo_rise = tick
+    elif level == 0 and echo_rise is not None:
+        width_us = (tick - echo_rise) / 1000
+        echo_rise = None
+        send_telemetry(60, round(width_us / 58) if width_us < ULTRASONIC_MAX_ECHO_US else -1, tick)
+
+def cleanup():
+    """Cancel the callbacks and release the GPIO chip"""
+    for cb in callbacks:
+        cb.cancel()
+    if h is not None:
+        lgpio.tx_pulse(h, HCSR04_TRIGGER_PIN, 0, 0)
+        lgpio.gpiochip_close(h)
+
+def main():
+    """Arm the edge callbacks and wait; all input handling runs in lgpio's callback thread"""
+    try:
+        setup()
+        callbacks.append(lgpio.callback(h, BUTTON_PIN, lgpio.BOTH_EDGES, on_button))
+        callbacks.append(lgpio.callback(h, HCSR04_ECHO_PIN, lgpio.BOTH_EDGES, on_echo))
+        lgpio.tx_pulse(h, HCSR04_TRIGGER_PIN, 10, ULTRASONIC_PERIOD_US - 10)
+        print('Hardware controller started for pi5', file=sys.stderr)
+        print('  button (Press): GPIO 27', file=sys.stderr)
+        print('  hcsr04 (Trigger): GPIO 23', file=sys.stderr)
+        print('  led (Light): GPIO 17', file=sys.stderr)
+        signal.pause()
+    except KeyboardInterrupt:
+        print('\nShutting down...', file=sys.stderr)
+    finally:
+        cleanup()
+
+if __name__ == '__main__':
+    main()
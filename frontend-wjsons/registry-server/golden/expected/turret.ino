@@ -0,0 +1,200 @@
+// Generated Arduino code for leonardo
+// Pin Definitions
+#define IR_GP2Y0A21YK0F_PIN A0
+#define MICRO_SERVO_SG90_PIN 9
+#define PIEZO_BUZZER_PIN 8
+#define LED_PIN 13
+
+#include <Servo.h>
+
+Servo turretServo;
+
+struct SensorStream {
+  int id;
+  unsigned long periodMs;
+  unsigned long last;
+  bool enabled;
+  float deadband;           // 0 = send every sample
+  unsigned long keyframeMs;
+  float lastSent;
+  unsigned long lastSentAt;
+};
+
+SensorStream streams[] = {
+  {40, 200, 0, true, 0, 5000, 0, 0},
+};
+const byte STREAM_COUNT = sizeof(streams) / sizeof(streams[0]);
+
+#define BASE_BAUD 9600
+#define BAUD_SWITCH_WINDOW_MS 1000  // an unverified baud switch reverts to BASE_BAUD after this
+unsigned long baudSwitchedAt = 0;   // millis() of the unverified switch, 0 = none
+
+void setup() {
+  Serial.begin(BASE_BAUD);
+  turretServo.attach(MICRO_SERVO_SG90_PIN);
+  pinMode(PIEZO_BUZZER_PIN, OUTPUT);
+  pinMode(LED_PIN, OUTPUT);
+}
+
+int irSensorReading() {
+  int raw = analogRead(IR_GP2Y0A21YK0F_PIN);
+  float voltage = raw * (5.0 / 1023.0);  // convert ADC to voltage (assuming 5V ref)
+
+  if (voltage <= 0.42) {
+    return -1; // out of range / invalid
+  }
+
+  float distance_cm = 27.86 / (voltage - 0.42);
+  return (int)distance_cm;
+}
+
+bool shouldSend(SensorStream *s, float value, bool force) {
+  unsigned long now = millis();
+  if (!force && s->deadband > 0 && fabs(value - s->lastSent) <= s->deadband
+      && now - s->lastSentAt < s->keyframeMs) {
+    return false;
+  }
+  s->lastSent = value;
+  s->lastSentAt = now;
+  return true;
+}
+
+void reportSensor(SensorStream *s, bool force) {
+  switch (s->id) {
+    case 40: {
+      int value = irSensorReading();
+      if (!shouldSend(s, value, force)) return;
+      Serial.print("40,");
+      Serial.print(value);
+      break;
+    }
+  }
+  Serial.print(';');
+}
+
+SensorStream *findStream(long id) {
+  for (byte i = 0; i < STREAM_COUNT; i++) {
+    if (streams[i].id == id) return &streams[i];
+  }
+  return NULL;
+}
+
+bool samplingCommand(int command, long id, long value) {
+  SensorStream *s = findStream(id);
+  if (s == NULL) return false;
+  switch (command) {
+    case 10:  // <id>,<ms>: set the period and resume
+      if (value <= 0) return false;
+      s->periodMs = value;
+      s->enabled = true;
+      break;
+    case 11:
+      s->enabled = false;
+      break;
+    case 12:
+      s->enabled = true;
+      break;
+    case 13:
+      reportSensor(s, true);
+      break;
+    case 14:  // <id>,<deadband x100>
+      if (value < 0) return false;
+      s->deadband = value / 100.0;
+      break;
+    case 15:  // <id>,<ms>
+      if (value <= 0) return false;
+      s->keyframeMs = value;
+      break;
+  }
+  return true;
+}
+
+// ---- Command handling: "<command>[,<param>[,<param2>]];" -> "A" (done) / "E" (unknown) ----
+void dispatch(int command, long param, long param2) {
+  switch (command) {
+    case 2:  // beep for <param> ms (200 if missing)
+      tone(PIEZO_BUZZER_PIN, 1000, param > 0 ? param : 200);
+      break;
+    case 20:  // servo angle <param> degrees
+      turretServo.write(constrain(param, 0, 180));
+      break;
+    case 30:  // LED on (1) / off
+      digitalWrite(LED_PIN, param == 1 ? HIGH : LOW);
+      break;
+    case 10:  // sampling: period / pause / resume / read now / deadband / keyframe
+    case 11:
+    case 12:
+    case 13:
+    case 14:
+    case 15:
+      if (!samplingCommand(command, param, param2)) {
+        Serial.println("E");
+        return;
+      }
+      break;
+    case 16:  // link: switch to <param> baud (confirmed by a ping at the new rate)
+      if (param != 9600 && param != 115200 && param != 250000 && param != 1000000) {
+        Serial.println("E");
+        return;
+      }
+      Serial.println("A");
+      Serial.flush();
+      Serial.end();
+      Serial.begin(param);
+      baudSwitchedAt = millis() | 1;
+      return;
+    case 17:  // link: ping, echoes "P<param>" and confirms a baud switch
+      baudSwitchedAt = 0;
+      Serial.print('P');
+      Serial.println(param);
+      return;
+    default:
+      Serial.println("E");
+      return;
+  }
+  Serial.println("A");
+}
+
+void loop() {
+  // Commands are parsed as the bytes arrive: no line buffer, no atoi
+  static int command = 0;
+  static long params[2] = {0, 0};
+  static byte field = 0;  // 0 = command, 1 = param, 2 = param2
+  static bool negative = false;
+
+  while (Serial.available() > 0) {
+    char c = (char)Serial.read();
+    if (c >= '0' && c <= '9') {
+      if (field == 0) command = command * 10 + (c - '0');
+      else params[field - 1] = params[field - 1] * 10 + (c - '0');
+    } else if (c == '-' && field > 0) {
+      negative = true;
+    } else if (c == ',' || c == ';') {
+      if (negative) params[field - 1] = -params[field - 1];
+      negative = false;
+      if (c == ',') {
+        if (field < 2) field++;
+      } else {
+        dispatch(command, params[0], params[1]);
+        command = 0;
+        params[0] = 0;
+        params[1] = 0;
+        field = 0;
+      }
+    }
+  }
+
+  if (baudSwitchedAt && millis() - baudSwitchedAt >= BAUD_SWITCH_WINDOW_MS) {
+    Serial.end();
+    Serial.begin(BASE_BAUD);
+    baudSwitchedAt = 0;
+  }
+
+  unsigned long now = millis();
+  for (byte i = 0; i < STREAM_COUNT; i++) {
+    if (streams[i].enabled && now - streams[i].last >= streams[i].periodMs) {
+      streams[i].last = now;
+      reportSensor(&streams[i], false);
+    }
+  }
+}
@@ -0,0 +1,171 @@
+# llm.py
+"""
+Async Anthropic client for the agent routes.
+
+- One AsyncAnthropic instance over a pooled httpx connection (keep-alive, no
+  per-request TLS handshake) so LLM round trips never block the event loop.
+- A semaphore caps in-flight Messages API calls.
+- Token usage, including prompt-cache reads/writes, is accumulated for the
+  metrics endpoint.
+- Per-call timeout, and our own retries with full-jitter exponential backoff
+  on 429 / 5xx / connection errors (honouring Retry-After when present).
+  The SDK's built-in retries are disabled so the semaphore and the backoff
+  policy are the only ones in play.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+from typing import Any, AsyncIterator, Optional, Union
+
+import anthropic
+import httpx
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class ClaudeClient:
+    """Bounded-concurrency wrapper around `anthropic.AsyncAnthropic.messages`."""
+
+    def __init__(
+        self,
+        api_key: str,
+        max_concurrency: int = 16,
+        timeout: float = 60.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        max_connections: int = 32,
+        base_url: Optional[str] = None,
+    ):
+        self.timeout = timeout
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrency = max(1, max_concurrency)
+        self._sem = asyncio.Semaphore(self.max_concurrency)
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout,
+        )
+        kwargs: dict = {"api_key": api_key, "http_client": self._http, "max_retries": 0, "timeout": timeout}
+        if base_url:
+            kwargs["base_url"] = base_url
+        self.client = anthropic.AsyncAnthropic(**kwargs)
+        self.in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.usage = {
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cache_read_input_tokens": 0,
+            "cache_creation_input_tokens": 0,
+            "cache_hit_calls": 0,
+            "cache_miss_calls": 0,
+        }
+
+    async def aclose(self) -> None:
+        await self.client.close()
+        await self._http.aclose()
+
+    def _retry_delay(self, attempt: int, err: Exception) -> float:
+        response = getattr(err, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _record_usage(self, message: Any) -> None:
+        usage = getattr(message, "usage", None)
+        if usage is None:
+            return
+        for key in ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens"):
+            self.usage[key] += getattr(usage, key, None) or 0
+        if getattr(usage, "cache_read_input_tokens", None):
+            self.usage["cache_hit_calls"] += 1
+        else:
+            self.usage["cache_miss_calls"] += 1
+
+    @staticmethod
+    def _is_retryable(err: Exception) -> bool:
+        if isinstance(err, anthropic.APIConnectionError):  # includes APITimeoutError
+            return True
+        if isinstance(err, anthropic.APIStatusError):
+            return err.status_code in RETRYABLE_STATUS or err.status_code >= 500
+        return False
+
+    async def create(self, **kwargs: Any) -> Any:
+        """`messages.create` with concurrency cap, timeout and jittered retries."""
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            async with self._sem:
+                self.in_flight += 1
+                self.calls += 1
+                try:
+                    message = await self.client.messages.create(**kwargs)
+                    self._record_usage(message)
+                    return message
+                except Exception as e:
+                    if attempt >= self.max_retries or not self._is_retryable(e):
+                        self.failures += 1
+                        raise
+                    err = e
+                finally:
+                    self.in_flight -= 1
+            # back off outside the semaphore so waiting retries don't hold a slot
+            delay = self._retry_delay(attempt, err)
+            attempt += 1
+            self.retries += 1
+            print(f"[llm] {type(err).__name__}: retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def stream(self, **kwargs: Any) -> AsyncIterator[Union[str, Any]]:
+        """
+        Streaming `messages.create`: yields text deltas (str) as they arrive,
+        then the final Message object. Retries only happen before the first
+        delta has been yielded; after that an error is raised to the caller.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            started = False
+            async with self._sem:
+                self.in_flight += 1
+                self.calls += 1
+                try:
+                    async with self.client.messages.stream(**kwargs) as stream:
+                        async for text in stream.text_stream:
+                            started = True
+                            yield text
+                        final = await stream.get_final_message()
+                    self._record_usage(final)
+                    yield final
+                    return
+                except Exception as e:
+                    if started or attempt >= self.max_retries or not self._is_retryable(e):
+                        self.failures += 1
+                        raise
+                    err = e
+                finally:
+                    self.in_flight -= 1
+            delay = self._retry_delay(attempt, err)
+            attempt += 1
+            self.retries += 1
+            print(f"[llm] {type(err).__name__}: stream retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "usage": dict(self.usage),
+        }
@@ -0,0 +1,143 @@
+# mapping_feed.py
+"""
+Versioned change feed for the mapping registry.
+
+Every mutation of mappings.json is turned into upsert/delete events with a
+monotonically increasing version. Consumers (the /mappings/stream SSE route,
+the long-poll route, in-process listeners) resume from a cursor instead of
+re-reading the whole list.
+
+Cursors look like "<epoch>:<version>". The epoch changes on every process
+start, so a client resuming against a restarted server gets a fresh snapshot
+instead of silently missing events.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+Change = Tuple[str, str, Optional[Dict[str, Any]]]  # (op, mapping id, mapping or None)
+
+
+def diff_mappings(old: List[dict], new: List[dict]) -> List[Change]:
+    """Compute upsert/delete changes that turn `old` into `new` (keyed by mapping id)."""
+    old_by_id = {m.get("id"): m for m in old}
+    new_by_id = {m.get("id"): m for m in new}
+    changes: List[Change] = []
+    for mid, m in new_by_id.items():
+        if old_by_id.get(mid) != m:
+            changes.append(("upsert", mid, m))
+    for mid in old_by_id:
+        if mid not in new_by_id:
+            changes.append(("delete", mid, None))
+    return changes
+
+
+class MappingChangeFeed:
+    """Bounded in-memory log of mapping change events with thread-safe publishing."""
+
+    def __init__(self, retention: int = 1000):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=retention)
+        self._version = 0
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self._listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+
+    @property
+    def version(self) -> int:
+        with self._lock:
+            return self._version
+
+    def cursor(self, version: int) -> str:
+        return f"{self.epoch}:{version}"
+
+    def parse_cursor(self, cursor: Optional[str]) -> Optional[int]:
+        """Return the version encoded in `cursor`, or None if the client must resync."""
+        if not cursor:
+            return None
+        epoch, _, version = cursor.partition(":")
+        if epoch != self.epoch:
+            return None
+        try:
+            return int(version)
+        except ValueError:
+            return None
+
+    def add_listener(self, fn: Callable[[List[Dict[str, Any]]], None]) -> None:
+        """Register a callback invoked (in the publishing thread) with each batch of events."""
+        with self._lock:
+            self._listeners.append(fn)
+
+    def publish(self, changes: List[Change]) -> List[Dict[str, Any]]:
+        """Append events for `changes` and wake every waiting subscriber."""
+        if not changes:
+            return []
+        now = time.time()
+        with self._lock:
+            events = []
+            for op, mapping_id, mapping in changes:
+                self._version += 1
+                event = {"version": self._version, "op": op, "id": mapping_id, "mapping": mapping, "ts": now}
+                self._events.append(event)
+                events.append(event)
+            waiters = list(self._waiters)
+            listeners = list(self._listeners)
+
+        for loop, ev in waiters:
+            try:
+                loop.call_soon_threadsafe(ev.set)
+            except RuntimeError:
+                pass  # loop already closed
+        for fn in listeners:
+            try:
+                fn(events)
+            except Exception as e:
+                print(f"[mapping_feed] listener error: {e}")
+        return events
+
+    def since(self, version: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Events newer than `version`.
+        Returns None when `version` is no longer covered by the retained log
+        (or is from the future), meaning the caller has to take a snapshot.
+        """
+        with self._lock:
+            if version > self._version:
+                return None
+            if version == self._version:
+                return []
+            oldest = self._events[0]["version"] if self._events else self._version + 1
+            if version < oldest - 1:
+                return None
+            return [e for e in self._events if e["version"] > version]
+
+    async def wait(self, version: int, timeout: float) -> Optional[List[Dict[str, Any]]]:
+        """Like since(), but waits up to `timeout` seconds for new events. Returns [] on timeout."""
+        loop = asyncio.get_running_loop()
+        ev = asyncio.Event()
+        key = (loop, ev)
+        with self._lock:
+            self._waiters.add(key)
+        try:
+            deadline = loop.time() + timeout
+            while True:
+                events = self.since(version)
+                if events is None or events:
+                    return events
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return []
+                try:
+                    await asyncio.wait_for(ev.wait(), remaining)
+                except asyncio.TimeoutError:
+                    return []
+                ev.clear()
+        finally:
+            with self._lock:
+                self._waiters.discard(key)
@@ -0,0 +1,209 @@
+# mcp_pool.py
+"""
+Long-lived pool of FastMCP client sessions shared by all requests.
+
+Opening a fresh `Client(MCP_SERVER)` per request spawns a new MCP server
+process for local `server.py` targets, which re-runs setup_server and re-opens
+the serial port (resetting the Arduino). The pool connects once at app
+startup, keeps the sessions alive with periodic pings and reconnects them in
+the background when they drop.
+
+Each session lives inside its own supervisor task, so the client context is
+entered and exited by the same task (which anyio requires).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from fastmcp import Client
+
+
+class _Slot:
+    """One pooled session and its connection state."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.client: Optional[Client] = None
+        self.ready = asyncio.Event()
+        self.broken = asyncio.Event()
+        self.connects = 0
+        self.last_error: Optional[str] = None
+        self.last_ok: Optional[float] = None
+
+
+class MCPSessionPool:
+    """
+    Fixed-size set of connected MCP sessions with a global in-flight limit.
+
+    MCP multiplexes requests over one session, so for a local stdio server a
+    single session (size=1) is usually what you want: every extra session is
+    another server process competing for the serial port.
+    """
+
+    def __init__(
+        self,
+        target: str,
+        size: int = 1,
+        max_concurrency: int = 8,
+        health_interval: float = 15.0,
+        acquire_timeout: float = 10.0,
+        client_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        self.target = target
+        self.size = max(1, size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.health_interval = health_interval
+        self.acquire_timeout = acquire_timeout
+        self.client_kwargs: Dict[str, Any] = dict(client_kwargs or {})
+        self._slots = [_Slot(i) for i in range(self.size)]
+        self._rr = itertools.count()
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._tasks: List[asyncio.Task] = []
+        self._closing = False
+        self._in_flight = 0
+        self._connect_listeners: List[Callable[[int], None]] = []
+
+    # ---------------------------------------------------------------
+    # Lifecycle
+    # ---------------------------------------------------------------
+    def add_connect_listener(self, fn: Callable[[int], None]) -> None:
+        """Call `fn(slot_index)` every time a session (re)connects."""
+        self._connect_listeners.append(fn)
+
+    async def start(self, wait: Optional[float] = None) -> None:
+        """Spawn the session supervisors and health checker; optionally wait for a first session."""
+        self._closing = False
+        self._sem = asyncio.Semaphore(self.max_concurrency)
+        for slot in self._slots:
+            self._tasks.append(asyncio.create_task(self._supervise(slot), name=f"mcp-session-{slot.index}"))
+        self._tasks.append(asyncio.create_task(self._health_loop(), name="mcp-health"))
+        if wait:
+            try:
+                await self._wait_any_ready(wait)
+            except asyncio.TimeoutError:
+                print(f"[mcp_pool] No MCP session ready after {wait}s; will keep retrying in background")
+
+    async def close(self) -> None:
+        self._closing = True
+        for slot in self._slots:
+            slot.broken.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _supervise(self, slot: _Slot) -> None:
+        backoff = 0.5
+        while not self._closing:
+            client = Client(self.target, **self.client_kwargs)
+            try:
+                async with client:
+                    await client.ping()
+                    slot.client = client
+                    slot.connects += 1
+                    slot.last_ok = time.time()
+                    slot.last_error = None
+                    slot.broken.clear()
+                    slot.ready.set()
+                    backoff = 0.5
+                    print(f"[mcp_pool] Session {slot.index} connected to {self.target}")
+                    for fn in self._connect_listeners:
+                        try:
+                            fn(slot.index)
+                        except Exception as e:
+                            print(f"[mcp_pool] connect listener error: {e}")
+                    await slot.broken.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                slot.last_error = str(e)
+                print(f"[mcp_pool] Session {slot.index} failed: {e}")
+            finally:
+                slot.ready.clear()
+                slot.client = None
+            if self._closing:
+                break
+            await asyncio.sleep(backoff + random.uniform(0, backoff / 2))
+            backoff = min(backoff * 2, 30.0)
+
+    async def _health_loop(self) -> None:
+        while not self._closing:
+            await asyncio.sleep(self.health_interval)
+            for slot in self._slots:
+                client = slot.client
+                if client is None or not slot.ready.is_set():
+                    continue
+                try:
+                    await asyncio.wait_for(client.ping(), timeout=self.acquire_timeout)
+                    slot.last_ok = time.time()
+                except Exception as e:
+                    slot.last_error = f"health check failed: {e}"
+                    print(f"[mcp_pool] Session {slot.index} {slot.last_error}; reconnecting")
+                    slot.broken.set()
+
+    # ---------------------------------------------------------------
+    # Use
+    # ---------------------------------------------------------------
+    async def _wait_any_ready(self, timeout: float) -> _Slot:
+        ready = [s for s in self._slots if s.ready.is_set()]
+        if ready:
+            return ready[next(self._rr) % len(ready)]
+        waiters = [asyncio.create_task(s.ready.wait()) for s in self._slots]
+        try:
+            done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for w in waiters:
+                w.cancel()
+        if not done:
+            raise asyncio.TimeoutError
+        return next(s for s in self._slots if s.ready.is_set())
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[Client]:
+        """Borrow a connected client. The connection is shared; do not close it."""
+        if self._sem is None:
+            raise RuntimeError("MCP session pool not started")
+        async with self._sem:
+            try:
+                slot = await self._wait_any_ready(self.acquire_timeout)
+            except asyncio.TimeoutError:
+                errors = "; ".join(s.last_error for s in self._slots if s.last_error) or "not connected"
+                raise RuntimeError(f"MCP server unavailable ({self.target}): {errors}")
+            client = slot.client
+            self._in_flight += 1
+            try:
+                yield client
+            except Exception:
+                # Tool errors leave the session usable; a dead transport does not.
+                is_connected = getattr(client, "is_connected", None)
+                if callable(is_connected) and not is_connected():
+                    slot.last_error = "connection lost during request"
+                    slot.broken.set()
+                raise
+            finally:
+                self._in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "target": self.target,
+            "size": self.size,
+            "ready": sum(1 for s in self._slots if s.ready.is_set()),
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "sessions": [
+                {
+                    "index": s.index,
+                    "ready": s.ready.is_set(),
+                    "connects": s.connects,
+                    "last_ok": s.last_ok,
+                    "last_error": s.last_error,
+                }
+                for s in self._slots
+            ],
+        }
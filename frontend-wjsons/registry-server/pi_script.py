@@ -0,0 +1,198 @@
+# pi_script.py
+"""
+Part-aware Raspberry Pi script generation.
+
+The generated script drives the mapped parts with lgpio and is event driven:
+inputs are claimed for edge alerts and handled in lgpio callbacks, which get
+the edge time from the kernel (nanoseconds), so short pulses are not missed
+and nothing waits on a polling interval. The HC-SR04 trigger is a hardware-
+timed pulse train (lgpio.tx_pulse) and its distance comes from the echo's
+rising/falling edge timestamps. Events are written to stdout as telemetry
+packets "<id>,<value>,<t>;" (t in ms since start), the channel
+boilerplate/driver.py uses; diagnostics go to stderr.
+
+PI_PARTS is the catalog, per partId. Like the Arduino catalog (firmware.py),
+parts are single-instance: a second mapping of the same part, or one with
+too few pins, only gets a numbered pin constant.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+from firmware import TELEMETRY_BUTTON, TELEMETRY_DIGITAL_INPUT, TELEMETRY_ULTRASONIC, macro_name
+
+BUTTON_DEBOUNCE_US = 5000
+ULTRASONIC_PERIOD_US = 100000  # one measurement every 100 ms
+ULTRASONIC_MAX_ECHO_US = 25000  # ~4 m; a longer echo means no object in range
+
+
+@dataclass(frozen=True)
+class PiPart:
+    part_id: str
+    pins: Tuple[str, ...]            # constant per pin, in mapping pin order
+    roles: Tuple[str, ...] = ()      # pin role per pin (boards.ts roles), for the constants' comments
+    constants: Tuple[str, ...] = ()
+    setup: Tuple[str, ...] = ()      # lines of setup()
+    functions: str = ""              # callbacks
+    start: Tuple[str, ...] = ()      # lines of main() that arm callbacks / pulse trains
+    stop: Tuple[str, ...] = ()       # lines of cleanup()
+
+
+def _input_part(part_id: str, pin: str, telemetry_id: int, handler: str, value: str, doc: str) -> PiPart:
+    """Pulled-up, debounced input reported on both edges."""
+    return PiPart(
+        part_id, (pin,),
+        setup=(f"lgpio.gpio_claim_alert(h, {pin}, lgpio.BOTH_EDGES, lgpio.SET_PULL_UP)",
+               f"lgpio.gpio_set_debounce_micros(h, {pin}, BUTTON_DEBOUNCE_US)"),
+        functions=f'''def {handler}(chip, gpio, level, tick):
+    """{doc}"""
+    if level != 2:  # 2 = watchdog timeout, not an edge
+        send_telemetry({telemetry_id}, {value}, tick)''',
+        start=(f"callbacks.append(lgpio.callback(h, {pin}, lgpio.BOTH_EDGES, {handler}))",),
+    )
+
+
+def _output_part(part_id: str) -> PiPart:
+    pin = macro_name(part_id)
+    return PiPart(part_id, (pin,), setup=(f"lgpio.gpio_claim_output(h, {pin})",))
+
+
+PI_PARTS: Dict[str, PiPart] = {p.part_id: p for p in (
+    _output_part("led"),
+    _output_part("buzzer"),
+    _output_part("relay"),
+    _input_part("button", "BUTTON_PIN", TELEMETRY_BUTTON, "on_button", "1 if level == 0 else 0",
+                "Button edge (active low): 1 = pressed, 0 = released."),
+    _input_part("digital_sensor", "DIGITAL_SENSOR_PIN", TELEMETRY_DIGITAL_INPUT, "on_digital_sensor", "level",
+                "Digital sensor edge: the new level."),
+    PiPart(
+        "hcsr04", ("HCSR04_TRIGGER_PIN", "HCSR04_ECHO_PIN"),
+        roles=("Trigger", "Echo"),
+        constants=("echo_rise = None  # tick of the echo's rising edge",),
+        setup=("lgpio.gpio_claim_output(h, HCSR04_TRIGGER_PIN)",
+               "lgpio.gpio_claim_alert(h, HCSR04_ECHO_PIN, lgpio.BOTH_EDGES)"),
+        functions=f'''def on_echo(chip, gpio, level, tick):
+    """Echo pulse width from the edge timestamps -> distance in cm (-1 = nothing in range)."""
+    global echo_rise
+    if level == 1:
+        echo_rise = tick
+    elif level == 0 and echo_rise is not None:
+        width_us = (tick - echo_rise) / 1000
+        echo_rise = None
+        send_telemetry({TELEMETRY_ULTRASONIC}, round(width_us / 58) if width_us < ULTRASONIC_MAX_ECHO_US else -1, tick)''',
+        # 10 us trigger pulses timed by lgpio, not by a Python loop
+        start=("callbacks.append(lgpio.callback(h, HCSR04_ECHO_PIN, lgpio.BOTH_EDGES, on_echo))",
+               "lgpio.tx_pulse(h, HCSR04_TRIGGER_PIN, 10, ULTRASONIC_PERIOD_US - 10)"),
+        stop=("lgpio.tx_pulse(h, HCSR04_TRIGGER_PIN, 0, 0)",),
+    ),
+)}
+
+# Tuning constants, emitted when a part that uses them is mapped
+_TUNING = {
+    "BUTTON_DEBOUNCE_US": (BUTTON_DEBOUNCE_US, ("button", "digital_sensor")),
+    "ULTRASONIC_PERIOD_US": (ULTRASONIC_PERIOD_US, ("hcsr04",)),
+    "ULTRASONIC_MAX_ECHO_US": (ULTRASONIC_MAX_ECHO_US, ("hcsr04",)),
+}
+
+
+def pi_parts(mappings: List[Dict[str, Any]]) -> Tuple[List[str], List[PiPart]]:
+    """Pin constants and the catalog parts to build, from normalized mappings."""
+    constants: List[str] = []
+    parts: List[PiPart] = []
+    seen: Dict[str, int] = {}
+    for m in mappings:
+        pins = m["pins"]
+        if not pins:
+            continue
+        comment = m["label"] or m["role"]
+        part = PI_PARTS.get(m["partId"])
+        n = seen[m["partId"]] = seen.get(m["partId"], 0) + 1
+        if part is None or n > 1 or len(pins) < len(part.pins):
+            suffix = f"_{n}" if n > 1 else ""
+            constants.append(f"{macro_name(m['partId'])}{suffix} = {pins[0]}  # {comment}")
+            continue
+        if part.roles:
+            # one mapping role for the whole part; each pin is commented with its own
+            comments = [f"{m['label']} {role}" if m["label"] else role for role in part.roles]
+        else:
+            comments = [comment] * len(part.pins)
+        constants.extend(f"{name} = {pin}  # {c}" for name, pin, c in zip(part.pins, pins, comments))
+        parts.append(part)
+    return constants, parts
+
+
+def generate_pi_script(mappings: List[Dict[str, Any]], board_id: str) -> str:
+    constants, parts = pi_parts(mappings)
+    mapped = {p.part_id for p in parts}
+    tuning = [f"{name} = {value}" for name, (value, users) in _TUNING.items() if mapped.intersection(users)]
+    lines = [
+        f"# Generated Python code for {board_id}",
+        "# Hardware control script (lgpio, event driven: inputs are handled in edge",
+        "# callbacks; events go to stdout as \"<id>,<value>,<t>;\", t = ms since start)",
+        "",
+        "import signal",
+        "import sys",
+        "import threading",
+        "import time",
+        "",
+        "import lgpio",
+        "",
+        "# Pin definitions (BCM)",
+        *constants,
+        "",
+        *tuning,
+        *(c for p in parts for c in p.constants),
+        "",
+        "h = None  # GPIO chip handle",
+        "callbacks = []",
+        "START_NS = time.time_ns()  # lgpio edge ticks are in the same clock",
+        "_out_lock = threading.Lock()",
+        "",
+        "def send_telemetry(telemetry_id, value, tick):",
+        "    \"\"\"One \"<id>,<value>,<t>;\" packet; `tick` is the edge time from lgpio (ns).\"\"\"",
+        "    with _out_lock:",
+        "        print(f\"{telemetry_id},{value},{(tick - START_NS) // 1000000};\", flush=True)",
+        "",
+        "def setup():",
+        "    global h",
+        "    h = lgpio.gpiochip_open(0)",
+        *("    " + s for p in parts for s in p.setup),
+        "",
+    ]
+    for p in parts:
+        if p.functions:
+            lines.extend(p.functions.splitlines() + [""])
+    lines.extend([
+        "def cleanup():",
+        "    \"\"\"Cancel the callbacks and release the GPIO chip\"\"\"",
+        "    for cb in callbacks:",
+        "        cb.cancel()",
+        "    if h is not None:",
+        *("        " + s for p in parts for s in p.stop),
+        "        lgpio.gpiochip_close(h)",
+        "",
+        "def main():",
+        "    \"\"\"Arm the edge callbacks and wait; all input handling runs in lgpio's callback thread\"\"\"",
+        "    try:",
+        "        setup()",
+        *("        " + s for p in parts for s in p.start),
+        f"        print('Hardware controller started for {board_id}', file=sys.stderr)",
+    ])
+    for m in mappings:
+        if m["pins"]:
+            lines.append(f"        print('  {m['partId']} ({m['role']}): GPIO {m['pins'][0]}', file=sys.stderr)")
+    lines.extend([
+        "        signal.pause()",
+        "    except KeyboardInterrupt:",
+        "        print('\\nShutting down...', file=sys.stderr)",
+        "    finally:",
+        "        cleanup()",
+        "",
+        "if __name__ == '__main__':",
+        "    main()",
+        "",
+    ])
+    # optional blocks may leave two blank lines in a row
+    return "\n".join(line for i, line in enumerate(lines) if line or i == 0 or lines[i - 1])
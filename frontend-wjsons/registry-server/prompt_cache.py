@@ -0,0 +1,54 @@
+# prompt_cache.py
+"""
+Prompt-cache breakpoints for agent requests.
+
+The request prefix is tools -> system -> messages. We mark:
+  1. the last tool definition (the catalog is canonical, so this prefix is
+     byte-identical between catalog refreshes),
+  2. the static system prompt,
+  3. the last message of the stored conversation history, and
+  4. the last message of the current turn (so later tool rounds of the same
+     turn reuse everything before them).
+That is the API maximum of four. Prompts shorter than the model's minimum
+cacheable length are simply not cached.
+
+All helpers copy what they touch; shared catalog / session objects are never
+mutated.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+EPHEMERAL = {"type": "ephemeral"}
+
+
+def cached_tools(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    if not tools:
+        return tools
+    return tools[:-1] + [dict(tools[-1], cache_control=EPHEMERAL)]
+
+
+def system_blocks(static_prompt: str, dynamic: str = "") -> List[Dict[str, Any]]:
+    """Static prompt with a breakpoint, then the per-session part (not cached)."""
+    blocks: List[Dict[str, Any]] = [{"type": "text", "text": static_prompt, "cache_control": EPHEMERAL}]
+    if dynamic:
+        blocks.append({"type": "text", "text": dynamic})
+    return blocks
+
+
+def mark_last_message(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Copy of `messages` with a breakpoint on the final content block of the last message."""
+    if not messages:
+        return messages
+    last = messages[-1]
+    content = last.get("content")
+    if isinstance(content, str):
+        if not content:
+            return messages
+        blocks = [{"type": "text", "text": content, "cache_control": EPHEMERAL}]
+    elif isinstance(content, list) and content:
+        blocks = content[:-1] + [dict(content[-1], cache_control=EPHEMERAL)]
+    else:
+        return messages
+    return messages[:-1] + [dict(last, content=blocks)]
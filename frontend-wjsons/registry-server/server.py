@@ -3,17 +3,32 @@ from __future__ import annotations
 import os
 import json
 import base64
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Dict, Any, List, Optional, Union
+from typing import Dict, Any, AsyncIterator, List, Optional, Union
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
-from fastmcp import Client
 import anthropic
 
+from codegen import CodegenEngine
+from fast_router import FastRouter
+from mapping_feed import MappingChangeFeed, diff_mappings
+from llm import ClaudeClient
+from mcp_pool import MCPSessionPool
+from prompt_cache import cached_tools, mark_last_message, system_blocks
+from sessions import SessionStore
+from stage_timing import stage_timer, timed
+from tool_catalog import ToolCatalog
+from tool_executor import run_tool_calls
+
 # -------------------------------------------------------------------
 # Env / Globals
 # -------------------------------------------------------------------
@@ -21,17 +36,87 @@ load_dotenv(".env.local")  # keep your current env layout
 
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 CLAUDE_MODEL = os.getenv("CLAUDE_MODEL", "claude-3-5-haiku-20241022")
+# Static system prompt; kept constant so it stays in the prompt cache
+AGENT_SYSTEM_PROMPT = os.getenv(
+    "AGENT_SYSTEM_PROMPT",
+    "You are the assistant for a hobby hardware board (Arduino Leonardo or Raspberry Pi) "
+    "wired up through a mapping registry. Use the available tools to act on or read the "
+    "connected devices instead of guessing. Report sensor readings with their units, keep "
+    "answers short, and say plainly when a tool fails or a sensor returns no value.",
+)
 # Path to the MCP server script in the mhacks25_server directory
 MCP_SERVER = os.getenv("MCP_SERVER", "../../../mhacks25_server/server.py")
 # Bearer token for your FastMCP deployment (if using cloud)
 FASTMCP_BEARER_TOKEN = os.getenv("FASTMCP_BEARER_TOKEN")
+# Mapping change feed: how many events to retain for resume, and SSE keepalive period
+MAPPING_FEED_RETENTION = int(os.getenv("MAPPING_FEED_RETENTION", "1000"))
+MAPPING_STREAM_KEEPALIVE = float(os.getenv("MAPPING_STREAM_KEEPALIVE", "15"))
+# Shared MCP sessions. Each local (stdio) session is its own server process that
+# opens the serial port, so keep MCP_POOL_SIZE=1 unless MCP_SERVER is remote.
+MCP_POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", "1"))
+MCP_MAX_CONCURRENCY = int(os.getenv("MCP_MAX_CONCURRENCY", "8"))
+MCP_HEALTH_INTERVAL = float(os.getenv("MCP_HEALTH_INTERVAL", "15"))
+MCP_ACQUIRE_TIMEOUT = float(os.getenv("MCP_ACQUIRE_TIMEOUT", "10"))
+# Delay before re-listing tools after a mapping change; the MCP server polls
+# mappings.json once a second before re-registering its tools.
+CATALOG_MAPPING_DELAY = float(os.getenv("CATALOG_MAPPING_DELAY", "1.5"))
+# Anthropic calls: in-flight cap, per-call timeout and retry policy
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+# Independent tool_use blocks of one response run concurrently up to this limit
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+# Agent loop: tool rounds per turn, and bounded per-session conversation memory
+AGENT_MAX_TOOL_ROUNDS = int(os.getenv("AGENT_MAX_TOOL_ROUNDS", "4"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))
+SESSION_TOKEN_BUDGET = int(os.getenv("SESSION_TOKEN_BUDGET", "6000"))
+# Deterministic fast path for simple commands ("beep for 500 ms"); 0 sends everything to Claude
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "1") == "1"
+# Generated code artifacts kept by content hash of (mappings, boardId, template)
+CODEGEN_CACHE_SIZE = int(os.getenv("CODEGEN_CACHE_SIZE", "256"))
+# Optional override, e.g. a local fake Messages API for load tests
+ANTHROPIC_BASE_URL = os.getenv("ANTHROPIC_BASE_URL")
 
 if not ANTHROPIC_API_KEY:
     raise RuntimeError("ANTHROPIC_API_KEY missing from .env.local")
 
-anth = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+claude = ClaudeClient(
+    ANTHROPIC_API_KEY,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    timeout=LLM_TIMEOUT,
+    max_retries=LLM_MAX_RETRIES,
+    base_url=ANTHROPIC_BASE_URL,
+)
+
+# For local server.py files, we don't need bearer tokens.
+# Only add bearer token for cloud deployments (https URLs)
+_mcp_client_kwargs: Dict[str, Any] = {}
+if FASTMCP_BEARER_TOKEN and MCP_SERVER.startswith("https://"):
+    _mcp_client_kwargs["headers"] = {"Authorization": f"Bearer {FASTMCP_BEARER_TOKEN}"}
+
+mcp_pool = MCPSessionPool(
+    MCP_SERVER,
+    size=MCP_POOL_SIZE,
+    max_concurrency=MCP_MAX_CONCURRENCY,
+    health_interval=MCP_HEALTH_INTERVAL,
+    acquire_timeout=MCP_ACQUIRE_TIMEOUT,
+    client_kwargs=_mcp_client_kwargs,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Connect to the MCP server once; requests borrow the warm session
+    await tool_catalog.start()
+    await mcp_pool.start(wait=MCP_ACQUIRE_TIMEOUT)
+    try:
+        yield
+    finally:
+        await tool_catalog.close()
+        await mcp_pool.close()
+        await claude.aclose()
 
-app = FastAPI(title="Mapping Registry + Agent", version="1.1.0")
+app = FastAPI(title="Mapping Registry + Agent", version="1.1.0", lifespan=lifespan)
 
 # Allow your Next.js site to call this in dev
 app.add_middleware(
@@ -83,255 +168,43 @@ def load_all() -> List[dict]:
 def save_all(items: List[dict]) -> None:
     DATA_FILE.write_text(json.dumps(items, indent=2))
 
+# Serializes read-modify-write of mappings.json so change events match what was stored
+_store_lock = threading.Lock()
+mapping_feed = MappingChangeFeed(retention=MAPPING_FEED_RETENTION)
+
+def commit_mappings(old: List[dict], new: List[dict]) -> List[dict]:
+    """Persist `new` and publish the upsert/delete events that lead from `old` to it."""
+    save_all(new)
+    return mapping_feed.publish(diff_mappings(old, new))
+
+def sse_event(event: str, data: Any, event_id: Optional[str] = None) -> str:
+    """Format one Server-Sent Events frame."""
+    frame = f"event: {event}\n"
+    if event_id:
+        frame += f"id: {event_id}\n"
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+async def mapping_snapshot() -> Dict[str, Any]:
+    """Full mapping list plus the cursor it is valid from.
+
+    The version is read before the file, so a concurrent write can only make
+    the snapshot newer than its cursor; replaying that event is harmless
+    because upserts/deletes are idempotent.
+    """
+    version = mapping_feed.version
+    items = await asyncio.to_thread(load_all)
+    return {"cursor": mapping_feed.cursor(version), "version": version, "mappings": items}
+
 # -------------------------------------------------------------------
-# Boilerplate Code Generation
+# Code generation (compiled template + content-hash cache, see codegen.py)
 # -------------------------------------------------------------------
-def get_actual_pin_number(board_id: str, board_position: int) -> int:
-    """Convert board position to actual pin number for Arduino boards"""
-    # Arduino Leonardo pin mapping (board position -> actual pin)
-    if board_id == 'leonardo':
-        leonardo_mapping = {
-            # Top row (left to right): SCL SDA AREF GND 13 12 11 10 9 8 7 6 5 4 3 2 1 0
-            5: 13, 6: 12, 7: 11, 8: 10, 9: 9, 10: 8, 11: 7, 12: 6, 
-            13: 5, 14: 4, 15: 3, 16: 2, 17: 1, 18: 0,
-            # Bottom row analog pins
-            26: 'A0', 27: 'A1', 28: 'A2', 29: 'A3', 30: 'A4', 31: 'A5'
-        }
-        return leonardo_mapping.get(board_position, board_position)
-    
-    # For Raspberry Pi or other boards, use the board position as-is
-    return board_position
-
-def generate_pin_definitions(mappings: List[Mapping]) -> List[str]:
-    """Generate #define statements for pins from mappings"""
-    pin_list = []
-    for mapping in mappings:
-        if mapping.pins:  # Only if pins are defined
-            # The mapping now already contains the actual pin number
-            actual_pin = mapping.pins[0]
-            pin_str = f"#define {mapping.partId.upper()}_PIN {actual_pin}"
-            pin_list.append(pin_str)
-    return pin_list
-
-def get_boilerplate_code() -> str:
-    """Load the boilerplate C code template"""
-    boilerplate_path = Path(__file__).parent.parent.parent / "boilerplate" / "boilerplate.c"
-    if boilerplate_path.exists():
-        return boilerplate_path.read_text()
-    else:
-        # Fallback boilerplate if file doesn't exist
-        return '''#include <Servo.h>
-
-Servo turretServo;
-
-char inputBuffer[32];     // buffer for incoming serial data
-byte bufferIndex = 0;
-
-unsigned long lastIrSend = 0;    // timer for IR reporting
-const unsigned long irInterval = 200; // send IR data every 200ms
-
-void setup() {
-  Serial.begin(9600);
-  pinMode(LED_PIN, OUTPUT);
-  pinMode(BUZZER_PIN, OUTPUT);
-  turretServo.attach(SERVO_PIN);
-}
-
-void servo_write(int angle) {
-  turretServo.write(angle);
-}
-
-int irSensorReading() {
-  return analogRead(IR_PIN);
-}
-
-void buzzer_duration(int duration) {
-  tone(BUZZER_PIN, 1000);
-  delay(duration);
-  noTone(BUZZER_PIN);
-}
-
-void led_on() {
-  digitalWrite(LED_PIN, HIGH);
-}
-
-void led_off() {
-  digitalWrite(LED_PIN, LOW);
-}
-
-void processCommand(char *cmd) {
-  // Find comma if present
-  char *comma = strchr(cmd, ',');
-  int command = 0;
-  int param   = 0;
-
-  if (comma) {
-    *comma = '\\0'; // split string into two parts
-    command = atoi(cmd);
-    param   = atoi(comma + 1);
-  } else {
-    command = atoi(cmd);
-  }
-
-  // ---- Command handling ----
-  if (command == 2) {           // Piezo test (no param)
-    buzzer_duration(200);
-    Serial.println("A");
-  }
-  else if (command == 20) {     // Servo write (needs param)
-    servo_write(param);
-    Serial.println("A");
-  }
-  else if (command == 30) {     // LED write (needs param)
-    if (param == 1) led_on();
-    else led_off();
-    Serial.println("A");
-  }
-  else {
-    Serial.println("E");        // Unknown command
-  }
-}
-
-void loop() {
-  // Handle incoming serial commands
-  while (Serial.available() > 0) {
-    char inChar = (char)Serial.read();
-
-    if (inChar == ';') { // end of command
-      inputBuffer[bufferIndex] = '\\0';  // null terminate
-      processCommand(inputBuffer);
-      bufferIndex = 0;
-    }
-    else {
-      if (bufferIndex < sizeof(inputBuffer) - 1) {
-        inputBuffer[bufferIndex++] = inChar;
-      }
-    }
-  }
-
-  // ---- Always stream IR values ----
-  unsigned long now = millis();
-  if (now - lastIrSend >= irInterval) {
-    lastIrSend = now;
-    int irValue = irSensorReading();
-    Serial.print("40,");
-    Serial.println(irValue);
-  }
-}'''
-
-def generate_raspberry_pi_code(mappings: List[Mapping], board_id: str) -> str:
-    """Generate Python code for Raspberry Pi"""
-    code_lines = [
-        f"# Generated Python code for {board_id}",
-        "# Hardware control script",
-        "",
-        "import RPi.GPIO as GPIO",
-        "import time",
-        "import serial",
-        "import json",
-        "",
-        "# Pin definitions",
-    ]
-    
-    # Add pin definitions
-    for mapping in mappings:
-        if mapping.pins:
-            pin_name = f"{mapping.partId.upper()}_PIN"
-            # The mapping now already contains the actual pin number
-            actual_pin = mapping.pins[0]
-            code_lines.append(f"{pin_name} = {actual_pin}  # {mapping.label or mapping.role}")
-    
-    code_lines.extend([
-        "",
-        "# GPIO setup",
-        "GPIO.setmode(GPIO.BCM)",
-        "GPIO.setwarnings(False)",
-        "",
-        "# Setup pins based on part types",
-    ])
-    
-    # Setup pins based on part types
-    for mapping in mappings:
-        if mapping.pins:
-            pin_name = f"{mapping.partId.upper()}_PIN"
-            if mapping.partId in ['led', 'buzzer', 'relay']:
-                code_lines.append(f"GPIO.setup({pin_name}, GPIO.OUT)")
-            elif mapping.partId in ['button', 'digital_sensor']:
-                code_lines.append(f"GPIO.setup({pin_name}, GPIO.IN, pull_up_down=GPIO.PUD_UP)")
-            elif mapping.partId == 'hcsr04':
-                if mapping.role == 'Trigger':
-                    code_lines.append(f"GPIO.setup({pin_name}, GPIO.OUT)")
-                elif mapping.role == 'Echo':
-                    code_lines.append(f"GPIO.setup({pin_name}, GPIO.IN)")
-    
-    code_lines.extend([
-        "",
-        "def cleanup():",
-        "    \"\"\"Clean up GPIO pins\"\"\"",
-        "    GPIO.cleanup()",
-        "",
-        "def main():",
-        "    \"\"\"Main control loop\"\"\"",
-        "    try:",
-        "        print(f'Hardware controller started for {board_id}')",
-        "        print('Available pins:')",
-    ])
-    
-    # Print available pins
-    for mapping in mappings:
-        if mapping.pins:
-            code_lines.append(f"        print('  {mapping.partId} ({mapping.role}): GPIO {mapping.pins[0]}')")
-    
-    code_lines.extend([
-        "",
-        "        # Main control loop",
-        "        while True:",
-        "            # Add your control logic here",
-        "            time.sleep(0.1)",
-        "",
-        "    except KeyboardInterrupt:",
-        "        print('\\nShutting down...')",
-        "    finally:",
-        "        cleanup()",
-        "",
-        "if __name__ == '__main__':",
-        "    main()",
-    ])
-    
-    return "\n".join(code_lines)
-
-def generate_arduino_code(mappings: List[Mapping], board_id: str) -> str:
-    """Generate complete Arduino code with pin definitions and boilerplate"""
-    pin_definitions = generate_pin_definitions(mappings)
-    boilerplate = get_boilerplate_code()
-    
-    # Combine pin definitions with boilerplate
-    code_lines = [
-        f"// Generated Arduino code for {board_id}",
-        "// Pin Definitions",
-    ]
-    
-    for pin_def in pin_definitions:
-        code_lines.append(pin_def)
-    
-    code_lines.extend(["", boilerplate])
-    
-    return "\n".join(code_lines)
-
-def generate_code_for_board(mappings: List[Mapping], board_id: str) -> tuple[str, str]:
-    """Generate code appropriate for the board type. Returns (code, file_extension)"""
-    if board_id.startswith('pi') or 'raspberry' in board_id.lower():
-        # Raspberry Pi - generate Python code
-        code = generate_raspberry_pi_code(mappings, board_id)
-        return code, "py"
-    else:
-        # Arduino - generate Arduino code
-        code = generate_arduino_code(mappings, board_id)
-        return code, "ino"
+FIRMWARE_SKELETON_FILE = Path(__file__).parent.parent.parent / "boilerplate" / "skeleton.c"
+codegen = CodegenEngine(FIRMWARE_SKELETON_FILE, cache_size=CODEGEN_CACHE_SIZE)
 
 # -------------------------------------------------------------------
 # Helper: format MCP tools for Claude
 # -------------------------------------------------------------------
+@timed("format_tools_for_claude")
 def format_tools_for_claude(mcp_tools: List[Any]) -> List[Dict[str, Any]]:
     """
     Convert FastMCP Tool objects to Claude-compatible format.
@@ -393,13 +266,29 @@ def format_tools_for_claude(mcp_tools: List[Any]) -> List[Dict[str, Any]]:
         })
     return tools_out
 
+# -------------------------------------------------------------------
+# Tool catalog: formatted tools kept warm, refreshed in the background
+# -------------------------------------------------------------------
+tool_catalog = ToolCatalog(mcp_pool, format_tools_for_claude)
+mcp_pool.client_kwargs["message_handler"] = tool_catalog.on_mcp_message
+mcp_pool.add_connect_listener(lambda index: tool_catalog.invalidate(f"mcp session {index} connected"))
+mapping_feed.add_listener(
+    lambda events: tool_catalog.invalidate_threadsafe("mappings changed", delay=CATALOG_MAPPING_DELAY)
+)
+
 # -------------------------------------------------------------------
 # Helper: convert MCP tool result for Claude tool_result
 # -------------------------------------------------------------------
+@timed("serialize_tool_result_for_claude")
 def serialize_tool_result_for_claude(result) -> Dict[str, Any]:
     blocks: List[Dict[str, Any]] = []
+    structured = getattr(result, "structured_content", None)
 
-    if hasattr(result, "content") and result.content:
+    if isinstance(structured, dict):
+        # tools with an output schema: the structured result is the whole answer
+        # (its text content block is the same JSON again)
+        blocks.append({"type": "text", "text": json.dumps(structured, ensure_ascii=False, separators=(",", ":"))})
+    elif hasattr(result, "content") and result.content:
         for b in result.content:
             t = getattr(b, "type", None)
             if t == "text" and hasattr(b, "text"):
@@ -426,72 +315,212 @@ def serialize_tool_result_for_claude(result) -> Dict[str, Any]:
     status = {"type": "text", "text": f"[tool {'ok' if ok else 'error'}]"}
     return {"content": [status] + blocks}
 
+# -------------------------------------------------------------------
+# Conversation memory per ChatIn.session_id
+# -------------------------------------------------------------------
+sessions = SessionStore(max_sessions=SESSION_MAX, ttl=SESSION_TTL, token_budget=SESSION_TOKEN_BUDGET)
+
+def content_to_dicts(content) -> List[Dict[str, Any]]:
+    """Plain-dict copy of SDK content blocks, so stored history holds no SDK objects."""
+    out = []
+    for block in content:
+        if hasattr(block, "model_dump"):
+            out.append(block.model_dump(exclude_none=True))
+        else:
+            out.append(dict(block))
+    return out
+
+# -------------------------------------------------------------------
+# Helper: execute one tool_use block
+# -------------------------------------------------------------------
+def tool_device_key(tu) -> Optional[str]:
+    """Calls to the same tool drive the same actuator, so they keep their requested order."""
+    return getattr(tu, "name", None)
+
+async def execute_tool_use(tu) -> Dict[str, Any]:
+    """Run one tool_use block over the shared MCP session and build its tool_result block."""
+    try:
+        async with mcp_pool.session() as mcp:
+            with stage_timer.measure("mcp_call_tool"):
+                result = await mcp.call_tool(tu.name, tu.input)
+        tr = serialize_tool_result_for_claude(result)
+        return {
+            "type": "tool_result",
+            "tool_use_id": tu.id,
+            "content": tr["content"],
+        }
+    except Exception as e:
+        return {
+            "type": "tool_result",
+            "tool_use_id": tu.id,
+            "content": [{"type": "text", "text": f"[tool error] {e}"}],
+            "is_error": True,
+        }
+
+# -------------------------------------------------------------------
+# Fast path: simple commands bypass Claude
+# -------------------------------------------------------------------
+fast_router = FastRouter()
+
 # -------------------------------------------------------------------
 # Core: run one agent turn (ask Claude, run tools if requested, finalize)
 # -------------------------------------------------------------------
-async def run_agent_once(user_text: str) -> str:
-    # Configure FastMCP client
-    # For local server.py files, we don't need bearer tokens
-    client_kwargs = {}
-    
-    # Only add bearer token for cloud deployments (https URLs)
-    if FASTMCP_BEARER_TOKEN and MCP_SERVER.startswith("https://"):
-        client_kwargs["headers"] = {"Authorization": f"Bearer {FASTMCP_BEARER_TOKEN}"}
-    
-    # Connect to the MCP server
-    async with Client(MCP_SERVER, **client_kwargs) as mcp:
-        # ensure server is reachable and enumerate tools
-        await mcp.ping()
-        tools = await mcp.list_tools()
-        claude_tools = format_tools_for_claude(tools)
-
-        # 1) Ask Claude what to do
-        msg = anth.messages.create(
-            model=CLAUDE_MODEL,
-            max_tokens=1024,
-            messages=[{"role": "user", "content": user_text}],
-            tools=claude_tools,
-            tool_choice={"type": "auto"},
-        )
-
-        # 2) If Claude decides to call tools, execute, then send back results
-        if msg.stop_reason == "tool_use":
-            tool_uses = [c for c in msg.content if getattr(c, "type", None) == "tool_use"]
-            tool_results_content: List[Dict[str, Any]] = []
+def _reply_text(message) -> str:
+    parts = [c.text for c in message.content if getattr(c, "type", None) == "text"]
+    return ("".join(parts)).strip() or "(no reply)"
+
+async def _claude_events(stream: bool, **kwargs) -> AsyncIterator[Dict[str, Any]]:
+    """Forward text deltas as `token` events (when streaming); the final Message comes last as `_final`."""
+    if not stream:
+        yield {"type": "_final", "message": await claude.create(**kwargs)}
+        return
+    async for item in claude.stream(**kwargs):
+        if isinstance(item, str):
+            yield {"type": "token", "text": item}
+        else:
+            yield {"type": "_final", "message": item}
+
+async def _run_tools_with_progress(tool_uses) -> AsyncIterator[Dict[str, Any]]:
+    """Run tool calls concurrently, yielding tool_start/tool_end events as they happen.
+    The last event is `_results` with the tool_result blocks in tool_use order."""
+    progress: asyncio.Queue = asyncio.Queue()
+
+    async def run_one(tu):
+        progress.put_nowait({"type": "tool_start", "id": tu.id, "name": tu.name, "input": tu.input})
+        t0 = time.perf_counter()
+        block = await execute_tool_use(tu)
+        progress.put_nowait({
+            "type": "tool_end",
+            "id": tu.id,
+            "name": tu.name,
+            "ok": not block.get("is_error", False),
+            "ms": round((time.perf_counter() - t0) * 1000, 1),
+        })
+        return block
 
-            for tu in tool_uses:
-                try:
-                    result = await mcp.call_tool(tu.name, tu.input)
-                    tr = serialize_tool_result_for_claude(result)
-                    tool_results_content.append({
-                        "type": "tool_result",
-                        "tool_use_id": tu.id,
-                        "content": tr["content"],
-                    })
-                except Exception as e:
-                    tool_results_content.append({
-                        "type": "tool_result",
-                        "tool_use_id": tu.id,
-                        "content": [{"type": "text", "text": f"[tool error] {e}"}],
-                        "is_error": True,
-                    })
-
-            # 3) Final natural-language answer
-            final = anth.messages.create(
+    task = asyncio.create_task(run_tool_calls(tool_uses, run_one, tool_device_key, limit=TOOL_MAX_CONCURRENCY))
+    try:
+        while not task.done():
+            getter = asyncio.create_task(progress.get())
+            await asyncio.wait({task, getter}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield getter.result()
+            else:
+                getter.cancel()
+        while not progress.empty():
+            yield progress.get_nowait()
+        yield {"type": "_results", "blocks": task.result()}
+    finally:
+        if not task.done():
+            task.cancel()
+
+async def agent_events(user_text: str, session_id: str = "default", stream: bool = True) -> AsyncIterator[Dict[str, Any]]:
+    """
+    One agent turn as a stream of events:
+      token       {text}                      Claude output as it is generated (stream=True only)
+      tool_start  {id, name, input}
+      tool_end    {id, name, ok, ms}
+      message     {reply, rounds, ms}         final answer (always last)
+
+    Simple commands that the fast router recognises with high confidence are
+    executed directly against the MCP server, without a Claude call; their
+    message event carries `fast_path: true`.
+
+    The turn continues the conversation stored for `session_id` and may take up
+    to AGENT_MAX_TOOL_ROUNDS tool rounds; the last allowed round forbids tools
+    so Claude has to answer. History is only stored once the turn completes.
+    """
+    t_start = time.perf_counter()
+    # Pre-formatted tool list from the catalog; no MCP round trip on the request path
+    _, claude_tools = await tool_catalog.get(cold_timeout=MCP_ACQUIRE_TIMEOUT)
+
+    route = fast_router.match(user_text, claude_tools, tool_catalog.resources) if FAST_PATH_ENABLED else None
+    if route is None:
+        fast_router.record_fallback()
+    else:
+        session = sessions.get(session_id or "default")
+        async with session.lock:
+            # same order guarantees as a Claude-driven turn of this session
+            yield {"type": "tool_start", "id": "fast", "name": route.target, "input": route.args}
+            t0 = time.perf_counter()
+            reply, ok = await fast_router.execute(route, mcp_pool)
+            yield {"type": "tool_end", "id": "fast", "name": route.target, "ok": ok,
+                   "ms": round((time.perf_counter() - t0) * 1000, 1)}
+            sessions.commit(session, [
+                {"role": "user", "content": user_text},
+                {"role": "assistant", "content": reply},
+            ])
+        yield {
+            "type": "message",
+            "reply": reply,
+            "rounds": 0,
+            "fast_path": True,
+            "ms": round((time.perf_counter() - t_start) * 1000, 1),
+        }
+        return
+
+    session = sessions.get(session_id or "default")
+    async with session.lock:
+        # Cache breakpoints: tools, static system prompt, stored history, current turn
+        history = mark_last_message(session.history())
+        turn: List[Dict[str, Any]] = [{"role": "user", "content": user_text}]
+        tools = cached_tools(claude_tools)
+        system = system_blocks(AGENT_SYSTEM_PROMPT, session.summary() or "")
+
+        rounds = 0
+        while True:
+            # 1) Ask Claude what to do (or, on the last round, to answer)
+            last_round = rounds >= AGENT_MAX_TOOL_ROUNDS
+            msg = None
+            t_llm = time.perf_counter()
+            async for ev in _claude_events(
+                stream,
                 model=CLAUDE_MODEL,
                 max_tokens=1024,
-                messages=[
-                    {"role": "user", "content": user_text},
-                    {"role": "assistant", "content": msg.content},          # includes tool_use blocks
-                    {"role": "user", "content": tool_results_content},      # tool_result blocks
-                ],
-            )
-            parts = [c.text for c in final.content if getattr(c, "type", None) == "text"]
-            return ("".join(parts)).strip() or "(no reply)"
-        else:
-            # No tool call; just return text
-            parts = [c.text for c in msg.content if getattr(c, "type", None) == "text"]
-            return ("".join(parts)).strip() or "(no reply)"
+                system=system,
+                messages=history + mark_last_message(turn),
+                tools=tools,
+                tool_choice={"type": "none" if last_round else "auto"},
+            ):
+                if ev["type"] == "_final":
+                    msg = ev["message"]
+                else:
+                    yield ev
+            stage_timer.record("llm_call", time.perf_counter() - t_llm)
+            turn.append({"role": "assistant", "content": content_to_dicts(msg.content)})  # includes tool_use blocks
+
+            if msg.stop_reason != "tool_use" or last_round:
+                break
+
+            # 2) Claude asked for tools: execute them and feed the results back
+            rounds += 1
+            tool_uses = [c for c in msg.content if getattr(c, "type", None) == "tool_use"]
+            tool_results_content: List[Dict[str, Any]] = []
+            t_tools = time.perf_counter()
+            async for ev in _run_tools_with_progress(tool_uses):
+                if ev["type"] == "_results":
+                    tool_results_content = ev["blocks"]
+                else:
+                    yield ev
+            stage_timer.record("tool_round", time.perf_counter() - t_tools)
+            turn.append({"role": "user", "content": tool_results_content})  # tool_result blocks
+
+        sessions.commit(session, turn)
+
+    stage_timer.record("agent_turn", time.perf_counter() - t_start)
+    yield {
+        "type": "message",
+        "reply": _reply_text(msg),
+        "rounds": rounds,
+        "ms": round((time.perf_counter() - t_start) * 1000, 1),
+    }
+
+async def run_agent_once(user_text: str, session_id: str = "default") -> str:
+    reply = "(no reply)"
+    async for ev in agent_events(user_text, session_id, stream=False):
+        if ev["type"] == "message":
+            reply = ev["reply"]
+    return reply
 
 # -------------------------------------------------------------------
 # Routes (existing)
@@ -509,12 +538,13 @@ def replace_mappings(batch: MappingBatch):
     """Replace all mappings with the provided batch (complete replacement)."""
     # Convert all mappings to dict format
     new_mappings = [m.model_dump() for m in batch.mappings]
-    save_all(new_mappings)
+    with _store_lock:
+        events = commit_mappings(load_all(), new_mappings)
     
     # Notify MCP server to reload tools
     try:
         # This could be expanded to actually call the MCP server to reload
-        print(f"Mappings updated. New count: {len(new_mappings)}")
+        print(f"Mappings updated. New count: {len(new_mappings)} ({len(events)} change events)")
         # TODO: Add actual MCP server notification here
     except Exception as e:
         print(f"Error notifying MCP server: {e}")
@@ -526,27 +556,79 @@ def add_mappings(batch: MappingBatch):
     """Add/merge mappings with existing ones (merge operation)."""
     if not batch.mappings:
         raise HTTPException(400, "No mappings provided")
-    current = load_all()
-    # naive merge by id (replace if same id)
-    ids = {m["id"] for m in current}
-    for m in batch.mappings:
-        d = m.model_dump()
-        if m.id in ids:
-            current = [d if x["id"] == m.id else x for x in current]
-        else:
-            current.append(d)
-    save_all(current)
+    with _store_lock:
+        old = load_all()
+        current = list(old)
+        # naive merge by id (replace if same id)
+        ids = {m["id"] for m in current}
+        for m in batch.mappings:
+            d = m.model_dump()
+            if m.id in ids:
+                current = [d if x["id"] == m.id else x for x in current]
+            else:
+                current.append(d)
+                ids.add(m.id)
+        commit_mappings(old, current)
     return {"ok": True, "count": len(batch.mappings)}
 
 @app.delete("/mappings/{mapping_id}")
 def delete_mapping(mapping_id: str):
-    current = load_all()
-    new = [m for m in current if m.get("id") != mapping_id]
-    if len(new) == len(current):
-        raise HTTPException(404, "Mapping not found")
-    save_all(new)
+    with _store_lock:
+        current = load_all()
+        new = [m for m in current if m.get("id") != mapping_id]
+        if len(new) == len(current):
+            raise HTTPException(404, "Mapping not found")
+        commit_mappings(current, new)
     return {"ok": True}
 
+@app.get("/mappings/stream")
+async def stream_mappings(request: Request, since: Optional[str] = None):
+    """
+    Server-Sent Events stream of mapping changes.
+    Starts with a `snapshot` event unless the client resumes with a cursor
+    (Last-Event-ID header or ?since=) that is still in the retained log, then
+    pushes `upsert` / `delete` events as they happen.
+    """
+    version = mapping_feed.parse_cursor(request.headers.get("last-event-id") or since)
+
+    async def events():
+        nonlocal version
+        if version is None or mapping_feed.since(version) is None:
+            snap = await mapping_snapshot()
+            version = snap["version"]
+            yield sse_event("snapshot", snap, snap["cursor"])
+        while not await request.is_disconnected():
+            batch = await mapping_feed.wait(version, MAPPING_STREAM_KEEPALIVE)
+            if batch is None:
+                # fell behind the retained log; resync with a full snapshot
+                snap = await mapping_snapshot()
+                version = snap["version"]
+                yield sse_event("snapshot", snap, snap["cursor"])
+            elif not batch:
+                yield ": keepalive\n\n"
+            else:
+                for ev in batch:
+                    version = ev["version"]
+                    yield sse_event(ev["op"], ev, mapping_feed.cursor(version))
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/mappings/changes")
+async def poll_mapping_changes(since: Optional[str] = None, timeout: float = 25.0):
+    """Long-poll fallback for clients that cannot hold an SSE connection open."""
+    version = mapping_feed.parse_cursor(since)
+    if version is not None:
+        batch = await mapping_feed.wait(version, max(0.0, min(timeout, 60.0)))
+        if batch is not None:
+            if batch:
+                version = batch[-1]["version"]
+            return {"cursor": mapping_feed.cursor(version), "events": batch}
+    return await mapping_snapshot()
+
 @app.post("/generate-code")
 def generate_code(request: CodeGenerationRequest):
     """Generate code from mappings (Python for Pi, Arduino for Arduino boards)"""
@@ -554,17 +636,23 @@ def generate_code(request: CodeGenerationRequest):
         raise HTTPException(400, "No mappings provided")
     
     try:
-        code, file_extension = generate_code_for_board(request.mappings, request.boardId)
+        code, file_extension, cached = codegen.generate(request.mappings, request.boardId)
         return {
             "ok": True,
             "code": code,
             "boardId": request.boardId,
             "mappingCount": len(request.mappings),
-            "fileExtension": file_extension
+            "fileExtension": file_extension,
+            "cached": cached,
         }
     except Exception as e:
         raise HTTPException(500, f"Code generation failed: {str(e)}")
 
+@app.get("/generate-code/stats")
+def generate_code_stats():
+    """Code generation cache counters and the loaded boilerplate template version."""
+    return codegen.stats()
+
 # -------------------------------------------------------------------
 # New Routes (agent)
 # -------------------------------------------------------------------
@@ -572,29 +660,28 @@ def generate_code(request: CodeGenerationRequest):
 async def agent_health():
     # Basic checks: API key present and MCP server pings
     try:
-        # Configure client with Bearer token if available
-        client_kwargs = {}
-        if FASTMCP_BEARER_TOKEN and MCP_SERVER.startswith("https://"):
-            client_kwargs["headers"] = {"Authorization": f"Bearer {FASTMCP_BEARER_TOKEN}"}
-        
-        async with Client(MCP_SERVER, **client_kwargs) as mcp:
+        async with mcp_pool.session() as mcp:
             await mcp.ping()
             tools = await mcp.list_tools()
         return {
             "ok": True, 
             "model": CLAUDE_MODEL, 
             "mcp_server": MCP_SERVER,
+            "mcp_pool": mcp_pool.stats(),
+            "catalog": tool_catalog.stats(),
+            "llm": claude.stats(),
+            "sessions": sessions.stats(),
             "tools": [getattr(t, "name", str(t)) for t in tools]
         }
     except Exception as e:
-        return {"ok": False, "error": str(e), "mcp_server": MCP_SERVER}
+        return {"ok": False, "error": str(e), "mcp_server": MCP_SERVER, "mcp_pool": mcp_pool.stats()}
 
 @app.post("/agent/chat")
 async def agent_chat(body: ChatIn):
     if not body.text.strip():
         raise HTTPException(400, "text is required")
     try:
-        reply = await run_agent_once(body.text)
+        reply = await run_agent_once(body.text, body.session_id)
         return {"reply": reply}
     except anthropic.APIStatusError as e:
         # Anthropic-specific error path
@@ -603,6 +690,63 @@ async def agent_chat(body: ChatIn):
         # Generic error
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/agent/metrics")
+async def agent_metrics():
+    """Counters for the agent path: LLM calls and token usage (incl. prompt-cache hits), fast path, sessions, catalog."""
+    llm = claude.stats()
+    usage = llm["usage"]
+    prompt_tokens = usage["input_tokens"] + usage["cache_read_input_tokens"] + usage["cache_creation_input_tokens"]
+    return {
+        "llm": llm,
+        "prompt_cache": {
+            "read_tokens": usage["cache_read_input_tokens"],
+            "write_tokens": usage["cache_creation_input_tokens"],
+            "uncached_tokens": usage["input_tokens"],
+            "hit_calls": usage["cache_hit_calls"],
+            "miss_calls": usage["cache_miss_calls"],
+            "read_ratio": (usage["cache_read_input_tokens"] / prompt_tokens) if prompt_tokens else 0.0,
+        },
+        "fast_path": dict(fast_router.metrics(), enabled=FAST_PATH_ENABLED),
+        "stages": stage_timer.snapshot(),
+        "sessions": sessions.stats(),
+        "catalog": tool_catalog.stats(),
+        "mcp_pool": mcp_pool.stats(),
+    }
+
+@app.delete("/agent/metrics/stages")
+async def reset_stage_metrics():
+    """Clear the per-stage latency samples (e.g. between benchmark runs)."""
+    stage_timer.reset()
+    return {"ok": True}
+
+@app.delete("/agent/sessions/{session_id}")
+async def reset_session(session_id: str):
+    """Forget the conversation history of one session."""
+    if not sessions.drop(session_id):
+        raise HTTPException(404, "Session not found")
+    return {"ok": True}
+
+@app.post("/agent/chat/stream")
+async def agent_chat_stream(body: ChatIn):
+    """SSE variant of /agent/chat: token, tool_start, tool_end, then message (or error)."""
+    if not body.text.strip():
+        raise HTTPException(400, "text is required")
+
+    async def events():
+        try:
+            async for ev in agent_events(body.text, body.session_id):
+                yield sse_event(ev["type"], ev)
+        except anthropic.APIStatusError as e:
+            yield sse_event("error", {"type": "error", "status": e.status_code or 500, "detail": str(e)})
+        except Exception as e:
+            yield sse_event("error", {"type": "error", "status": 500, "detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # -------------------------------------------------------------------
 # Startup
 # -------------------------------------------------------------------
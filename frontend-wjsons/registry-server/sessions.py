@@ -0,0 +1,163 @@
+# sessions.py
+"""
+Bounded conversation memory for /agent/chat, keyed by ChatIn.session_id.
+
+- Sessions live in an LRU (OrderedDict) capped at `max_sessions`, and expire
+  after `ttl` seconds without use. Expired sessions sit at the LRU front, so
+  eviction is a cheap pop from the left on every access. Sessions with a turn
+  in flight, and the one being returned, are never evicted; while nothing else
+  can go the store may briefly hold more than `max_sessions`.
+- Each session keeps its message history (including tool_use / tool_result
+  pairs) within `token_budget` estimated tokens. Older turns are dropped whole,
+  so a tool_use is never separated from its tool_result, and a one-line digest
+  of each dropped turn is kept (also bounded) for the system prompt.
+
+Token counts are estimates (~4 characters per token); they only drive
+truncation, not billing.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional
+
+CHARS_PER_TOKEN = 4
+DIGEST_CHARS = 160
+
+
+def estimate_tokens(message: Dict[str, Any]) -> int:
+    content = message.get("content")
+    size = len(content) if isinstance(content, str) else len(json.dumps(content, default=str))
+    return size // CHARS_PER_TOKEN + 4
+
+
+def _text_of(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(b.get("text", "") for b in content if isinstance(b, dict) and b.get("type") == "text")
+    return ""
+
+
+def _is_turn_start(message: Dict[str, Any]) -> bool:
+    """A turn starts with a user message that is not a tool_result reply."""
+    if message.get("role") != "user":
+        return False
+    content = message.get("content")
+    if isinstance(content, list):
+        return not any(isinstance(b, dict) and b.get("type") == "tool_result" for b in content)
+    return True
+
+
+class ChatSession:
+    """Message history of one conversation. Hold `lock` while running a turn."""
+
+    def __init__(self, session_id: str, max_digests: int):
+        self.id = session_id
+        self.messages: List[Dict[str, Any]] = []
+        self.tokens = 0
+        self.digests: Deque[str] = deque(maxlen=max_digests)
+        self.last_used = time.monotonic()
+        self.turns = 0
+        self.lock = asyncio.Lock()
+
+    def history(self) -> List[Dict[str, Any]]:
+        return list(self.messages)
+
+    def summary(self) -> Optional[str]:
+        """Digest of turns that were truncated away, for the system prompt."""
+        if not self.digests:
+            return None
+        return "Earlier in this conversation (older turns omitted):\n" + "\n".join(self.digests)
+
+
+class SessionStore:
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        ttl: float = 1800.0,
+        token_budget: int = 6000,
+        max_digests: int = 8,
+    ):
+        self.max_sessions = max(1, max_sessions)
+        self.ttl = ttl
+        self.token_budget = token_budget
+        self.max_digests = max_digests
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self.evicted = 0
+        self.truncated_turns = 0
+
+    def _evict(self, now: float, keep: str) -> None:
+        # bounded scan: sessions with a turn in flight are skipped, not spun on.
+        # `keep` (the session get() is returning) is never evicted; if nothing
+        # else can go, the store stays over max_sessions until a later access.
+        for _ in range(len(self._sessions)):
+            oldest = next(iter(self._sessions.values()))
+            expired = now - oldest.last_used > self.ttl
+            if not expired and len(self._sessions) <= self.max_sessions:
+                break
+            if oldest.id == keep or oldest.lock.locked():
+                # a turn is running on it; don't pull it out from under the request
+                self._sessions.move_to_end(oldest.id)
+                continue
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+        self._sessions.move_to_end(keep)
+
+    def get(self, session_id: str) -> ChatSession:
+        now = time.monotonic()
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = ChatSession(session_id, self.max_digests)
+            self._sessions[session_id] = session
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_used = now
+        self._evict(now, session_id)
+        return session
+
+    def drop(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def commit(self, session: ChatSession, turn: List[Dict[str, Any]]) -> None:
+        """Append a completed turn and truncate the oldest whole turns to fit the budget."""
+        session.messages.extend(turn)
+        session.tokens += sum(estimate_tokens(m) for m in turn)
+        session.turns += 1
+        session.last_used = time.monotonic()
+
+        while session.tokens > self.token_budget:
+            # find where the second turn starts; the newest turn is always kept
+            cut = next((i for i in range(1, len(session.messages)) if _is_turn_start(session.messages[i])), None)
+            if cut is None:
+                break
+            dropped, session.messages = session.messages[:cut], session.messages[cut:]
+            session.tokens -= sum(estimate_tokens(m) for m in dropped)
+            session.digests.append(self._digest(dropped))
+            self.truncated_turns += 1
+
+    @staticmethod
+    def _digest(turn: List[Dict[str, Any]]) -> str:
+        question = _text_of(turn[0].get("content"))[:DIGEST_CHARS]
+        tools = [b.get("name") for m in turn if m.get("role") == "assistant" and isinstance(m.get("content"), list)
+                 for b in m["content"] if isinstance(b, dict) and b.get("type") == "tool_use"]
+        answer = _text_of(turn[-1].get("content"))[:DIGEST_CHARS] if turn[-1].get("role") == "assistant" else ""
+        line = f"- user: {question!r}"
+        if tools:
+            line += f" -> tools: {', '.join(tools)}"
+        if answer:
+            line += f" -> assistant: {answer!r}"
+        return line
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "ttl_s": self.ttl,
+            "token_budget": self.token_budget,
+            "evicted": self.evicted,
+            "truncated_turns": self.truncated_turns,
+        }
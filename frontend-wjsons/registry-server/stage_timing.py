@@ -0,0 +1,104 @@
+# stage_timing.py
+"""
+Per-stage latency counters for the agent loop.
+
+Wrap a stage with `stage_timer.measure("name")` (or decorate a function with
+`timed("name")`) and read count / total / p50 / p95 / max per stage from
+`stage_timer.snapshot()`. Samples are kept in a bounded window per stage, so
+leaving it on in production is cheap.
+
+The same file is used by frontend-wjsons/registry-server and
+real_copy_of_server; golden/check_golden.py fails if the two copies differ.
+"""
+
+import functools
+import inspect
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict
+
+WINDOW = 10000
+
+
+def _pct(ordered, pct: float) -> float:
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+class StageTimer:
+    def __init__(self, window: int = WINDOW):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+        self._totals: Dict[str, float] = {}
+
+    def record(self, stage: str, seconds: float) -> None:
+        samples = self._samples.get(stage)
+        if samples is None:
+            samples = self._samples[stage] = deque(maxlen=self.window)
+            self._counts[stage] = 0
+            self._totals[stage] = 0.0
+        samples.append(seconds)
+        self._counts[stage] += 1
+        self._totals[stage] += seconds
+
+    @contextmanager
+    def measure(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - t0)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for stage, samples in sorted(self._samples.items()):
+            ordered = sorted(samples)
+            out[stage] = {
+                "count": self._counts[stage],
+                "total_ms": round(self._totals[stage] * 1000, 3),
+                "mean_ms": round(self._totals[stage] * 1000 / self._counts[stage], 3),
+                "p50_ms": round(_pct(ordered, 50) * 1000, 3),
+                "p95_ms": round(_pct(ordered, 95) * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3),
+            }
+        return out
+
+    def reset(self) -> None:
+        self._samples.clear()
+        self._counts.clear()
+        self._totals.clear()
+
+
+# Process-wide timer used by the agent code paths
+stage_timer = StageTimer()
+
+
+def timed(stage: str, timer: StageTimer = stage_timer):
+    """Decorator recording each call of a sync or async function under `stage`."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with timer.measure(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer.measure(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def format_table(snapshot: Dict[str, Dict[str, Any]]) -> str:
+    """Plain-text table of a snapshot, for benchmark output."""
+    lines = [f"  {'stage':<36}{'count':>8}{'mean ms':>11}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"]
+    for stage, s in snapshot.items():
+        lines.append(f"  {stage:<36}{s['count']:>8}{s['mean_ms']:>11.3f}{s['p50_ms']:>10.3f}"
+                     f"{s['p95_ms']:>10.3f}{s['max_ms']:>10.3f}")
+    return "\n".join(lines)
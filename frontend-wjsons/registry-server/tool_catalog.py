@@ -0,0 +1,176 @@
+# tool_catalog.py
+"""
+In-memory, pre-formatted Claude tool catalog.
+
+/agent/chat used to run `list_tools()` + `format_tools_for_claude` on every
+request. The catalog does that in a background task instead and hands out the
+last formatted list immediately. It is refreshed when:
+  - the MCP server sends `notifications/tools/list_changed`
+  - the mapping registry changes (debounced, the MCP server picks up
+    mappings.json on its own ~1 s file poll)
+  - a pooled MCP session (re)connects
+
+The formatted tools are canonicalized (sorted by name, sorted keys) so the
+serialized payload is byte-identical across refreshes when nothing changed;
+its hash is the catalog version. That keeps it usable as a prompt-cache prefix.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from mcp_pool import MCPSessionPool
+
+TOOLS_LIST_CHANGED = "notifications/tools/list_changed"
+RESOURCES_LIST_CHANGED = "notifications/resources/list_changed"
+
+
+def canonical_tools_payload(tools: List[Dict[str, Any]]) -> bytes:
+    """Deterministic serialization of a formatted tool list."""
+    ordered = sorted(tools, key=lambda t: t.get("name", ""))
+    return json.dumps(ordered, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class ToolCatalog:
+    """Formatted tool list keyed by a content-hash version, refreshed off the request path."""
+
+    def __init__(
+        self,
+        pool: MCPSessionPool,
+        formatter: Callable[[List[Any]], List[Dict[str, Any]]],
+        retry_delay: float = 5.0,
+    ):
+        self.pool = pool
+        self.formatter = formatter
+        self.retry_delay = retry_delay
+        self.version: Optional[str] = None
+        self.payload: bytes = b"[]"
+        self.refreshed_at: Optional[float] = None
+        self.refreshes = 0
+        self.last_error: Optional[str] = None
+        self._tools: List[Dict[str, Any]] = []
+        # resource URIs (sorted), for direct reads outside the Claude tool list
+        self.resources: List[str] = []
+        self._loaded = asyncio.Event()
+        self._wake = asyncio.Event()
+        self._due: Optional[float] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ---------------------------------------------------------------
+    # Lifecycle
+    # ---------------------------------------------------------------
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.create_task(self._run(), name="tool-catalog")
+        self.invalidate("startup")
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # ---------------------------------------------------------------
+    # Invalidation
+    # ---------------------------------------------------------------
+    def invalidate(self, reason: str, delay: float = 0.0) -> None:
+        """Schedule a background refresh `delay` seconds from now (event-loop thread only)."""
+        if self._loop is None:
+            return
+        due = self._loop.time() + delay
+        # debounce: a burst of changes results in a single refresh after the last one
+        self._due = due if self._due is None else max(self._due, due)
+        print(f"[tool_catalog] invalidated ({reason}), refresh in {delay:.1f}s")
+        self._wake.set()
+
+    def invalidate_threadsafe(self, reason: str, delay: float = 0.0) -> None:
+        """invalidate() callable from any thread (e.g. the sync mapping routes)."""
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self.invalidate, reason, delay)
+
+    async def on_mcp_message(self, message: Any) -> None:
+        """FastMCP client message_handler: refresh on tools/ or resources/list_changed."""
+        root = getattr(message, "root", message)
+        method = getattr(root, "method", None)
+        if method in (TOOLS_LIST_CHANGED, RESOURCES_LIST_CHANGED):
+            self.invalidate(method.split("/", 1)[1])
+
+    # ---------------------------------------------------------------
+    # Refresh
+    # ---------------------------------------------------------------
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            while self._due is not None:
+                remaining = self._due - self._loop.time()
+                if remaining > 0:
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wake.clear()
+                    continue
+                self._due = None
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    self.last_error = str(e)
+                    print(f"[tool_catalog] refresh failed: {e}; retrying in {self.retry_delay}s")
+                    self._due = self._loop.time() + self.retry_delay
+
+    async def refresh(self) -> bool:
+        """Re-list and re-format the tools. Returns True if the catalog version changed."""
+        async with self.pool.session() as mcp:
+            tools = await mcp.list_tools()
+            try:
+                resources = await mcp.list_resources()
+            except Exception:
+                resources = []
+        self.resources = sorted(str(getattr(r, "uri", r)) for r in resources)
+        payload = canonical_tools_payload(self.formatter(tools))
+        version = hashlib.sha256(payload).hexdigest()[:16]
+        self.refreshed_at = time.time()
+        self.refreshes += 1
+        self.last_error = None
+        changed = version != self.version
+        if changed:
+            # rebuilt from the canonical bytes so dict key order is deterministic too
+            self._tools = json.loads(payload)
+            self.payload = payload
+            self.version = version
+            print(f"[tool_catalog] catalog version {version} ({len(self._tools)} tools)")
+        self._loaded.set()
+        return changed
+
+    # ---------------------------------------------------------------
+    # Read
+    # ---------------------------------------------------------------
+    async def get(self, cold_timeout: float = 10.0) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Current (version, tools). Never waits on discovery once the first load
+        has happened; only a cold start waits up to `cold_timeout` seconds.
+        The returned list is shared: copy before mutating.
+        """
+        if not self._loaded.is_set():
+            try:
+                await asyncio.wait_for(self._loaded.wait(), cold_timeout)
+            except asyncio.TimeoutError:
+                raise RuntimeError(f"Tool catalog not loaded yet: {self.last_error or 'MCP server not ready'}")
+        return self.version or "", self._tools
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "tools": [t.get("name") for t in self._tools],
+            "resources": self.resources,
+            "refreshed_at": self.refreshed_at,
+            "refreshes": self.refreshes,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,59 @@
+# tool_executor.py
+"""
+Concurrent executor for the tool_use blocks of one Claude response.
+
+Independent calls run concurrently (up to `limit` at a time). Calls that share
+a device key (e.g. two commands to the same actuator) run one after another
+in the order Claude requested them. Results come back in the original
+tool_use order regardless of completion order.
+
+The same file is used by frontend-wjsons/registry-server and
+real_copy_of_server; golden/check_golden.py fails if the two copies differ.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+async def run_tool_calls(
+    calls: Sequence[T],
+    run_one: Callable[[T], Awaitable[R]],
+    device_key: Callable[[T], Optional[Hashable]],
+    limit: int = 4,
+) -> List[R]:
+    """
+    Execute `run_one(call)` for every call and return the results in input order.
+    `device_key(call)` returning None marks a call as free of ordering constraints.
+    """
+    if not calls:
+        return []
+    sem = asyncio.Semaphore(max(1, limit))
+    results: List[Any] = [None] * len(calls)
+    last_for_key: Dict[Hashable, asyncio.Task] = {}
+
+    async def run(index: int, call: T, previous: Optional[asyncio.Task]) -> None:
+        if previous is not None:
+            # same device: wait for the earlier call, whatever its outcome
+            await asyncio.gather(previous, return_exceptions=True)
+        async with sem:
+            results[index] = await run_one(call)
+
+    tasks = []
+    for index, call in enumerate(calls):
+        key = device_key(call)
+        previous = last_for_key.get(key) if key is not None else None
+        task = asyncio.create_task(run(index, call, previous))
+        if key is not None:
+            last_for_key[key] = task
+        tasks.append(task)
+
+    outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            raise outcome
+    return results
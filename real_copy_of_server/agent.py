@@ -3,39 +3,89 @@
 Replacement agent that:
 - Presents MCP tools + resources to Claude (Anthropic).
 - Allows Claude to request tool/resource calls.
-- Executes tool/resource calls sequentially.
-- Feeds each tool result back to Claude as an assistant message so Claude can
+- Executes independent tool/resource calls concurrently (calls to the same
+  tool stay in the order Claude requested them).
+- Feeds tool results back as proper tool_use / tool_result pairs so Claude can
   chain multiple calls in one conversation (e.g., read sensor -> beep -> final answer).
-- Normalizes various MCP return shapes and explicitly highlights "No value" responses.
+  Each result is a compact, size-capped summary, and the oldest tool rounds are
+  folded into one-line digests once the conversation exceeds its token budget,
+  so every iteration's prompt stays about the same size.
+- Normalizes the structured tool/resource results (schemas.py) with a type
+  dispatch and explicitly highlights readings that have no value.
+- Marks the stable prompt prefix (tool definitions, system prompt, chat-log
+  preamble) and the latest message with prompt-cache breakpoints, and reports
+  cache read/write token counts.
+- Records per-stage latencies (tool formatting, result serialization and
+  normalization, MCP round trips, Claude calls) in stage_timing.stage_timer.
 
 Notes:
 - This file assumes your existing MCP server and tools (server.py) are running.
-- It preserves the (synchronous) Anthropic client usage pattern from your original file.
+- It preserves the (synchronous) Anthropic client usage pattern from your original file;
+  calls run in a worker thread so concurrent conversations don't block each other.
+- run_conversation() is the agent loop on its own, so bench/agent_bench.py (in the
+  registry server) can drive it against a fake Messages API and MCP server.
+- `python agent.py --daemon` keeps the MCP session and tool list warm and runs
+  every line appended to the chat log (see chat_log_tail.py) through a bounded
+  pool of AGENT_WORKERS conversations, instead of rereading the whole log per run.
 """
 
+import argparse
 import asyncio
 import os
 import json
+import functools
 import re
-import base64
+import time
 from typing import Any, Dict, List, Tuple
 from fastmcp import Client
 import anthropic
 from dotenv import load_dotenv
 
+from chat_log_tail import ChatLogTail
+from stage_timing import stage_timer, timed
+from tool_executor import run_tool_calls
+
 load_dotenv(".env.local")
 api_key = os.getenv("ANTHROPIC_API_KEY")
 if not api_key:
     raise RuntimeError("ANTHROPIC_API_KEY not found in .env.local")
 
 # configuration
-FULL_CHAT_LOG_PATH = "/Users/wenboxu/Documents/mhacks_25/frontend-wjsons/registry-server/chat_log.txt"
+FULL_CHAT_LOG_PATH = os.getenv(
+    "FULL_CHAT_LOG_PATH",
+    "/Users/wenboxu/Documents/mhacks_25/frontend-wjsons/registry-server/chat_log.txt",
+)
+MCP_SERVER = os.getenv("AGENT_MCP_SERVER", "server.py")
 CLAUDE_MODEL = "claude-3-5-haiku-20241022"  # keep as you had it; change if needed
+MAX_PARALLEL_TOOLS = int(os.getenv("MAX_PARALLEL_TOOLS", "4"))  # concurrent tool/resource calls per turn
+SYSTEM_PROMPT = (
+    "You control a hobby hardware board through MCP tools and sensor resources. "
+    "The first user message is the chat log you are acting on. Call tools or read "
+    "resources as needed, then give a short final answer. A sensor result of "
+    "'No value' means no reading is available, not a numeric zero."
+)
+CACHE_CONTROL = {"type": "ephemeral"}
+MAX_ITER = 12  # Claude calls per conversation, guards against tool-call loops
+# Daemon mode: concurrent conversations, and chat-log entries waiting for a worker.
+# Entries handled by different workers may overlap on the hardware; use 1 for strict order.
+AGENT_WORKERS = int(os.getenv("AGENT_WORKERS", "2"))
+AGENT_QUEUE_MAX = int(os.getenv("AGENT_QUEUE_MAX", "16"))
+TOOLS_LIST_CHANGED = "notifications/tools/list_changed"
+RESOURCES_LIST_CHANGED = "notifications/resources/list_changed"
+# Tool results: characters per tool_result, and estimated tokens of tool rounds kept per conversation
+RESULT_MAX_CHARS = int(os.getenv("RESULT_MAX_CHARS", "400"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+# fields of a tool's JSON result worth showing Claude (the rest, e.g. raw ACK bytes, is dropped)
+RESULT_FIELDS = ("message", "value", "unit", "samples", "staleness_s", "cached_ms", "position", "warning", "error")
+CHARS_PER_TOKEN = 4
+DIGEST_CHARS = 120
+MAX_DIGEST_LINES = 8
 
 
 # -----------------------
 # Helpers: format tools/resources (kept from your original file, lightly adapted)
 # -----------------------
+@timed("format_tools_for_claude")
 def format_tools_for_claude(mcp_tools: List[Any]) -> List[Dict[str, Any]]:
     claude_tools = []
 
@@ -83,11 +133,17 @@ def format_tools_for_claude(mcp_tools: List[Any]) -> List[Dict[str, Any]]:
 
 def sanitize_messages_for_claude(msgs):
     """
-    Ensure each message's content is a string and strip trailing whitespace.
-    Converts accidental non-string content to a compact string.
+    Ensure each message's content is a string or a list of content blocks and
+    strip trailing whitespace. Block lists are kept as blocks (they may carry
+    cache_control); any other non-string content is converted to a compact string.
     """
     for m in msgs:
         c = m.get("content")
+        if isinstance(c, list) and all(isinstance(b, dict) and "type" in b for b in c):
+            for b in c:
+                if b.get("type") == "text" and isinstance(b.get("text"), str):
+                    b["text"] = b["text"].rstrip()
+            continue
         if isinstance(c, (list, dict)):
             try:
                 m["content"] = json.dumps(c, default=str)
@@ -99,6 +155,55 @@ def sanitize_messages_for_claude(msgs):
         m["content"] = m["content"].rstrip()
     return msgs
 
+
+def canonicalize_tools(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Sort tools by name and normalize key order so the serialized tools payload
+    is byte-identical across runs (a prerequisite for prompt-cache hits), then
+    put a cache breakpoint on the last tool.
+    """
+    ordered = sorted(tools, key=lambda t: t.get("name", ""))
+    ordered = json.loads(json.dumps(ordered, sort_keys=True, default=str))
+    if ordered:
+        ordered[-1]["cache_control"] = CACHE_CONTROL
+    return ordered
+
+
+def with_rolling_breakpoint(msgs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Copy of msgs with a cache breakpoint on the last message, so the next
+    iteration reads everything up to here from the cache. The preamble keeps
+    its own breakpoint.
+    """
+    if len(msgs) < 2:
+        return msgs
+    last = msgs[-1]
+    content = last.get("content")
+    if isinstance(content, str):
+        blocks = [{"type": "text", "text": content, "cache_control": CACHE_CONTROL}]
+    elif isinstance(content, list) and content:
+        blocks = content[:-1] + [dict(content[-1], cache_control=CACHE_CONTROL)]
+    else:
+        return msgs
+    return msgs[:-1] + [dict(last, content=blocks)]
+
+
+def record_cache_usage(message, totals: Dict[str, int], verbose: bool = True) -> None:
+    """Accumulate prompt-cache token counts from a response and print this call's numbers."""
+    usage = getattr(message, "usage", None)
+    if usage is None:
+        return
+    read = getattr(usage, "cache_read_input_tokens", None) or 0
+    written = getattr(usage, "cache_creation_input_tokens", None) or 0
+    uncached = getattr(usage, "input_tokens", None) or 0
+    totals["cache_read_input_tokens"] += read
+    totals["cache_creation_input_tokens"] += written
+    totals["input_tokens"] += uncached
+    totals["cache_hit_calls" if read else "cache_miss_calls"] += 1
+    if verbose:
+        print(f"[cache] read={read} write={written} uncached={uncached}")
+
+
 def _safe_tool_name_from_uri(uri: Any) -> str:
     if uri is None:
         return "read_resource_unknown"
@@ -164,160 +269,101 @@ async def fetch_resource_from_mcp(mcp_client: Client, uri: str):
     raise RuntimeError("No supported resource-read method found on mcp_client (tried read_resource/get_resource/call_resource)")
 
 
-# -----------------------
-# Keep original serialize helper (useful for tool call results)
-# -----------------------
-def serialize_tool_result(result) -> dict:
-    def ser_block(b):
-        t = getattr(b, "type", None)
-        if t == "text" and hasattr(b, "text"):
-            return {"type": "text", "text": b.text}
-        if t == "image" and hasattr(b, "data"):
-            data = b.data
-            if isinstance(data, (bytes, bytearray)):
-                data = base64.b64encode(data).decode("utf-8")
-            return {
-                "type": "image",
-                "mimeType": getattr(b, "mimeType", None) or getattr(b, "mime_type", None),
-                "data": data,
-            }
-        if hasattr(b, "__dict__"):
-            d = {k: v for k, v in b.__dict__.items() if not k.startswith("_")}
-            for k, v in list(d.items()):
-                try:
-                    json.dumps(v)
-                except TypeError:
-                    d[k] = str(v)
-            return d
-        return str(b)
-
-    payload = {}
-    payload["ok"] = not getattr(result, "is_error", False)
-    if hasattr(result, "content"):
-        blocks = result.content
-        payload["content"] = [ser_block(b) for b in (blocks or [])]
-    else:
-        # last resort: try to map common dict/list shapes
-        try:
-            json.dumps(result)
-            payload["content"] = [result]
-        except Exception:
-            payload["content"] = [str(result)]
-    return payload
-
-
 # -----------------------
 # Normalizer & execution helper
 # -----------------------
-def _extract_text_like(obj: Any) -> List[str]:
-    """
-    Return a list of candidate text strings found inside obj.
-    This is a best-effort extractor for many shapes returned by MCP.
-    """
-    out = []
-
-    try:
-        # If it's a plain string
-        if isinstance(obj, str):
-            out.append(obj)
-            return out
-
-        # If it's a dict-like
-        if isinstance(obj, dict):
-            # look for common keys
-            for k in ("text", "value", "reading", "distance", "payload", "content"):
-                if k in obj and obj[k] is not None:
-                    out.append(str(obj[k]))
-            # also flatten any nested simple strings
-            for v in obj.values():
-                if isinstance(v, (str, int, float)):
-                    out.append(str(v))
-            return out
-
-        # If it's a list/tuple, recurse
-        if isinstance(obj, (list, tuple)):
-            for el in obj:
-                out.extend(_extract_text_like(el))
-            return out
-
-        # If it's an object with attributes
-        if hasattr(obj, "__dict__"):
-            d = obj.__dict__
-            for k in ("text", "value", "reading", "distance"):
-                if k in d and d[k] is not None:
-                    out.append(str(d[k]))
-            # fallback: stringify
-            out.append(str(obj))
-            return out
-
-        # fallback to str()
-        out.append(str(obj))
-        return out
-    except Exception:
-        try:
-            out.append(str(obj))
-        except Exception:
-            out.append("<unserializable object>")
-        return out
-
-
+# Tools return CommandResult structured content and resources return Reading
+# JSON documents (see schemas.py), so normalization is a dispatch on the
+# result's type: one json.loads for a JSON resource, none for a tool result.
+def _reading_summary(data: Dict[str, Any]) -> str:
+    if data.get("error"):
+        return str(data["error"])
+    if "value" in data:
+        if data["value"] is None:
+            return "No value"
+        staleness = data.get("staleness_s")
+        age = f", {staleness:.1f}s old" if isinstance(staleness, (int, float)) else ""
+        return f"{data['value']} {data.get('unit', '')} (n={data.get('samples', 0)}{age})"
+    return str(data.get("message") or "")
+
+
+def _from_data(data: Dict[str, Any], is_error: bool = False) -> Dict[str, Any]:
+    ok = not is_error and data.get("ok", True) is not False and not data.get("error")
+    return {"ok": ok, "summary": _reading_summary(data), "data": data}
+
+
+def _from_text(text: str, is_error: bool = False) -> Dict[str, Any]:
+    return {"ok": not is_error, "summary": text.strip(), "data": None}
+
+
+@functools.singledispatch
+def _normalize(raw: Any) -> Dict[str, Any]:
+    """Tool results (fastmcp CallToolResult) and single resource contents."""
+    is_error = bool(getattr(raw, "is_error", False))
+    structured = getattr(raw, "structured_content", None)
+    if isinstance(structured, dict):
+        # FastMCP wraps non-object outputs as {"result": ...}
+        data = structured["result"] if set(structured) == {"result"} and isinstance(structured["result"], dict) else structured
+        return _from_data(data, is_error)
+    content = getattr(raw, "content", None)
+    if isinstance(content, list):
+        return _from_text(" ".join(getattr(b, "text", "") for b in content if getattr(b, "text", None)), is_error)
+    text = getattr(raw, "text", None)
+    if isinstance(text, str):
+        if (getattr(raw, "mimeType", None) or getattr(raw, "mime_type", None)) == "application/json":
+            try:
+                data = json.loads(text)
+            except ValueError:
+                return _from_text(text)
+            if isinstance(data, dict):
+                return _from_data(data)
+        return _from_text(text)
+    blob = getattr(raw, "blob", None)
+    if blob is not None:
+        return _from_text(f"<{len(blob)} bytes of binary content>")
+    return _from_text(str(raw))
+
+
+@_normalize.register
+def _(raw: dict) -> Dict[str, Any]:
+    return _from_data(raw)
+
+
+@_normalize.register
+def _(raw: str) -> Dict[str, Any]:
+    return _from_text(raw)
+
+
+@_normalize.register(list)
+@_normalize.register(tuple)
+def _(raw) -> Dict[str, Any]:
+    # read_resource returns a list of contents; sensor resources have exactly one
+    if not raw:
+        return _from_text("No value")
+    if len(raw) == 1:
+        return _normalize(raw[0])
+    parts = [_normalize(r) for r in raw]
+    return {
+        "ok": all(p["ok"] for p in parts),
+        "summary": "; ".join(p["summary"] for p in parts if p["summary"]),
+        "data": next((p["data"] for p in parts if p["data"] is not None), None),
+    }
+
+
+@timed("normalize_mcp_result")
 def normalize_mcp_result(raw: Any) -> Dict[str, Any]:
     """
-    Convert the raw MCP return into a small canonical dict:
+    Convert a raw MCP tool result or resource read into
       {
         "ok": bool,
-        "summary": str,     # short, first useful text-like piece
-        "blocks": list,     # list of small dicts describing blocks found
-        "raw": str          # safe string form of the raw object
+        "summary": str,          # one-line human-readable form
+        "data": dict | None      # the structured result (CommandResult / Reading), if any
       }
     """
-    out = {"ok": True, "summary": "", "blocks": [], "raw": None}
     try:
-        # If it's already a serialized tool result (dict with "content")
-        if isinstance(raw, dict) and "content" in raw and isinstance(raw["content"], (list, tuple)):
-            # content may contain dicts or strings
-            for c in raw["content"]:
-                if isinstance(c, dict):
-                    out["blocks"].append(c)
-                    # attempt to get text-like candidate
-                    for k in ("text", "value", "reading", "distance"):
-                        if k in c and c[k] is not None:
-                            out["summary"] = str(c[k])
-                            break
-                else:
-                    out["blocks"].append({"type": "raw", "value": str(c)})
-            out["ok"] = raw.get("ok", True)
-        else:
-            # try to pull text-like pieces from raw
-            texts = _extract_text_like(raw)
-            for t in texts:
-                # skip blank
-                if t is None:
-                    continue
-                out["blocks"].append({"type": "text", "text": t})
-            if texts:
-                out["summary"] = texts[0]
-            # set ok flag if obj has is_error attribute
-            if hasattr(raw, "is_error"):
-                out["ok"] = not getattr(raw, "is_error")
-        # raw string fallback
-        try:
-            out["raw"] = json.dumps(raw, default=str)
-        except Exception:
-            out["raw"] = str(raw)
+        return _normalize(raw)
     except Exception as e:
-        out["blocks"].append({"type": "error", "text": f"Error normalizing result: {e}"})
-        out["raw"] = str(raw)
-        out["ok"] = False
-
-    # final heuristic: if summary still empty, pick first non-empty block text
-    if not out["summary"]:
-        for b in out["blocks"]:
-            if isinstance(b, dict) and b.get("text"):
-                out["summary"] = b.get("text")
-                break
-
-    return out
+        return {"ok": False, "summary": f"Error normalizing result: {e}", "data": None}
 
 
 async def execute_tool_or_resource(mcp_client: Client, tool_name: str, tool_input: Dict[str, Any], resource_tool_map: Dict[str, str]) -> Dict[str, Any]:
@@ -328,23 +374,265 @@ async def execute_tool_or_resource(mcp_client: Client, tool_name: str, tool_inpu
     try:
         if tool_name in resource_tool_map:
             uri = resource_tool_map[tool_name]
-            raw = await fetch_resource_from_mcp(mcp_client, uri)
-            return normalize_mcp_result(raw)
+            with stage_timer.measure("mcp_read_resource"):
+                raw = await fetch_resource_from_mcp(mcp_client, uri)
+        else:
+            with stage_timer.measure("mcp_call_tool"):
+                raw = await mcp_client.call_tool(tool_name, tool_input or {})
+        return normalize_mcp_result(raw)
+    except Exception as e:
+        return {"ok": False, "summary": f"Exception while executing {tool_name}: {e}", "data": None}
+
+
+# -----------------------
+# Compact tool results & history budget
+# -----------------------
+def compact_result_text(normalized: Dict[str, Any]) -> str:
+    """
+    Short text for a tool_result: the selected fields of the structured result
+    (or the summary text), with "No value" made explicit, capped at RESULT_MAX_CHARS.
+    """
+    data = normalized.get("data")
+    if isinstance(data, dict):
+        fields = {k: data[k] for k in RESULT_FIELDS if data.get(k) not in (None, "")}
+        text = json.dumps(fields or data, ensure_ascii=False, separators=(",", ":"), default=str)
+        no_value = "value" in data and data["value"] is None
+    else:
+        text = str(normalized.get("summary") or "").strip()
+        no_value = "no value" in text.lower()
+    if no_value:
+        # make sure Claude doesn't mistake it for a numeric reading
+        text = "NO VALUE (no reading available, not zero): " + text
+    if len(text) > RESULT_MAX_CHARS:
+        text = text[:RESULT_MAX_CHARS - 12] + " [truncated]"
+    return text or "(empty result)"
+
+
+def tool_result_block(tool_call: Any, normalized: Dict[str, Any]) -> Dict[str, Any]:
+    block = {
+        "type": "tool_result",
+        "tool_use_id": getattr(tool_call, "id", None),
+        "content": compact_result_text(normalized),
+    }
+    if not normalized.get("ok", True):
+        block["is_error"] = True
+    return block
+
+
+def content_to_dicts(content) -> List[Dict[str, Any]]:
+    """Plain-dict copy of SDK content blocks (text / tool_use) for the message history."""
+    out = []
+    for block in content:
+        if hasattr(block, "model_dump"):
+            out.append(block.model_dump(exclude_none=True))
+        else:
+            out.append(dict(block))
+    return out
+
+
+def estimate_tokens(message: Dict[str, Any]) -> int:
+    content = message.get("content")
+    size = len(content) if isinstance(content, str) else len(json.dumps(content, default=str))
+    return size // CHARS_PER_TOKEN + 4
+
+
+def _round_digest(tool_use_msg: Dict[str, Any], result_msg: Dict[str, Any]) -> List[str]:
+    results = {b.get("tool_use_id"): b for b in result_msg.get("content") or [] if isinstance(b, dict)}
+    lines = []
+    for b in tool_use_msg.get("content") or []:
+        if isinstance(b, dict) and b.get("type") == "tool_use":
+            r = results.get(b.get("id"), {})
+            text = str(r.get("content", ""))[:DIGEST_CHARS]
+            status = "error" if r.get("is_error") else "ok"
+            lines.append(f"- {b.get('name')}({json.dumps(b.get('input') or {}, separators=(',', ':'))}) {status}: {text}")
+    return lines
+
+
+def trim_tool_history(messages: List[Dict[str, Any]], budget: int, digests: List[str]) -> int:
+    """
+    Fold the oldest tool rounds (an assistant tool_use message plus the user
+    tool_result message answering it) into `digests` until the rounds after
+    the preamble fit `budget` estimated tokens. The newest round is always
+    kept. Returns the number of rounds dropped.
+    """
+    dropped = 0
+    while len(messages) > 3 and sum(estimate_tokens(m) for m in messages[1:]) > budget:
+        digests.extend(_round_digest(messages[1], messages[2]))
+        del digests[:-MAX_DIGEST_LINES]
+        del messages[1:3]
+        dropped += 1
+    return dropped
+
+
+def preamble_message(chat_log_content: str, digests: List[str]) -> Dict[str, Any]:
+    """Chat log (cached prefix), followed by digests of any tool rounds dropped for the budget."""
+    content = [{"type": "text", "text": chat_log_content, "cache_control": CACHE_CONTROL}]
+    if digests:
+        content.append({"type": "text", "text": "Tool calls already made (older results omitted):\n" + "\n".join(digests)})
+    return {"role": "user", "content": content}
+
+
+# -----------------------
+# Agent loop
+# -----------------------
+async def discover_tools(mcp_client: Client, verbose: bool = True) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """List MCP tools and resources; returns (cache-ready tools payload, resource tool name -> URI)."""
+    try:
+        available_mcp_tools = await mcp_client.list_tools()
+    except Exception as e:
+        print(f"Error listing tools: {e}")
+        available_mcp_tools = []
+    if verbose:
+        print(f"Found tools: {[getattr(t,'name', str(t)) for t in available_mcp_tools]}\n")
+
+    available_mcp_resources = []
+    try:
+        if hasattr(mcp_client, "list_resources"):
+            available_mcp_resources = await mcp_client.list_resources()
+        elif hasattr(mcp_client, "list_resources_async"):
+            available_mcp_resources = await mcp_client.list_resources_async()
         else:
-            # call normal tool
-            result = await mcp_client.call_tool(tool_name, tool_input or {})
-            # try to serialize first
-            ser = serialize_tool_result(result)
-            return normalize_mcp_result(ser)
+            maybe = getattr(mcp_client, "list_resources", None)
+            if callable(maybe):
+                maybe_result = maybe()
+                if asyncio.iscoroutine(maybe_result):
+                    available_mcp_resources = await maybe_result
     except Exception as e:
-        return {"ok": False, "summary": f"Exception while executing {tool_name}: {e}", "blocks": [{"type": "error", "text": str(e)}], "raw": str(e)}
+        print(f"Warning: could not fetch resources list from MCP server: {e}")
+        available_mcp_resources = []
+    if verbose:
+        print(f"Found resources: {[str(getattr(r,'uri', getattr(r,'id', r))) for r in available_mcp_resources]}\n")
+
+    # Prepare Claude-compatible tool/resource descriptions
+    claude_formatted_tools = format_tools_for_claude(available_mcp_tools)
+    claude_formatted_resources, resource_tool_map = format_resources_for_claude(available_mcp_resources)
+    return canonicalize_tools(claude_formatted_tools + claude_formatted_resources), resource_tool_map
+
+
+def new_cache_totals() -> Dict[str, int]:
+    return {
+        "input_tokens": 0,
+        "cache_read_input_tokens": 0,
+        "cache_creation_input_tokens": 0,
+        "cache_hit_calls": 0,
+        "cache_miss_calls": 0,
+    }
+
+
+async def run_conversation(
+    mcp_client: Client,
+    claude_client: "anthropic.Anthropic",
+    chat_log_content: str,
+    tools_payload: List[Dict[str, Any]],
+    resource_tool_map: Dict[str, str],
+    cache_totals: Dict[str, int],
+    verbose: bool = True,
+) -> str:
+    """Run the agent loop on one chat log until Claude answers; returns the final text."""
+    t_start = asyncio.get_running_loop().time()
+    try:
+        return await _run_conversation(mcp_client, claude_client, chat_log_content, tools_payload,
+                                       resource_tool_map, cache_totals, verbose)
+    finally:
+        stage_timer.record("conversation", asyncio.get_running_loop().time() - t_start)
+
+
+async def _run_conversation(mcp_client, claude_client, chat_log_content, tools_payload, resource_tool_map,
+                            cache_totals, verbose) -> str:
+    log = print if verbose else (lambda *a, **k: None)
+
+    if not chat_log_content:
+        log("Empty chat log; nothing to do.")
+        return ""
+
+    # Conversation: the chat log preamble (cached prefix), then tool_use / tool_result rounds
+    digests: List[str] = []
+    messages_for_claude = [preamble_message(chat_log_content, digests)]
+    system_payload = [{"type": "text", "text": SYSTEM_PROMPT, "cache_control": CACHE_CONTROL}]
+    dropped_rounds = 0
+
+    # Loop safely with a maximum iteration guard to avoid infinite cycles
+    iter_count = 0
+    final_response = ""
+
+    while True:
+        iter_count += 1
+        if iter_count > MAX_ITER:
+            log(f"Reached max iterations ({MAX_ITER}). Aborting to avoid loop.")
+            break
+
+        log(f"\n--- Sending conversation to Claude (iteration {iter_count}) ---")
+        try:
+            messages_for_claude = sanitize_messages_for_claude(messages_for_claude)
+            with stage_timer.measure("llm_call"):
+                # sync client in a worker thread: keeps other conversations and MCP I/O moving
+                message = await asyncio.to_thread(
+                    claude_client.messages.create,
+                    model=CLAUDE_MODEL,
+                    max_tokens=1024,
+                    system=system_payload,
+                    messages=with_rolling_breakpoint(messages_for_claude),
+                    tools=tools_payload,
+                    tool_choice={"type": "auto"}
+                )
+            record_cache_usage(message, cache_totals, verbose)
+        except Exception as e:
+            print(f"An error occurred with the Claude API call: {e}")
+            return final_response
+
+        # If Claude did not request a tool/resource, print final response and stop
+        if getattr(message, "stop_reason", None) != "tool_use":
+            text_blocks = [b for b in message.content if getattr(b, "type", None) == "text"]
+            final_response = text_blocks[0].text if text_blocks else str(message)
+            log("\nFinal model response (no tool call):\n", final_response)
+            break
+
+        # Collect tool_use blocks (may be multiple)
+        tool_calls = [c for c in message.content if getattr(c, "type", None) == "tool_use"]
+        if not tool_calls:
+            log("stop_reason indicates tool_use but no tool_use blocks found. Aborting.")
+            break
+
+        # Execute tool/resource calls concurrently; resource reads are side-effect free,
+        # calls to the same tool touch the same device and keep their order
+        def device_key(tool_call):
+            name = getattr(tool_call, "name", None)
+            return None if name in resource_tool_map else name
+
+        async def run_one(tool_call):
+            tool_name = getattr(tool_call, "name", None)
+            tool_input = getattr(tool_call, "input", None) or {}
+            log(f"\nClaude requested tool/resource: '{tool_name}' with input: {tool_input}")
+            return await execute_tool_or_resource(mcp_client, tool_name, tool_input, resource_tool_map)
+
+        with stage_timer.measure("tool_round"):
+            results = await run_tool_calls(tool_calls, run_one, device_key, limit=MAX_PARALLEL_TOOLS)
+
+        # Answer every tool_use with its tool_result, in the order Claude requested the calls
+        messages_for_claude.append({"role": "assistant", "content": content_to_dicts(message.content)})
+        result_blocks = [tool_result_block(tc, normalized) for tc, normalized in zip(tool_calls, results)]
+        messages_for_claude.append({"role": "user", "content": result_blocks})
+        for block in result_blocks:
+            log(f"--- tool_result {'error' if block.get('is_error') else 'ok'}: {block['content']}")
+
+        # Keep the rounds within the conversation's token budget
+        dropped = trim_tool_history(messages_for_claude, HISTORY_TOKEN_BUDGET, digests)
+        if dropped:
+            dropped_rounds += dropped
+            messages_for_claude[0] = preamble_message(chat_log_content, digests)
+        log(f"[budget] ~{sum(estimate_tokens(m) for m in messages_for_claude[1:])} tokens of tool rounds "
+            f"(budget {HISTORY_TOKEN_BUDGET}), {dropped_rounds} rounds folded into digests")
+
+        # loop and send the updated conversation back to Claude (it may call more tools or finish)
+
+    return final_response
 
 
 # -----------------------
 # Main program
 # -----------------------
 async def main():
-    mcp_client = Client("server.py")
+    mcp_client = Client(MCP_SERVER)
 
     try:
         claude_client = anthropic.Anthropic(api_key=api_key)
@@ -361,36 +649,7 @@ async def main():
             print(f"Warning: ping failed: {e}\nContinuing — server may still accept calls.")
 
         print("Fetching available tools from MCP server...")
-        try:
-            available_mcp_tools = await mcp_client.list_tools()
-        except Exception as e:
-            print(f"Error listing tools: {e}")
-            available_mcp_tools = []
-
-        print(f"Found tools: {[getattr(t,'name', str(t)) for t in available_mcp_tools]}\n")
-
-        available_mcp_resources = []
-        try:
-            if hasattr(mcp_client, "list_resources"):
-                available_mcp_resources = await mcp_client.list_resources()
-            elif hasattr(mcp_client, "list_resources_async"):
-                available_mcp_resources = await mcp_client.list_resources_async()
-            else:
-                maybe = getattr(mcp_client, "list_resources", None)
-                if callable(maybe):
-                    maybe_result = maybe()
-                    if asyncio.iscoroutine(maybe_result):
-                        available_mcp_resources = await maybe_result
-        except Exception as e:
-            print(f"Warning: could not fetch resources list from MCP server: {e}")
-            available_mcp_resources = []
-
-        print(f"Found resources: {[str(getattr(r,'uri', getattr(r,'id', r))) for r in available_mcp_resources]}\n")
-
-        # Prepare Claude-compatible tool/resource descriptions
-        claude_formatted_tools = format_tools_for_claude(available_mcp_tools)
-        claude_formatted_resources, resource_tool_map = format_resources_for_claude(available_mcp_resources)
-        tools_payload = claude_formatted_tools + claude_formatted_resources
+        tools_payload, resource_tool_map = await discover_tools(mcp_client)
 
         # Read chat log content
         chat_log_content = ""
@@ -405,88 +664,93 @@ async def main():
         except Exception as e:
             print(f"An error occurred while trying to read the file: {e}")
 
-        # Initialize conversation with chat log content
-        messages_for_claude = [{"role": "user", "content": chat_log_content}] if chat_log_content else []
+        cache_totals = new_cache_totals()
+        await run_conversation(mcp_client, claude_client, chat_log_content, tools_payload, resource_tool_map, cache_totals)
 
-        # Loop safely with a maximum iteration guard to avoid infinite cycles (e.g., 10 iterations)
-        MAX_ITER = 12
-        iter_count = 0
+        print(f"\n[cache] totals: {cache_totals}")
+        # end async with mcp_client
 
-        while True:
-            iter_count += 1
-            if iter_count > MAX_ITER:
-                print(f"Reached max iterations ({MAX_ITER}). Aborting to avoid loop.")
-                break
 
-            print(f"\n--- Sending conversation to Claude (iteration {iter_count}) ---")
+# -----------------------
+# Daemon mode
+# -----------------------
+class WarmCatalog:
+    """Tool/resource list kept between conversations; re-listed only after a list_changed notification."""
+
+    def __init__(self):
+        self.mcp_client = None
+        self.tools_payload: List[Dict[str, Any]] = []
+        self.resource_tool_map: Dict[str, str] = {}
+        self.stale = True
+        self._lock = asyncio.Lock()
+
+    async def on_mcp_message(self, message: Any) -> None:
+        """FastMCP client message_handler."""
+        method = getattr(getattr(message, "root", message), "method", None)
+        if method in (TOOLS_LIST_CHANGED, RESOURCES_LIST_CHANGED):
+            self.stale = True
+
+    async def get(self) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+        if self.stale:
+            async with self._lock:
+                if self.stale:
+                    self.stale = False
+                    self.tools_payload, self.resource_tool_map = await discover_tools(self.mcp_client, verbose=False)
+                    print(f"[daemon] tool list: {[t['name'] for t in self.tools_payload]}")
+        return self.tools_payload, self.resource_tool_map
+
+
+async def daemon_main(from_start: bool = False):
+    catalog = WarmCatalog()
+    mcp_client = Client(MCP_SERVER, message_handler=catalog.on_mcp_message)
+    catalog.mcp_client = mcp_client
+    claude_client = anthropic.Anthropic(api_key=api_key)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=AGENT_QUEUE_MAX)
+    cache_totals = new_cache_totals()
+
+    async def worker(n: int):
+        while True:
+            entry, queued_at = await queue.get()
             try:
-                messages_for_claude = sanitize_messages_for_claude(messages_for_claude)
-                message = claude_client.messages.create(
-                    model=CLAUDE_MODEL,
-                    max_tokens=1024,
-                    messages=messages_for_claude,
-                    tools=tools_payload,
-                    tool_choice={"type": "auto"}
-                )
+                stage_timer.record("daemon_queue_wait", time.perf_counter() - queued_at)
+                tools_payload, resource_tool_map = await catalog.get()
+                t0 = time.perf_counter()
+                reply = await run_conversation(mcp_client, claude_client, entry, tools_payload, resource_tool_map,
+                                               cache_totals, verbose=False)
+                print(f"[daemon:{n}] {(time.perf_counter() - t0) * 1000:.0f} ms  {entry[:60]!r} -> {reply[:160]!r}")
             except Exception as e:
-                print(f"An error occurred with the Claude API call: {e}")
-                return
-
-            # If Claude did not request a tool/resource, print final response and stop
-            if getattr(message, "stop_reason", None) != "tool_use":
-                text_blocks = [b for b in message.content if getattr(b, "type", None) == "text"]
-                final_response = text_blocks[0].text if text_blocks else str(message)
-                print("\nFinal model response (no tool call):\n", final_response)
-                break
-
-            # Collect tool_use blocks (may be multiple)
-            tool_calls = [c for c in message.content if getattr(c, "type", None) == "tool_use"]
-            if not tool_calls:
-                print("stop_reason indicates tool_use but no tool_use blocks found. Aborting.")
-                break
-
-            # Execute each tool/resource in the order Claude requested and append result messages
-            for tool_call in tool_calls:
-                tool_name = getattr(tool_call, "name", None)
-                tool_input = getattr(tool_call, "input", None) or {}
-
-                print(f"\nClaude requested tool/resource: '{tool_name}' with input: {tool_input}")
-
-                normalized = await execute_tool_or_resource(mcp_client, tool_name, tool_input, resource_tool_map)
-
-                # Create a short, clear tool-result text for Claude to consume
-                summary = normalized.get("summary") or ""
-                blocks = normalized.get("blocks") or []
-                raw = normalized.get("raw") or ""
-
-                # Make "No value" explicit so Claude doesn't mistake it for a numeric reading
-                note = ""
-                if isinstance(summary, str) and "no value" in summary.lower():
-                    note = "[NOTE: sensor returned NO VALUE — check connection/polling on MCP server]"
-
-                result_text = (
-                    f"[TOOL_RESULT]\n"
-                    f"name={tool_name}\n"
-                    f"ok={normalized.get('ok')}\n"
-                    f"summary={summary}\n"
-                    f"{note}\n"
-                    f"blocks={json.dumps(blocks, default=str)}\n"
-                    f"raw={raw}\n"
-                )
-                result_text = result_text.rstrip()
-
-                print("--- Tool execution normalized result ---")
-                print(result_text)
-                print("----------------------------------------")
+                print(f"[daemon:{n}] failed on {entry[:60]!r}: {e}")
+            finally:
+                queue.task_done()
 
-                # Append result back to conversation as an assistant message so Claude can plan further calls
-                messages_for_claude.append({"role": "assistant", "content": result_text})
-
-            # loop and send the updated conversation back to Claude (it may call more tools or finish)
-
-        # end async with mcp_client
+    async with mcp_client:
+        await catalog.get()  # warm before the first entry arrives
+        workers = [asyncio.create_task(worker(n), name=f"agent-worker-{n}") for n in range(AGENT_WORKERS)]
+        tail = ChatLogTail(FULL_CHAT_LOG_PATH, from_start=from_start)
+        print(f"[daemon] watching {FULL_CHAT_LOG_PATH} ({tail.mode}) from byte {tail.offset}, {AGENT_WORKERS} workers")
+        try:
+            async for entry in tail.entries():
+                # bounded: when every worker is busy and the queue is full, reading the log waits
+                await queue.put((entry, time.perf_counter()))
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            print(f"[daemon] stages: {stage_timer.snapshot()}")
+            print(f"[cache] totals: {cache_totals}")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run Claude on the hardware chat log.")
+    parser.add_argument("--daemon", action="store_true", help="keep running and handle each new chat-log line")
+    parser.add_argument("--from-start", action="store_true",
+                        help="daemon: on first start, also handle lines already in the log")
+    cli = parser.parse_args()
     print("--- Make sure your server.py is running in a separate terminal ---")
-    asyncio.run(main())
+    if cli.daemon:
+        try:
+            asyncio.run(daemon_main(cli.from_start))
+        except KeyboardInterrupt:
+            pass
+    else:
+        asyncio.run(main())
@@ -0,0 +1,145 @@
+# capture.py
+"""
+Raw serial session capture.
+
+With SERIAL_CAPTURE=<path> set, every connection link.open_serial() returns
+is wrapped so that the bytes it writes (TX) and reads (RX) are appended, with
+their times, to one capture file per process ("{pid}" in the path is
+replaced by the process id). serial_replay.py feeds a capture back through
+readQueue and sendQueue.
+
+File format (little-endian):
+
+  header  b"SERCAP1\\n" | start time f64 (epoch seconds)
+  record  dt u32 (us since the previous record) | tag u8 | length u16 | payload
+
+tag = kind << 6 | channel, with kind RX, TX or OPEN; an OPEN record's
+payload is the channel's label ("telemetry" / "commands"). Channels number
+the connections of the process in the order they were opened.
+"""
+
+import os
+import struct
+import threading
+import time
+from typing import Iterator, NamedTuple, Optional
+
+MAGIC = b"SERCAP1\n"
+START = struct.Struct("<d")
+RECORD = struct.Struct("<IBH")
+RX, TX, OPEN = 0, 1, 2
+MAX_CHANNELS = 64
+MAX_PAYLOAD = 0xFFFF
+FLUSH_INTERVAL = 0.5  # seconds between flushes of the capture file
+
+SERIAL_CAPTURE = os.getenv("SERIAL_CAPTURE", "")
+
+
+class Record(NamedTuple):
+    t: float       # seconds since the capture started
+    kind: int      # RX / TX / OPEN
+    channel: int
+    data: bytes
+
+
+class CaptureWriter:
+    def __init__(self, path: str):
+        self._file = open(path.replace("{pid}", str(os.getpid())), "wb")
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._last_us = 0
+        self._flushed_at = self._start
+        self._channels = 0
+        self._file.write(MAGIC + START.pack(time.time()))
+
+    def open_channel(self, label: str) -> int:
+        with self._lock:
+            channel = self._channels
+            self._channels += 1
+        self.record(OPEN, channel % MAX_CHANNELS, label.encode())
+        return channel % MAX_CHANNELS
+
+    def record(self, kind: int, channel: int, data: bytes) -> None:
+        now = time.monotonic()
+        with self._lock:
+            now_us = int((now - self._start) * 1e6)
+            dt = min(now_us - self._last_us, 0xFFFFFFFF)
+            self._last_us = now_us
+            for i in range(0, max(len(data), 1), MAX_PAYLOAD):
+                chunk = data[i:i + MAX_PAYLOAD]
+                self._file.write(RECORD.pack(dt, kind << 6 | channel, len(chunk)) + chunk)
+                dt = 0
+            if kind == OPEN or now - self._flushed_at >= FLUSH_INTERVAL:
+                self._file.flush()
+                self._flushed_at = now
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class CapturingSerial:
+    """Serial wrapper that records what is written and read; everything else is passed through."""
+
+    def __init__(self, ser, writer: CaptureWriter, label: str):
+        self._ser = ser
+        self._writer = writer
+        self._channel = writer.open_channel(label)
+
+    def write(self, data):
+        n = self._ser.write(data)
+        self._writer.record(TX, self._channel, bytes(data))
+        return n
+
+    def read(self, size=1):
+        data = self._ser.read(size)
+        if data:
+            self._writer.record(RX, self._channel, data)
+        return data
+
+    def readline(self, *args, **kwargs):
+        data = self._ser.readline(*args, **kwargs)
+        if data:
+            self._writer.record(RX, self._channel, data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._ser, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._ser, name, value)
+
+
+_writer: Optional[CaptureWriter] = None
+_writer_lock = threading.Lock()
+
+
+def wrap(ser, label: str):
+    """`ser`, recording into the process's capture file when SERIAL_CAPTURE is set."""
+    global _writer
+    if not SERIAL_CAPTURE:
+        return ser
+    with _writer_lock:
+        if _writer is None:
+            _writer = CaptureWriter(SERIAL_CAPTURE)
+    return CapturingSerial(ser, _writer, label)
+
+
+def read_capture(path: str) -> Iterator[Record]:
+    """Records of a capture file, in order."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a serial capture")
+        f.read(START.size)
+        t_us = 0
+        while True:
+            head = f.read(RECORD.size)
+            if len(head) < RECORD.size:
+                return
+            dt, tag, length = RECORD.unpack(head)
+            data = f.read(length)
+            t_us += dt
+            yield Record(t_us / 1e6, tag >> 6, tag & (MAX_CHANNELS - 1), data)
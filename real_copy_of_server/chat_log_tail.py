@@ -0,0 +1,145 @@
+# chat_log_tail.py
+"""
+Incremental reader for the chat log the agent acts on.
+
+Yields each newly appended, newline-terminated entry exactly once:
+- the byte offset (and inode) of the last handed-out entry is stored next to
+  the log (`<log>.offset`), so a restarted daemon resumes where it stopped;
+- a partially written last line is left until its newline arrives;
+- truncation or replacement of the file (new inode, or size below the
+  offset) starts again from the beginning.
+
+Changes are picked up with inotify when the optional `inotify_simple`
+package is available (Linux), otherwise by polling the file's size.
+"""
+
+import asyncio
+import json
+import os
+from typing import AsyncIterator, List, Optional, Tuple
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:  # optional: not on macOS / not installed
+    INotify = None
+    inotify_flags = None
+
+
+class ChatLogTail:
+    def __init__(
+        self,
+        path: str,
+        offset_path: Optional[str] = None,
+        poll_interval: float = 0.25,
+        from_start: bool = False,
+    ):
+        self.path = path
+        self.offset_path = offset_path or path + ".offset"
+        self.poll_interval = poll_interval
+        self.offset = 0
+        self.inode: Optional[int] = None
+        self.mode = "inotify" if INotify is not None else "poll"
+        self._inotify = None
+        self._changed = asyncio.Event()
+        self._load_offset(from_start)
+
+    # ---------------------------------------------------------------
+    # Offset
+    # ---------------------------------------------------------------
+    def _load_offset(self, from_start: bool) -> None:
+        try:
+            with open(self.offset_path, "r") as f:
+                state = json.load(f)
+            self.offset, self.inode = int(state["offset"]), state.get("inode")
+            return
+        except (OSError, ValueError, KeyError):
+            pass
+        # first run: only entries appended from now on, unless asked to replay the log
+        try:
+            st = os.stat(self.path)
+            self.inode = st.st_ino
+            self.offset = 0 if from_start else st.st_size
+        except FileNotFoundError:
+            self.offset, self.inode = 0, None
+
+    def _commit(self, offset: int) -> None:
+        self.offset = offset
+        tmp = self.offset_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"offset": offset, "inode": self.inode}, f)
+        os.replace(tmp, self.offset_path)
+
+    # ---------------------------------------------------------------
+    # Reading
+    # ---------------------------------------------------------------
+    def _read_new(self) -> List[Tuple[str, int]]:
+        """Complete new lines as (text, end offset); blank lines are returned as ''."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        if st.st_ino != self.inode or st.st_size < self.offset:
+            # rotated or truncated: the new content starts at 0
+            self.inode, self.offset = st.st_ino, 0
+        if st.st_size == self.offset:
+            return []
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(st.st_size - self.offset)
+        out = []
+        pos = self.offset
+        for line in data.split(b"\n")[:-1]:  # the piece after the last newline is incomplete
+            pos += len(line) + 1
+            out.append((line.decode("utf-8", errors="replace").strip(), pos))
+        return out
+
+    async def entries(self) -> AsyncIterator[str]:
+        """
+        New entries as they are appended. The offset is stored before an entry
+        is handed out, so an entry is never handed out twice: a crash while it
+        is being processed skips it rather than re-sending a hardware command.
+        """
+        self._start_watch()
+        try:
+            while True:
+                for text, end in self._read_new():
+                    self._commit(end)
+                    if text:
+                        yield text
+                await self._wait_for_change()
+        finally:
+            self._stop_watch()
+
+    # ---------------------------------------------------------------
+    # Change notification
+    # ---------------------------------------------------------------
+    def _start_watch(self) -> None:
+        if self.mode != "inotify":
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        self._inotify = INotify()
+        mask = inotify_flags.MODIFY | inotify_flags.CLOSE_WRITE | inotify_flags.CREATE | inotify_flags.MOVED_TO
+        self._inotify.add_watch(directory, mask)
+        asyncio.get_running_loop().add_reader(self._inotify.fileno(), self._on_inotify)
+
+    def _stop_watch(self) -> None:
+        if self._inotify is not None:
+            asyncio.get_running_loop().remove_reader(self._inotify.fileno())
+            self._inotify.close()
+            self._inotify = None
+
+    def _on_inotify(self) -> None:
+        name = os.path.basename(self.path)
+        if any(ev.name == name for ev in self._inotify.read(timeout=0)):
+            self._changed.set()
+
+    async def _wait_for_change(self) -> None:
+        if self._inotify is None:
+            await asyncio.sleep(self.poll_interval)
+            return
+        try:
+            # the timeout is a safety net for missed events, not the detection path
+            await asyncio.wait_for(self._changed.wait(), timeout=5.0)
+        except asyncio.TimeoutError:
+            pass
+        self._changed.clear()
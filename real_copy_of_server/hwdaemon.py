@@ -0,0 +1,269 @@
+# hwdaemon.py
+"""
+Hardware I/O daemon: the one process that owns the serial port.
+
+Without it, every MCP server process (including each copy the registry
+spawns per request) opens the port through sendQueue/readQueue and they
+fight over it. With the daemon running and HW_DAEMON set in the MCP
+servers' environment:
+
+- telemetry: the daemon's reader publishes every sample into a shared-memory
+  ring (telemetry_ring.py); each MCP process follows the ring into its own
+  readQueue state, so holds, staleness and wait_for_sample work unchanged;
+- commands: add_command_to_queue() puts (client id, command) on the daemon's
+  command queue, a multiprocessing manager served on a local Unix socket.
+  The daemon runs them through its sendQueue and returns each response on
+  the sending client's own reply queue, where it lands in that process's
+  sendQueue.responses. A client's queue is dropped once the client has not
+  asked for replies for REPLY_QUEUE_TTL seconds;
+- stream rates: the daemon runs the one SamplingController (sampling.py) for
+  all clients, so reader demand from every process is merged before a rate
+  command goes to the board.
+
+    python hwdaemon.py          # owns SERIAL_PORT (see link.py)
+    HW_DAEMON=1 python server.py
+
+HW_DAEMON is the socket path, or 1 for the default one (unset = own the port
+directly, as before). The default socket lives in a per-user directory only
+its owner can enter. The manager speaks pickle, so it only accepts clients
+that know the authkey: HW_DAEMON_AUTHKEY, or else a random key the daemon
+writes to "<socket>.key" (mode 0600) for clients of the same user to read.
+"""
+
+import logging
+import os
+import queue
+import secrets
+import tempfile
+import threading
+import time
+import uuid
+from multiprocessing.managers import BaseManager
+from typing import Callable, Dict
+
+logger = logging.getLogger("hwdaemon")
+
+HW_DAEMON = os.getenv("HW_DAEMON", "")
+DEFAULT_DIR = os.path.join(os.getenv("XDG_RUNTIME_DIR") or tempfile.gettempdir(), f"hwdaemon-{os.getuid()}")
+DEFAULT_ADDRESS = os.path.join(DEFAULT_DIR, "hwdaemon.sock")
+ADDRESS = DEFAULT_ADDRESS if HW_DAEMON in ("", "1") else HW_DAEMON
+RING_NAME = os.getenv("HW_TELEMETRY_RING", "hw_telemetry")
+RING_SLOTS = int(os.getenv("HW_TELEMETRY_SLOTS", "4096"))
+RING_POLL_INTERVAL = 0.005  # seconds a follower sleeps when the ring has nothing new
+REPLY_POLL_TIMEOUT = 5.0    # seconds a client's reply request waits before asking again
+REPLY_QUEUE_TTL = 60.0      # seconds without a reply request after which a client's queue is dropped
+
+_serving = False  # True inside the daemon itself, which owns the port whatever HW_DAEMON says
+
+
+class HardwareManager(BaseManager):
+    """Command queue, reply router and stream-rate controller; registered with callables in the daemon, by name in clients."""
+
+
+HardwareManager.register("commands")
+HardwareManager.register("replies")
+HardwareManager.register("sampling")
+
+
+def client_mode() -> bool:
+    """True in an MCP process that should go through the daemon instead of the port."""
+    return bool(HW_DAEMON) and not _serving
+
+
+def key_path(address: str = ADDRESS) -> str:
+    return address + ".key"
+
+
+def authkey(address: str = ADDRESS) -> bytes:
+    """HW_DAEMON_AUTHKEY, or the key the running daemon wrote next to its socket."""
+    key = os.getenv("HW_DAEMON_AUTHKEY")
+    if key:
+        return key.encode()
+    with open(key_path(address)) as f:
+        return f.read().strip().encode()
+
+
+def connect(address: str = ADDRESS) -> HardwareManager:
+    manager = HardwareManager(address=address, authkey=authkey(address))
+    manager.connect()
+    return manager
+
+
+class ReplyRouter:
+    """Per-client reply queues in the daemon, created on first use and expired when their client goes away."""
+
+    def __init__(self, ttl: float = REPLY_QUEUE_TTL):
+        self.ttl = ttl
+        self._queues: Dict[str, "queue.Queue"] = {}
+        self._last_seen: Dict[str, float] = {}
+        self._waiting: Dict[str, int] = {}  # reply requests in progress per client
+        self._lock = threading.Lock()
+
+    def _queue(self, client_id: str) -> "queue.Queue":
+        with self._lock:
+            q = self._queues.get(client_id)
+            if q is None:
+                q = self._queues[client_id] = queue.Queue()
+                self._last_seen[client_id] = time.monotonic()
+            return q
+
+    def put(self, client_id: str, item) -> None:
+        self._queue(client_id).put(item)
+
+    def get(self, client_id: str, timeout: float):
+        """The client's next (response key, response), or None after `timeout` seconds."""
+        q = self._queue(client_id)
+        with self._lock:
+            self._waiting[client_id] = self._waiting.get(client_id, 0) + 1
+        try:
+            return q.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        finally:
+            with self._lock:
+                self._waiting[client_id] -= 1
+                if not self._waiting[client_id]:
+                    del self._waiting[client_id]
+                if client_id in self._queues:
+                    self._last_seen[client_id] = time.monotonic()
+
+    def expire(self) -> int:
+        """Drop the queues of clients that stopped asking for replies; returns how many."""
+        now = time.monotonic()
+        with self._lock:
+            gone = [cid for cid, seen in self._last_seen.items()
+                    if now - seen > self.ttl and cid not in self._waiting]
+            for cid in gone:
+                del self._queues[cid]
+                del self._last_seen[cid]
+        return len(gone)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._queues)
+
+
+class DaemonClient:
+    """A process's connection to the daemon's command queue and its own reply queue."""
+
+    def __init__(self, on_reply: Callable[[str, object], None], address: str = ADDRESS):
+        self.client_id = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        manager = connect(address)
+        self._commands = manager.commands()
+        self._replies = manager.replies()
+        self._on_reply = on_reply
+        threading.Thread(target=self._reply_loop, name="hwdaemon-replies", daemon=True).start()
+
+    def send(self, command: dict) -> None:
+        self._commands.put((self.client_id, command))
+
+    def _reply_loop(self) -> None:
+        # asking at least every REPLY_POLL_TIMEOUT keeps this client's queue alive in the daemon
+        while True:
+            reply = self._replies.get(self.client_id, REPLY_POLL_TIMEOUT)
+            if reply is not None:
+                key, response = reply
+                self._on_reply(key, response)
+
+
+def attach_ring(history: bool = True):
+    from telemetry_ring import TelemetryRing
+    return TelemetryRing.attach(RING_NAME, history=history)
+
+
+def _private_dir(path: str) -> None:
+    """Create `path` (mode 0700), or check that an existing one is ours and closed to others."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.stat(path)
+    if st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise SystemExit(f"{path} must be owned by this user with mode 0700")
+
+
+def _write_key(address: str) -> bytes:
+    """HW_DAEMON_AUTHKEY, or a fresh random key written (mode 0600) where same-user clients find it."""
+    key = os.getenv("HW_DAEMON_AUTHKEY")
+    if key:
+        return key.encode()
+    key = secrets.token_hex(32)
+    path = key_path(address)
+    if os.path.exists(path):
+        os.unlink(path)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(key)
+    return key.encode()
+
+
+def main() -> None:
+    global _serving
+    _serving = True
+    logging.basicConfig(level=logging.INFO)
+
+    import readQueue
+    import sendQueue
+    from sampling import sampling
+    from telemetry_ring import TelemetryRing
+
+    address = ADDRESS
+    commands: "queue.Queue" = queue.Queue()
+    replies = ReplyRouter()
+
+    def route_response(command: dict, response) -> None:
+        client_id = command.get("_client")
+        if client_id and command.get("response_key"):
+            replies.put(client_id, (command["response_key"], response))
+
+    def forward_commands() -> None:
+        while True:
+            client_id, command = commands.get()
+            sendQueue.add_command_to_queue(dict(command, _client=client_id))
+
+    def expire_replies() -> None:
+        while True:
+            time.sleep(REPLY_QUEUE_TTL / 2)
+            dropped = replies.expire()
+            if dropped:
+                logger.info("Dropped %d idle client reply queue(s), %d left", dropped, len(replies))
+
+    ring = TelemetryRing.create(RING_NAME, RING_SLOTS)
+    readQueue.add_sample_listener(ring.publish)
+    sendQueue.add_response_listener(route_response)
+    # the sender opens the port first: it waits for a board that resets on open to boot before
+    # negotiating the baud rate, and on a serial port it also reads the telemetry (see readQueue)
+    sendQueue.start_send_queue_processor()
+    readQueue.start_read_queue()
+    threading.Thread(target=forward_commands, name="hwdaemon-commands", daemon=True).start()
+    threading.Thread(target=expire_replies, name="hwdaemon-expire", daemon=True).start()
+
+    HardwareManager.register("commands", callable=lambda: commands)
+    HardwareManager.register("replies", callable=lambda: replies)
+    HardwareManager.register("sampling", callable=lambda: sampling)
+    if address == DEFAULT_ADDRESS:
+        _private_dir(DEFAULT_DIR)
+    key = _write_key(address)
+    if os.path.exists(address):
+        os.unlink(address)
+    old_umask = os.umask(0o177)  # the socket is created 0600
+    try:
+        server = HardwareManager(address=address, authkey=key).get_server()
+    finally:
+        os.umask(old_umask)
+    logger.info("Hardware daemon on %s, telemetry ring %r (%d slots)", address, RING_NAME, RING_SLOTS)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        readQueue.stop_read_queue()
+        ring.close()  # the manager's listener removes its own socket
+        if not os.getenv("HW_DAEMON_AUTHKEY"):
+            try:
+                os.unlink(key_path(address))
+            except OSError:
+                pass
+
+
+if __name__ == "__main__":
+    # run as the importable module, so readQueue/sendQueue see _serving
+    import hwdaemon
+    hwdaemon.main()
@@ -0,0 +1,185 @@
+# link.py
+"""
+Serial link setup shared by sendQueue and readQueue: port, baud rate, and
+connect-time baud negotiation.
+
+Both sides start at BASE_BAUD. The host then offers the candidate rates,
+fastest first, each with a verified switch:
+
+  host -> "16,<baud>;"    board answers "A" (rate supported) or "E", flushes,
+                          and switches; an unverified switch reverts to
+                          BASE_BAUD after SWITCH_WINDOW_MS
+  host -> "17,<nonce>;"   at the new rate; the board answers "P<nonce>",
+                          which confirms the switch
+
+A rate that is refused or fails verification falls back to BASE_BAUD
+(waiting out the board's revert window) and the next candidate is tried.
+Firmware without the link commands answers "E" to everything, so the link
+simply stays at BASE_BAUD.
+
+SERIAL_BAUD=auto (default) negotiates; a number pins the rate without
+negotiation (the board must already run at it).
+
+A serial port is opened once per process, by sendQueue, which also reads
+the telemetry interleaved with its replies (readQueue does not open it).
+
+SERIAL_PORT may also be a pyserial URL, e.g. socket://raspberrypi.local:7070
+for a Pi running `driver.py --listen tcp::7070`. There is no baud rate to
+negotiate; each open is its own client connection, and connections opened
+with telemetry=False (the command sender) unsubscribe from the telemetry
+fan-out so only replies arrive on them, while readQueue opens its own.
+
+SERIAL_CAPTURE=<path> records every opened connection's traffic (after
+negotiation) for serial_replay.py; see capture.py.
+"""
+
+import logging
+import os
+import random
+import re
+import threading
+import time
+from typing import Iterable, Optional
+
+import serial
+
+import capture
+
+logger = logging.getLogger("link")
+
+SERIAL_PORT = os.getenv("SERIAL_PORT", "/dev/cu.usbmodem101")
+SERIAL_BAUD = os.getenv("SERIAL_BAUD", "auto")
+BASE_BAUD = 9600
+CANDIDATE_BAUDS = (1000000, 250000, 115200)
+SWITCH_WINDOW_MS = 1000   # must match the firmware's BAUD_SWITCH_WINDOW_MS
+CMD_SET_BAUD = 16
+CMD_PING = 17
+CMD_SUBSCRIBE = 18        # Pi driver server mode: 18,<0|1> telemetry off / on for this connection
+
+_TELEMETRY = re.compile(rb"\d+,[^;\r\n]*;")  # streamed "<id>,<value>;" packets between replies
+_lock = threading.Lock()
+_negotiated: Optional[int] = None
+
+
+def read_reply(ser, timeout: float) -> Optional[str]:
+    """Next reply line from the board, skipping interleaved telemetry packets; None on timeout."""
+    deadline = time.monotonic() + timeout
+    buf = b""
+    while time.monotonic() < deadline:
+        chunk = ser.readline()
+        if not chunk:
+            continue
+        buf += chunk
+        if not buf.endswith(b"\n"):
+            continue
+        line = _TELEMETRY.sub(b"", buf).strip()
+        buf = b""
+        if line:
+            return line.decode("utf-8", errors="replace")
+    return None
+
+
+def ping(ser, timeout: float = 0.5) -> Optional[float]:
+    """Round-trip time of one verified ping in seconds, or None if it went unanswered."""
+    nonce = random.randint(1, 999999)
+    t0 = time.perf_counter()
+    ser.write(f"{CMD_PING},{nonce};".encode())
+    ser.flush()
+    while True:
+        remaining = timeout - (time.perf_counter() - t0)
+        reply = read_reply(ser, remaining) if remaining > 0 else None
+        if reply is None:
+            return None
+        if reply == f"P{nonce}":
+            return time.perf_counter() - t0
+
+
+def switch_baud(ser, baud: int, verify_tries: int = 3) -> bool:
+    """Ask the board to move to `baud` and verify it; on failure both sides end up at BASE_BAUD."""
+    ser.reset_input_buffer()
+    ser.write(f"{CMD_SET_BAUD},{baud};".encode())
+    ser.flush()
+    if read_reply(ser, 0.5) != "A":
+        return False
+    time.sleep(0.02)  # let the board finish Serial.end()/begin()
+    ser.baudrate = baud
+    ser.reset_input_buffer()
+    for _ in range(verify_tries):
+        if ping(ser, timeout=0.2) is not None:
+            return True
+    logger.warning("Baud %d failed verification; falling back to %d", baud, BASE_BAUD)
+    ser.baudrate = BASE_BAUD
+    time.sleep(SWITCH_WINDOW_MS / 1000.0 + 0.1)  # the board reverts on its own
+    ser.reset_input_buffer()
+    return False
+
+
+def _answers(ser) -> bool:
+    """True when the board replies to a ping at the current rate (even with "E": it is listening)."""
+    ser.reset_input_buffer()
+    ser.write(f"{CMD_PING},0;".encode())
+    ser.flush()
+    return read_reply(ser, 0.3) is not None
+
+
+def negotiate(ser, candidates: Iterable[int] = CANDIDATE_BAUDS) -> int:
+    """Move an open BASE_BAUD link to the fastest candidate both sides accept; returns the rate in use."""
+    candidates = sorted(candidates, reverse=True)
+    if not _answers(ser):
+        # a board that was not reset on open may still run at a previously negotiated rate
+        for baud in candidates:
+            ser.baudrate = baud
+            if _answers(ser):
+                logger.info("Serial link already at %d baud", baud)
+                return baud
+        ser.baudrate = BASE_BAUD
+    for baud in candidates:
+        if switch_baud(ser, baud):
+            logger.info("Serial link at %d baud", baud)
+            return baud
+    return BASE_BAUD
+
+
+def is_url(port: str = SERIAL_PORT) -> bool:
+    return "://" in port
+
+
+def _open_url(timeout: float, telemetry: bool) -> "serial.Serial":
+    ser = serial.serial_for_url(SERIAL_PORT, timeout=timeout)
+    if not telemetry:
+        ser.write(f"{CMD_SUBSCRIBE},0;".encode())
+        ser.flush()
+        if read_reply(ser, 1.0) != "A":
+            logger.warning("%s did not confirm the telemetry unsubscribe", SERIAL_PORT)
+    return ser
+
+
+def open_serial(timeout: float, settle: float = 0.0, telemetry: bool = True) -> "serial.Serial":
+    """
+    Open SERIAL_PORT at the link rate. The first open in the process runs
+    the negotiation (after `settle` seconds for the board to boot); later
+    opens reuse the negotiated rate. `telemetry` only matters for URL ports
+    (see above).
+    """
+    global _negotiated
+    label = "telemetry" if telemetry else "commands"
+    with _lock:
+        if is_url():
+            return capture.wrap(_open_url(timeout, telemetry), label)
+        if SERIAL_BAUD != "auto":
+            return capture.wrap(serial.Serial(SERIAL_PORT, int(SERIAL_BAUD), timeout=timeout), label)
+        if _negotiated is not None:
+            return capture.wrap(serial.Serial(SERIAL_PORT, _negotiated, timeout=timeout), label)
+        ser = serial.Serial(SERIAL_PORT, BASE_BAUD, timeout=min(timeout, 0.05))
+        time.sleep(settle)
+        _negotiated = negotiate(ser)
+        ser.timeout = timeout
+        return capture.wrap(ser, label)
+
+
+def current_baud() -> int:
+    if is_url():
+        return 0
+    if SERIAL_BAUD != "auto":
+        return int(SERIAL_BAUD)
+    return _negotiated or BASE_BAUD
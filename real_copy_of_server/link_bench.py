@@ -0,0 +1,101 @@
+# link_bench.py
+"""
+Serial link benchmark: payload throughput and latency at each baud rate.
+
+For every rate the board accepts (see link.py), measures
+- latency: ping round trips one at a time (p50 / p95 / max);
+- throughput: pings pipelined `--window` deep, counting request and reply
+  payload bytes per second (what commands and replies actually get, after
+  framing and the board's parse/dispatch time);
+- telemetry: bytes/s of streamed "<id>,<value>;" packets seen while idle.
+
+Needs the board connected and flashed with generated firmware; stop the MCP
+server first (it holds the port).
+
+    python link_bench.py --port /dev/ttyACM0 --count 300
+"""
+
+import argparse
+import statistics
+import time
+
+import serial
+
+import link
+
+
+def latency(ser, count: int):
+    rtts = [link.ping(ser, timeout=1.0) for _ in range(count)]
+    ok = sorted(r for r in rtts if r is not None)
+    return ok, count - len(ok)
+
+
+def throughput(ser, count: int, window: int):
+    """Payload bytes/s with `window` pings in flight; returns (bytes_per_s, answered)."""
+    sent = answered = payload = 0
+    outstanding = []
+    t0 = time.perf_counter()
+    while answered < count:
+        while sent < count and len(outstanding) < window:
+            req = f"{link.CMD_PING},{100000 + sent};".encode()
+            ser.write(req)
+            payload += len(req)
+            outstanding.append(f"P{100000 + sent}")
+            sent += 1
+        reply = link.read_reply(ser, 1.0)
+        if reply is None:
+            break
+        if reply in outstanding:
+            outstanding.remove(reply)
+            payload += len(reply) + 2  # CRLF
+            answered += 1
+    return payload / (time.perf_counter() - t0), answered
+
+
+def telemetry_rate(ser, seconds: float) -> float:
+    ser.reset_input_buffer()
+    total = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        total += len(ser.read(ser.in_waiting or 1))
+    return total / (time.perf_counter() - t0)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", default=link.SERIAL_PORT)
+    parser.add_argument("--baud", type=int, action="append", dest="bauds",
+                        help="rate to test (repeatable); default: base rate and all candidates")
+    parser.add_argument("--count", type=int, default=200, help="pings per measurement")
+    parser.add_argument("--window", type=int, default=4, help="pipelined pings for the throughput run")
+    parser.add_argument("--telemetry-s", type=float, default=2.0)
+    args = parser.parse_args(argv)
+    bauds = args.bauds or [link.BASE_BAUD, *sorted(link.CANDIDATE_BAUDS)]
+
+    ser = serial.Serial(args.port, link.BASE_BAUD, timeout=0.05)
+    time.sleep(2)  # board reset on open
+    print(f"{'baud':>9}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'lost':>6}{'payload B/s':>13}{'wire B/s':>10}"
+          f"{'telemetry B/s':>15}")
+    try:
+        for baud in bauds:
+            if baud != link.BASE_BAUD and not link.switch_baud(ser, baud):
+                print(f"{baud:>9}  refused or failed verification")
+                continue
+            rtts, lost = latency(ser, args.count)
+            rate, answered = throughput(ser, args.count, args.window)
+            telemetry = telemetry_rate(ser, args.telemetry_s)
+            if rtts:
+                p95 = rtts[min(len(rtts) - 1, int(0.95 * len(rtts)))]
+                print(f"{baud:>9}{statistics.median(rtts) * 1000:>9.2f}{p95 * 1000:>9.2f}{rtts[-1] * 1000:>9.2f}"
+                      f"{lost + args.count - answered:>6}{rate:>13.0f}{baud / 10:>10.0f}{telemetry:>15.0f}")
+            else:
+                print(f"{baud:>9}  no replies")
+            if baud != link.BASE_BAUD:
+                # back to the base rate for the next switch (falls back on its own if this fails)
+                link.switch_baud(ser, link.BASE_BAUD)
+    finally:
+        ser.close()
+
+
+if __name__ == "__main__":
+    main()
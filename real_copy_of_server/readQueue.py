@@ -1,22 +1,25 @@
 # readQueue.py
-import serial
 import threading
 import time
 import subprocess
 from collections import deque
 import logging
 from serial.serialutil import SerialException
+from link import SERIAL_PORT, current_baud, is_url, open_serial
+import hwdaemon
 
 logger = logging.getLogger("readQueue")
 logging.basicConfig(level=logging.DEBUG)
 
-SERIAL_PORT = '/dev/cu.usbmodem101'
-BAUD_RATE = 9600
 MAX_RECENT = 10
 OPEN_RETRY_DELAY = 1.0  # seconds to wait before trying to reopen after error
 
 _recent_lock = threading.Lock()
-_recent_values = {}           # internal only
+_recent_values = {}           # internal only: id -> deque of (value, wall-clock receive time)
+_new_sample = threading.Condition(_recent_lock)  # notified on every stored sample
+_stream_config = {}           # id -> {"period_ms", "enabled", "deadband", "keyframe_ms"}, as last set on the device
+_ingest_stats = {}            # id -> {"packets": received, "held": samples reconstructed by hold}
+_sample_listeners = []        # called with (id, value, time) for every received packet (hwdaemon's ring)
 _stop_event = threading.Event()
 _reader_thread = None
 
@@ -30,9 +33,12 @@ def _who_holds_port(port):
         return None
 
 def _process_raw(raw: str):
-    """Parse 'id,value' into (int, value). Defensive - leaves value as str if not numeric."""
-    parts = raw.split(',', 1)
-    if len(parts) != 2:
+    """
+    Parse 'id,value' into (int, value). Defensive - leaves value as str if not numeric.
+    A third field (the Pi driver's sample time in ms) is accepted and ignored.
+    """
+    parts = raw.split(',', 2)
+    if len(parts) < 2:
         raise ValueError("no comma in packet")
     id_s, val_s = parts[0].strip(), parts[1].strip()
     id_int = int(id_s)
@@ -46,8 +52,8 @@ def _process_raw(raw: str):
     return id_int, val
 
 def _open_serial():
-    """Try to open serial port once and return Serial or raise."""
-    return serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=0.5)
+    """Try to open serial port once (at the negotiated link rate) and return Serial or raise."""
+    return open_serial(timeout=0.5)
 
 def _reader_loop():
     logger.info("Serial reader loop starting (port=%s)", SERIAL_PORT)
@@ -56,7 +62,7 @@ def _reader_loop():
         try:
             try:
                 ser = _open_serial()
-                logger.info("Opened serial port %s @ %d", SERIAL_PORT, BAUD_RATE)
+                logger.info("Opened serial port %s @ %d", SERIAL_PORT, current_baud())
             except SerialException as e:
                 msg = str(e)
                 logger.warning("Could not open serial port: %s", msg)
@@ -92,14 +98,10 @@ def _reader_loop():
                     if not raw:
                         continue
                     try:
-                        id_int, value = _process_raw(raw)
-                        with _recent_lock:
-                            if id_int not in _recent_values:
-                                _recent_values[id_int] = deque(maxlen=MAX_RECENT)
-                            _recent_values[id_int].append(value)
-                        logger.debug("Got id=%s value=%s", id_int, value)
+                        if not ingest_packet(raw):
+                            logger.warning("Failed to parse '%s'", raw)
                     except Exception as e:
-                        logger.warning("Failed to parse '%s': %s", raw, e)
+                        logger.warning("Failed to store '%s': %s", raw, e)
 
         except Exception:
             logger.exception("Unhandled exception in serial reader loop")
@@ -114,16 +116,109 @@ def _reader_loop():
 
     logger.info("Serial reader loop exiting (stop event set)")
 
+def ingest_packet(raw):
+    """
+    Store one telemetry packet ("id,value[,t]", without its terminator) and
+    notify waiters and sample listeners. Returns False, storing nothing, when
+    `raw` is not a telemetry packet (e.g. a reply line); sendQueue uses this
+    to split its connection's input into replies and telemetry.
+    """
+    try:
+        id_int, value = _process_raw(raw)
+    except ValueError:
+        return False
+    now = time.time()
+    with _recent_lock:
+        _store(id_int, value, now)
+        _new_sample.notify_all()
+    for listener in _sample_listeners:
+        listener(id_int, value, now)
+    logger.debug("Got id=%s value=%s", id_int, value)
+    return True
+
+def _ring_loop():
+    """Client of hwdaemon: follow its telemetry ring instead of reading the port."""
+    ring = None
+    while not _stop_event.is_set():
+        if ring is None:
+            try:
+                ring = hwdaemon.attach_ring()
+                logger.info("Following telemetry ring %r", hwdaemon.RING_NAME)
+            except FileNotFoundError:
+                logger.warning("Telemetry ring %r not found (is hwdaemon running?)", hwdaemon.RING_NAME)
+                time.sleep(OPEN_RETRY_DELAY)
+                continue
+        samples = list(ring.read_new())
+        if not samples:
+            time.sleep(hwdaemon.RING_POLL_INTERVAL)
+            continue
+        with _recent_lock:
+            for id_int, value, t in samples:
+                _store(id_int, value, t)
+            _new_sample.notify_all()
+    if ring is not None:
+        ring.close()
+
+def _holds(cfg):
+    """True when a stream only sends changes (deadband mode) and gaps mean "value unchanged"."""
+    return bool(cfg and cfg["enabled"] and cfg.get("deadband") and cfg["period_ms"])
+
+def _held_samples(last, cfg, until):
+    """
+    Samples the device skipped after `last` (value, time) because the value
+    stayed within the deadband: the held value at every stream period up to
+    `until`, but never beyond one keyframe interval (a longer silence is a
+    lost link, not a steady value). At most MAX_RECENT, newest kept.
+    """
+    value, t = last
+    period = cfg["period_ms"] / 1000.0
+    until = min(until, t + (cfg.get("keyframe_ms") or 0) / 1000.0 + period / 2)
+    n = int((until - t) / period - 0.5)
+    first = max(1, n - MAX_RECENT + 1)
+    return [(value, t + k * period) for k in range(first, n + 1)]
+
+def _store(id_int, value, now):
+    """Append a received sample (caller holds _recent_lock), reconstructing held samples before it."""
+    dq = _recent_values.get(id_int)
+    if dq is None:
+        dq = _recent_values[id_int] = deque(maxlen=MAX_RECENT)
+    stats = _ingest_stats.setdefault(id_int, {"packets": 0, "held": 0})
+    cfg = _stream_config.get(id_int)
+    if dq and _holds(cfg):
+        held = _held_samples(dq[-1], cfg, now)
+        dq.extend(held)
+        stats["held"] += len(held)
+    dq.append((value, now))
+    stats["packets"] += 1
+
 def start_read_queue():
+    """
+    Start following telemetry: hwdaemon's ring in client mode, or a connection
+    of our own to a URL port (sendQueue's is unsubscribed from telemetry). A
+    serial port is opened once per process, by sendQueue, whose processor
+    hands the telemetry it reads to ingest_packet(); a second handle here
+    would race it for the same bytes.
+    """
     global _reader_thread
     if _reader_thread and _reader_thread.is_alive():
         logger.info("Serial reader already running")
         return
+    if hwdaemon.client_mode():
+        target = _ring_loop
+    elif is_url():
+        target = _reader_loop
+    else:
+        logger.info("Telemetry from %s is read on sendQueue's connection", SERIAL_PORT)
+        return
     _stop_event.clear()
-    _reader_thread = threading.Thread(target=_reader_loop, name="serial-read-thread", daemon=True)
+    _reader_thread = threading.Thread(target=target, name="serial-read-thread", daemon=True)
     _reader_thread.start()
     logger.info("Started serial reader thread")
 
+def add_sample_listener(listener):
+    """Call listener(id, value, time) for every packet read from the port (reader thread)."""
+    _sample_listeners.append(listener)
+
 def stop_read_queue():
     _stop_event.set()
     if _reader_thread:
@@ -131,6 +226,81 @@ def stop_read_queue():
 
 def get_recent_values(id_int):
     """Return a copy of recent values for id_int (most-recent last)."""
+    return [v for v, _ in get_recent_samples(id_int)]
+
+def get_recent_samples(id_int):
+    """
+    Return a copy of recent (value, timestamp) pairs for id_int (most-recent last).
+    For a deadband stream the last value is held up to now, so the series is
+    continuous between change packets.
+    """
+    now = time.time()
+    with _recent_lock:
+        dq = _recent_values.get(id_int)
+        if dq is None:
+            return []
+        samples = list(dq)
+        cfg = _stream_config.get(id_int)
+        if samples and _holds(cfg):
+            samples.extend(_held_samples(samples[-1], cfg, now + cfg["period_ms"] / 2000.0))
+        return samples[-MAX_RECENT:]
+
+def set_stream_config(id_int, period_ms=None, enabled=None, deadband=None, keyframe_ms=None):
+    """Record the streaming period / enabled state / deadband / keyframe interval last sent to the device."""
+    with _recent_lock:
+        cfg = _stream_config.setdefault(
+            id_int, {"period_ms": None, "enabled": True, "deadband": 0, "keyframe_ms": None})
+        if period_ms is not None:
+            cfg["period_ms"] = period_ms
+        if enabled is not None:
+            cfg["enabled"] = enabled
+        if deadband is not None:
+            cfg["deadband"] = deadband
+        if keyframe_ms is not None:
+            cfg["keyframe_ms"] = keyframe_ms
+
+def get_ingest_stats():
+    """Per id: packets received and samples reconstructed by hold (deadband streams)."""
+    with _recent_lock:
+        return {id_int: dict(stats) for id_int, stats in _ingest_stats.items()}
+
+def get_stream_config(id_int):
+    """Configured {"period_ms", "enabled", "deadband", "keyframe_ms"} for id_int, or None if never set."""
+    with _recent_lock:
+        cfg = _stream_config.get(id_int)
+        return dict(cfg) if cfg is not None else None
+
+def is_stale(id_int, now=None):
+    """
+    True when id_int has no sample, its stream is paused, or the newest packet
+    is older than two configured periods (i.e. at least one packet was missed)
+    - or, for a deadband stream, older than its keyframe interval plus that.
+    Streams without a configured period are never considered stale.
+    """
+    now = time.time() if now is None else now
     with _recent_lock:
         dq = _recent_values.get(id_int)
-        return list(dq) if dq is not None else []
+        cfg = _stream_config.get(id_int)
+        if not dq:
+            return True
+        if cfg is None or cfg["period_ms"] is None:
+            return False
+        if not cfg["enabled"]:
+            return True
+        allowed = 2 * cfg["period_ms"] / 1000.0
+        if _holds(cfg):
+            allowed += (cfg["keyframe_ms"] or 0) / 1000.0
+        return now - dq[-1][1] > allowed
+
+def wait_for_sample(id_int, after, timeout):
+    """Block until a sample of id_int newer than `after` (epoch seconds) arrives; returns it or None."""
+    deadline = time.monotonic() + timeout
+    with _new_sample:
+        while True:
+            dq = _recent_values.get(id_int)
+            if dq and dq[-1][1] > after:
+                return dq[-1]
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            _new_sample.wait(remaining)
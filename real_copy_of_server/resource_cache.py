@@ -0,0 +1,95 @@
+# resource_cache.py
+"""
+Read-through cache with per-resource freshness bounds and single-flight.
+
+Several chat sessions reading the same sensor at the same moment should cost
+one read and one conversion, not one each:
+- a value younger than the resource's `max_age` is served from the cache;
+- concurrent reads of a stale/missing entry share one in-flight computation.
+
+Every read reports where its value came from ("fresh", "cache" or "shared")
+and how old it is, so callers can mark cached results.
+"""
+
+import asyncio
+import functools
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+FRESH = "fresh"      # computed for this call
+CACHED = "cache"     # served from a previous computation within max_age
+SHARED = "shared"    # joined a computation another caller had already started
+
+
+class ResourceCache:
+    def __init__(self):
+        self._entries: Dict[str, Tuple[Any, float]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"fresh": 0, "cache": 0, "shared": 0}
+
+    async def read(self, key: str, max_age: float, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, str, float]:
+        """Return (value, source, age_seconds) for `key`."""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and now - entry[1] <= max_age:
+            self.stats[CACHED] += 1
+            return entry[0], CACHED, now - entry[1]
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats[SHARED] += 1
+            value, stamp = await asyncio.shield(pending)
+            return value, SHARED, time.monotonic() - stamp
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+            stamp = time.monotonic()
+            self._entries[key] = (value, stamp)
+            future.set_result((value, stamp))
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved; waiters still see it
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self.stats[FRESH] += 1
+        return value, FRESH, 0.0
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+
+# Process-wide cache shared by all resource handlers
+resource_cache = ResourceCache()
+
+
+def cached_resource(key: str, max_age: float, cache: ResourceCache = resource_cache):
+    """
+    Decorate a resource implementation with the read-through cache. Values
+    that did not come from a fresh read are marked: structured readings get
+    `cached_ms` and their `staleness_s` advanced by the cache age, strings get a
+    " [cached <age> ms]" suffix. functools.wraps keeps the signature FastMCP
+    inspects (e.g. the Context parameter).
+    """
+    def decorator(impl: Callable[..., Awaitable[Any]]):
+        @functools.wraps(impl)
+        async def wrapper(*args, **kwargs):
+            value, source, age = await cache.read(key, max_age, lambda: impl(*args, **kwargs))
+            if source == FRESH:
+                return value
+            if isinstance(value, dict):
+                marked = dict(value, cached_ms=round(age * 1000, 1))
+                if value.get("staleness_s") is not None:
+                    marked["staleness_s"] = round(value["staleness_s"] + age, 3)
+                return marked
+            return f"{value} [cached {age * 1000:.0f} ms]"
+        return wrapper
+    return decorator
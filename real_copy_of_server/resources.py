@@ -1,60 +1,48 @@
 # resources.py
+import asyncio
 import uuid
 import time
 from typing import Dict, Any
 from fastmcp import FastMCP, Context
-from readQueue import get_recent_values
+from readQueue import get_recent_samples, wait_for_sample
+from resource_cache import cached_resource
+from sampling import sampling
+from schemas import Reading, make_reading
 import logging
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.DEBUG)
 
-# --- Resource implementations (not decorated) ---
+READ_NOW_TIMEOUT = 0.3  # seconds a read waits for an on-demand reading when its data is stale
+
 
-async def ir_distance_impl(context: Context) -> str:
-    """Get reading from Sharp GP2Y0A21YK0F IR distance sensor (returns cm)."""
-    # pull recent values (implementation of get_recent_values is in readQueue)
-    logger.info("Fetching recent values for IR sensor")
-    values = get_recent_values(40)
-    logger.info(values)
-    if not values:
-        return "No value"
+async def _samples(telemetry_id: int):
+    """Recent samples of a stream, after marking it as read (see sampling.py)."""
+    requested_at = time.time()
+    if sampling.on_read(telemetry_id):
+        await asyncio.to_thread(wait_for_sample, telemetry_id, requested_at, READ_NOW_TIMEOUT)
+    return get_recent_samples(telemetry_id)
 
-    # take last up to 10 values and average them
-    last_10 = values[-10:] if len(values) >= 10 else values
-    try:
-        # convert readings to float and average
-        avg = sum(float(v) for v in last_10) / len(last_10)
-        return f"{avg:.2f} cm"
-    except Exception:
-        return "Invalid value(s)"
 
+# --- Resource implementations (not decorated) ---
+# Each returns a structured Reading (see schemas.READING_SCHEMA), served as JSON.
 
-async def temp_lm35_impl(context: Context) -> str:
-    """Get reading from LM35 temperature sensor (returns °C)."""
-    values = get_recent_values(50)
-    if not values:
-        return "No value"
+async def ir_distance_impl(context: Context) -> Reading:
+    """Get reading from Sharp GP2Y0A21YK0F IR distance sensor (cm)."""
+    # pull recent samples (implementation of get_recent_samples is in readQueue)
+    samples = await _samples(40)
+    logger.debug("IR samples: %s", samples)
+    # average of the last up to 10 values
+    return make_reading("ir_distance", "cm", samples, window=10)
 
-    last_5 = values[-5:] if len(values) >= 5 else values
-    try:
-        avg = sum(float(v) for v in last_5) / len(last_5)
-        return f"{avg:.2f} °C"
-    except Exception:
-        return "Invalid value(s)"
 
+async def temp_lm35_impl(context: Context) -> Reading:
+    """Get reading from LM35 temperature sensor (°C)."""
+    return make_reading("temp_lm35", "°C", await _samples(50), window=5)
 
-async def ultrasonic_hcsr04_impl(context: Context) -> str:
-    """Get reading from HC-SR04 ultrasonic sensor (returns cm)."""
-    values = get_recent_values(60)
-    if not values:
-        return "No value"
 
-    last_8 = values[-8:] if len(values) >= 8 else values
-    try:
-        avg = sum(float(v) for v in last_8) / len(last_8)
-        return f"{avg:.2f} cm"
-    except Exception:
-        return "Invalid value(s)"
+async def ultrasonic_hcsr04_impl(context: Context) -> Reading:
+    """Get reading from HC-SR04 ultrasonic sensor (cm)."""
+    return make_reading("ultrasonic_distance", "cm", await _samples(60), window=8)
 
 
 # --- Registry of all resources with their hardware dependency ---
@@ -63,19 +51,33 @@ RESOURCE_SPECS = [
         "name": "ir_distance",
         "uri": "sensor://ir/GP2Y0A21YK0F",
         "impl": ir_distance_impl,
-        "hardware": "IR-GP2Y0A21YK0F",
+        "hardware": "IR_GP2Y0A21YK0F",  # partId, as in boards.ts / firmware.FIRMWARE_PARTS
+        "max_age": 0.1,  # seconds a cached reading stays fresh
+        "telemetry_id": 40,
+        "active_period_ms": 100,  # stream period while the resource is being read
+        "idle_period_ms": 1000,   # after sampling.idle_after s without reads; None pauses the stream
+        "deadband": 1.0,          # cm; only changes beyond it are sent (omit for every sample)
     },
     {
         "name": "temp_lm35",
         "uri": "sensor://temp/LM35",
         "impl": temp_lm35_impl,
         "hardware": "LM35",
+        "max_age": 2.0,
+        "telemetry_id": 50,
+        "active_period_ms": 500,
+        "idle_period_ms": 5000,
+        "deadband": 0.25,  # °C
     },
     {
         "name": "ultrasonic_distance",
         "uri": "sensor://ultrasonic/HC-SR04",
         "impl": ultrasonic_hcsr04_impl,
-        "hardware": "HC-SR04",
+        "hardware": "hcsr04",
+        "max_age": 0.1,
+        "telemetry_id": 60,
+        "active_period_ms": 100,
+        "idle_period_ms": 1000,
     },
 ]
 
@@ -83,9 +85,16 @@ RESOURCE_SPECS = [
 # --- Registration function ---
 
 def register_resources(mcp: FastMCP, available_hardware: set[str]):
-    """Enable/disable resources based on available_hardware and register them with the MCP server."""
+    """Enable/disable resources based on available_hardware and register them with the MCP server.
+    Each implementation is wrapped in the read-through cache with its spec's max_age,
+    and enabled sensors get demand-driven stream rates (sampling.py)."""
     for spec in RESOURCE_SPECS:
         enabled = spec["hardware"] in available_hardware
+        if enabled:
+            sampling.register(spec["telemetry_id"], spec["active_period_ms"], spec["idle_period_ms"],
+                              deadband=spec.get("deadband"))
+        impl = cached_resource(spec["name"], spec.get("max_age", 0.0))(spec["impl"])
         # register the resource with the MCP; mcp.resource returns a decorator
-        mcp.resource(spec["uri"], enabled=enabled)(spec["impl"])
-        print(f"Registered resource {spec['name']} uri={spec['uri']} enabled={enabled}")
+        mcp.resource(spec["uri"], mime_type="application/json", enabled=enabled)(impl)
+        print(f"Registered resource {spec['name']} uri={spec['uri']} enabled={enabled} max_age={spec.get('max_age', 0.0)}s")
+    sampling.start()
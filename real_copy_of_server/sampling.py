@@ -0,0 +1,202 @@
+# sampling.py
+"""
+Demand-driven telemetry rates.
+
+The board streams every sensor at a fixed default period whether anyone
+reads it or not. SamplingController raises a sensor's stream to its active
+period while it has readers, and throttles it back to its idle period (or
+pauses it) once nobody has read it for `idle_after` seconds, which leaves
+the serial link free for commands. It uses the sampling commands of the
+device protocol (generated firmware and boilerplate/driver.py):
+
+  10,<id>,<ms>;  set the period and resume     11,<id>;  pause
+  12,<id>;       resume                        13,<id>;  one reading now
+  14,<id>,<deadband x100>;  only send moves beyond the deadband
+  15,<id>,<ms>;  keyframe: resend an unchanged value at least this often
+
+A read that finds the sensor's data stale for its configured rate also asks
+for one reading on demand, so the first answer after a quiet period is
+current rather than an idle-rate leftover.
+
+Sensors registered with a deadband are switched to change-only telemetry;
+readQueue rebuilds the held samples between change packets.
+
+With a hardware daemon (hwdaemon.py), the daemon runs the only controller and
+MCP processes forward registrations and reads to it (DaemonSampling), so one
+process going idle cannot throttle a stream another process is reading.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import hwdaemon
+import readQueue
+from sendQueue import add_command_to_queue
+
+logger = logging.getLogger("sampling")
+
+CMD_STREAM_PERIOD = 10
+CMD_STREAM_PAUSE = 11
+CMD_STREAM_RESUME = 12
+CMD_READ_NOW = 13
+CMD_STREAM_DEADBAND = 14
+CMD_STREAM_KEYFRAME = 15
+DEFAULT_KEYFRAME_MS = 5000
+
+
+class SamplingController:
+    def __init__(
+        self,
+        idle_after: float = 10.0,
+        check_interval: float = 1.0,
+        send: Callable[[dict], None] = add_command_to_queue,
+    ):
+        self.idle_after = idle_after
+        self.check_interval = check_interval
+        self._send = send
+        self._rates: Dict[int, Tuple[int, Optional[int]]] = {}  # id -> (active ms, idle ms; None = pause)
+        self._deadbands: Dict[int, Tuple[float, int]] = {}       # id -> (deadband, keyframe ms)
+        self._last_read: Dict[int, float] = {}
+        self._active: set = set()
+        self._configured: set = set()  # ids whose deadband and idle rate were sent by start()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"activations": 0, "throttles": 0, "read_now": 0}
+
+    def register(
+        self,
+        telemetry_id: int,
+        active_ms: int,
+        idle_ms: Optional[int],
+        deadband: Optional[float] = None,
+        keyframe_ms: int = DEFAULT_KEYFRAME_MS,
+    ) -> None:
+        """`deadband` (in the sensor's unit) opts the stream into change-only telemetry."""
+        self._rates[telemetry_id] = (active_ms, idle_ms)
+        if deadband:
+            self._deadbands[telemetry_id] = (deadband, keyframe_ms)
+
+    def start(self) -> None:
+        """
+        Configure deadbands, put every newly registered stream at its idle
+        rate and start the idle watcher. Called again after more streams are
+        registered (mappings changed), it only configures the new ones.
+        """
+        with self._lock:
+            new = [tid for tid in self._rates if tid not in self._configured]
+            self._configured.update(new)
+        for telemetry_id in new:
+            if telemetry_id in self._deadbands:
+                deadband, keyframe_ms = self._deadbands[telemetry_id]
+                self._send({"command": CMD_STREAM_KEYFRAME, "value": f"{telemetry_id},{keyframe_ms}"})
+                self._send({"command": CMD_STREAM_DEADBAND, "value": f"{telemetry_id},{round(deadband * 100)}"})
+                readQueue.set_stream_config(telemetry_id, deadband=deadband, keyframe_ms=keyframe_ms)
+            self._apply(telemetry_id, active=False)
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._idle_loop, name="sampling-idle", daemon=True)
+            self._thread.start()
+
+    def on_read(self, telemetry_id: int) -> bool:
+        """
+        Note a reader of `telemetry_id`, raising its stream to the active rate
+        if it was idle. Returns True when a reading was requested on demand;
+        the caller can then wait for it with readQueue.wait_for_sample().
+        """
+        if telemetry_id not in self._rates:
+            return False
+        with self._lock:
+            self._last_read[telemetry_id] = time.monotonic()
+            activate = telemetry_id not in self._active
+            self._active.add(telemetry_id)
+        if activate:
+            self.stats["activations"] += 1
+            self._apply(telemetry_id, active=True)
+        if readQueue.is_stale(telemetry_id):
+            self.stats["read_now"] += 1
+            self._send({"command": CMD_READ_NOW, "value": telemetry_id})
+            return True
+        return False
+
+    def on_client_read(self, telemetry_id: int):
+        """on_read() for a hwdaemon client, with the stream's config for the client's readQueue."""
+        return self.on_read(telemetry_id), readQueue.get_stream_config(telemetry_id)
+
+    def _apply(self, telemetry_id: int, active: bool) -> None:
+        active_ms, idle_ms = self._rates[telemetry_id]
+        period = active_ms if active else idle_ms
+        if period is None:
+            self._send({"command": CMD_STREAM_PAUSE, "value": telemetry_id})
+            readQueue.set_stream_config(telemetry_id, enabled=False)
+        else:
+            self._send({"command": CMD_STREAM_PERIOD, "value": f"{telemetry_id},{period}"})
+            readQueue.set_stream_config(telemetry_id, period_ms=period, enabled=True)
+        logger.debug("Stream %s -> %s", telemetry_id, f"{period} ms" if period is not None else "paused")
+
+    def _idle_loop(self) -> None:
+        while True:
+            time.sleep(self.check_interval)
+            now = time.monotonic()
+            with self._lock:
+                idle = [tid for tid in self._active if now - self._last_read.get(tid, 0.0) >= self.idle_after]
+                self._active.difference_update(idle)
+            for telemetry_id in idle:
+                self.stats["throttles"] += 1
+                self._apply(telemetry_id, active=False)
+
+
+class DaemonSampling:
+    """
+    SamplingController stand-in for a hwdaemon client: the daemon's controller
+    decides the rates. Registrations are kept here too and replayed whenever
+    the connection to the daemon is (re)made, e.g. after a daemon restart.
+    """
+
+    def __init__(self):
+        self._remote = None
+        self._specs: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _controller(self):
+        with self._lock:
+            if self._remote is None:
+                remote = hwdaemon.connect().sampling()
+                for spec in self._specs.values():
+                    remote.register(*spec)
+                remote.start()
+                self._remote = remote
+            return self._remote
+
+    def _call(self, what: str, fn):
+        try:
+            return fn(self._controller())
+        except Exception as e:
+            logger.warning("Hardware daemon unavailable (%s): %s", what, e)
+            with self._lock:
+                self._remote = None
+            return None
+
+    def register(self, telemetry_id: int, active_ms: int, idle_ms: Optional[int],
+                 deadband: Optional[float] = None, keyframe_ms: int = DEFAULT_KEYFRAME_MS) -> None:
+        spec = (telemetry_id, active_ms, idle_ms, deadband, keyframe_ms)
+        with self._lock:
+            self._specs[telemetry_id] = spec
+        self._call("register", lambda remote: remote.register(*spec))
+
+    def start(self) -> None:
+        self._call("start", lambda remote: remote.start())
+
+    def on_read(self, telemetry_id: int) -> bool:
+        result = self._call(f"read {telemetry_id}", lambda remote: remote.on_client_read(telemetry_id))
+        if result is None:
+            return False
+        requested, config = result
+        if config:
+            # the ring carries raw packets; holds and staleness need the rate the daemon set
+            readQueue.set_stream_config(telemetry_id, **config)
+        return requested
+
+
+# Process-wide controller used by the resource handlers
+sampling = DaemonSampling() if hwdaemon.client_mode() else SamplingController()
@@ -0,0 +1,74 @@
+# schemas.py
+"""
+Structured result types shared by the MCP tools/resources and their consumers.
+
+Tools declare these TypedDicts as return annotations, so FastMCP publishes
+them as the tool's output schema and returns them as structured content.
+Resources have no output-schema field in MCP; they are served as
+application/json documents following READING_SCHEMA.
+"""
+
+import time
+from typing import List, Optional
+
+from typing_extensions import TypedDict
+
+
+class Reading(TypedDict, total=False):
+    sensor: str                 # resource name, e.g. "temp_lm35"
+    value: Optional[float]      # averaged reading; None when there is no sample
+    unit: str                   # "cm", "°C", ...
+    samples: int                # readings averaged into `value`
+    timestamp: Optional[float]  # wall-clock time of the newest sample (epoch seconds)
+    staleness_s: Optional[float]  # age of the newest sample when the reading was taken
+    cached_ms: float            # set when the reading was served from the resource cache
+    error: str
+
+
+class CommandResult(TypedDict, total=False):
+    ok: bool
+    message: str
+    response: Optional[str]     # raw ACK from the board, None on timeout
+    warning: str
+    error: str
+    position: int               # servo only
+
+
+READING_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sensor": {"type": "string"},
+        "value": {"type": ["number", "null"]},
+        "unit": {"type": "string"},
+        "samples": {"type": "integer", "minimum": 0},
+        "timestamp": {"type": ["number", "null"]},
+        "staleness_s": {"type": ["number", "null"]},
+        "cached_ms": {"type": "number"},
+        "error": {"type": "string"},
+    },
+    "required": ["sensor", "value", "unit", "samples"],
+}
+
+
+def make_reading(sensor: str, unit: str, samples: List[tuple], window: int) -> Reading:
+    """
+    Average the newest `window` of (value, timestamp) samples into a Reading.
+    Non-numeric samples make the reading an error rather than a wrong number.
+    """
+    recent = samples[-window:]
+    if not recent:
+        return {"sensor": sensor, "value": None, "unit": unit, "samples": 0, "timestamp": None, "staleness_s": None}
+    newest = recent[-1][1]
+    reading: Reading = {
+        "sensor": sensor,
+        "unit": unit,
+        "samples": len(recent),
+        "timestamp": newest,
+        "staleness_s": round(max(0.0, time.time() - newest), 3),
+    }
+    try:
+        reading["value"] = round(sum(float(v) for v, _ in recent) / len(recent), 2)
+    except (TypeError, ValueError):
+        reading["value"] = None
+        reading["error"] = "invalid value(s)"
+    return reading
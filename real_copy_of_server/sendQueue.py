@@ -1,41 +1,98 @@
 # sendQueue.py
-import serial
 import threading
 import time
+from multiprocessing import AuthenticationError
 from queue import Queue, Empty
 from config import DEVICE_TYPE
+from link import SERIAL_PORT, current_baud, open_serial
+import hwdaemon
+import readQueue
 
 # Command queue and response storage
 send_queue = Queue()
 responses = {}
 _serial = None
 _serial_lock = threading.Lock()
-SERIAL_PORT = '/dev/cu.usbmodem101'  # <-- set this to the working port you found
-BAUD_RATE = 9600
+_response_listeners = []  # called with (command, response) after each command (hwdaemon's reply routing)
+_daemon = None            # hwdaemon.DaemonClient when HW_DAEMON is set
+_daemon_lock = threading.Lock()
+_rx = bytearray()         # bytes read from the port, not yet split into packets / lines (processor thread)
+_last_open_attempt = 0.0
 PROCESSOR_STARTED = False
+REPLY_TIMEOUT = 1.0             # seconds to wait for a command's reply line
+TELEMETRY_POLL_INTERVAL = 0.01  # seconds between reads of streamed telemetry while no command is queued
+OPEN_RETRY_DELAY = 1.0          # seconds between attempts to reopen a lost port while idle
+
+def _daemon_client():
+    global _daemon
+    with _daemon_lock:
+        if _daemon is None:
+            try:
+                _daemon = hwdaemon.DaemonClient(on_reply=responses.__setitem__)
+                print(f"[sendQueue] Connected to hardware daemon as {_daemon.client_id}")
+            except (OSError, AuthenticationError) as e:
+                print(f"[sendQueue] Hardware daemon not reachable at {hwdaemon.ADDRESS}: {e}")
+        return _daemon
+
+def _read_available(s, wait):
+    """
+    Read what the port has (with `wait`, blocking up to its timeout for the
+    first byte), hand telemetry packets to readQueue and return the reply
+    lines, in order. The board interleaves "<id>,<value>;" telemetry with
+    its reply lines ("A", "E", "P<nonce>", ...), so everything read on this
+    connection goes through here.
+    """
+    n = s.in_waiting
+    if not n and not wait:
+        return []
+    _rx.extend(s.read(max(1, n)))
+    lines = []
+    while True:
+        # packets end with ';', lines with '\n'
+        ends = [i for i in (_rx.find(b';'), _rx.find(b'\n')) if i >= 0]
+        if not ends:
+            return lines
+        pos = min(ends)
+        raw = bytes(_rx[:pos]).decode("utf-8", errors="replace").strip()
+        del _rx[:pos + 1]
+        if raw and not readQueue.ingest_packet(raw):
+            lines.append(raw)
+
+def _read_reply(s, timeout):
+    """The next reply line (telemetry read meanwhile goes to readQueue); None on timeout."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        lines = _read_available(s, wait=True)
+        if lines:
+            for extra in lines[1:]:
+                print(f"[sendQueue] Unexpected line after reply: {extra}")
+            return lines[0]
+    return None
 
 def _open_serial_once():
-    global _serial
+    global _serial, _last_open_attempt
     with _serial_lock:
         if _serial is not None and _serial.is_open:
             return _serial
+        _last_open_attempt = time.monotonic()
         try:
-            print(f"[sendQueue] Opening serial port {SERIAL_PORT} @ {BAUD_RATE}")
-            _serial = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
-            # give Arduino time to reset and boot
-            time.sleep(2)
-            print("[sendQueue] Serial port opened")
+            print(f"[sendQueue] Opening serial port {SERIAL_PORT}")
+            # give Arduino time to reset and boot, then negotiate the baud rate (see link.py);
+            # on a socket connection to the Pi driver, only replies are wanted here
+            _serial = open_serial(timeout=1, settle=2, telemetry=False)
+            _rx.clear()
+            print(f"[sendQueue] Serial port opened @ {current_baud()}")
             # optionally read initial lines until READY or timeout
             start = time.time()
             while time.time() - start < 3:
                 try:
-                    line = _serial.readline().decode("utf-8", errors="ignore").strip()
+                    lines = _read_available(_serial, wait=True)
                 except Exception:
-                    line = ""
-                if line:
+                    lines = []
+                for line in lines:
                     print(f"[sendQueue] Serial initial line: {line}")
-                    if "READY" in line:
-                        break
+                if any("READY" in line for line in lines):
+                    break
             return _serial
         except Exception as e:
             print(f"[sendQueue] Failed to open serial port: {e}")
@@ -43,10 +100,21 @@ def _open_serial_once():
             return None
 
 def add_command_to_queue(command):
-    """Add a command to the send queue."""
-    send_queue.put(command)
+    """Add a command to the send queue (the hardware daemon's, when HW_DAEMON is set)."""
+    if hwdaemon.client_mode():
+        client = _daemon_client()
+        if client is None:
+            print(f"[sendQueue] Dropped command (no hardware daemon): {command}")
+            return
+        client.send(command)
+    else:
+        send_queue.put(command)
     print(f"[sendQueue] Added command to queue: {command}")
 
+def add_response_listener(listener):
+    """Call listener(command, response) after each command is processed."""
+    _response_listeners.append(listener)
+
 def get_last_response(key):
     """Get the last response for a given key."""
     return responses.get(key)
@@ -57,26 +125,50 @@ def _send_via_serial(cmd_str):
         print("[sendQueue] No serial connection available to send")
         return None
     try:
+        # a reply that arrived after its command timed out must not answer this one
+        for line in _read_available(s, wait=False):
+            print(f"[sendQueue] Unsolicited line: {line}")
         # ensure newline terminator for Arduino parsing & flush
         if not cmd_str.endswith("\n"):
             cmd_str = cmd_str + "\n"
         print(f"[sendQueue] Writing to serial: {cmd_str.strip()}")
         s.write(cmd_str.encode())
         s.flush()
-        # small delay to let Arduino respond
-        time.sleep(0.05)
-        try:
-            resp = s.readline().decode("utf-8", errors="ignore").strip()
-        except Exception:
-            resp = ""
+        resp = _read_reply(s, REPLY_TIMEOUT)
         if resp:
             print(f"[sendQueue] Read from serial: {resp}")
             return resp
         return "OK"
     except Exception as e:
         print(f"[sendQueue] Error writing to serial: {e}")
+        _close_serial()
         return None
 
+def _close_serial():
+    """Drop a failed connection; it is reopened for the next command or telemetry poll."""
+    global _serial
+    with _serial_lock:
+        if _serial is not None:
+            try:
+                _serial.close()
+            except Exception:
+                pass
+        _serial = None
+
+def _poll_telemetry():
+    """While no command is queued, keep reading streamed telemetry off the port."""
+    s = _serial
+    if s is None or not s.is_open:
+        if time.monotonic() - _last_open_attempt >= OPEN_RETRY_DELAY:
+            _open_serial_once()
+        return
+    try:
+        for line in _read_available(s, wait=False):
+            print(f"[sendQueue] Unsolicited line: {line}")
+    except Exception as e:
+        print(f"[sendQueue] Error reading serial: {e}")
+        _close_serial()
+
 def _process_loop():
     global PROCESSOR_STARTED
     PROCESSOR_STARTED = True
@@ -84,9 +176,9 @@ def _process_loop():
     _open_serial_once()
     while True:
         try:
-            command = send_queue.get(timeout=0.5)
+            command = send_queue.get(timeout=TELEMETRY_POLL_INTERVAL)
         except Empty:
-            time.sleep(0.01)
+            _poll_telemetry()
             continue
 
         try:
@@ -99,6 +191,8 @@ def _process_loop():
             key = command.get("response_key")
             if key:
                 responses[key] = resp
+            for listener in _response_listeners:
+                listener(command, resp)
 
             print(f"[sendQueue] Processed command -> response: {resp}")
         except Exception as e:
@@ -113,6 +207,11 @@ def start_send_queue_processor():
     if PROCESSOR_STARTED:
         print("[sendQueue] Processor already started")
         return
+    if hwdaemon.client_mode():
+        # the daemon owns the port; just make sure its reply queue is connected
+        PROCESSOR_STARTED = True
+        _daemon_client()
+        return
     processor_thread = threading.Thread(target=_process_loop, daemon=True)
     processor_thread.start()
     print("[sendQueue] Queue processor thread started")
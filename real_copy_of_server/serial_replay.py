@@ -0,0 +1,310 @@
+# serial_replay.py
+"""
+Replay a serial capture (capture.py, recorded with SERIAL_CAPTURE=<path>)
+through the real readQueue and sendQueue.
+
+Each captured connection is replaced by a scripted port: telemetry channels
+deliver their captured RX bytes to readQueue's reader loop, and the captured
+commands are re-queued on sendQueue at their original times, with the
+commands channel answering each write with the reply captured after it.
+Replies are never delivered before the write they answered. --speed sets the
+pace: 1 = real time, N = N times faster, 0 = as fast as the code consumes it.
+
+Reports telemetry throughput and command latency. The deterministic part
+(packets per id, last values, replies in order) can be saved once with --save
+and checked on later runs with --expect, which turns a production capture
+into a regression test.
+
+    SERIAL_CAPTURE=/tmp/session.cap python server.py      # record
+    python serial_replay.py /tmp/session.cap --speed 0    # replay
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import re
+import statistics
+import sys
+import threading
+import time
+from typing import Dict
+
+from capture import OPEN, RX, TX, read_capture
+from link import _TELEMETRY
+
+POLL_INTERVAL = 0.0005  # seconds a scripted port waits between availability checks
+_FRAME_END = re.compile(rb"[;\n]")
+_PACKET = re.compile(rb"\s*\d+,")
+
+
+class ReplaySerial:
+    """A port that plays back one captured channel's RX bytes."""
+
+    def __init__(self, records, clock):
+        self._clock = clock
+        self._rx = []  # (due time, writes needed, data)
+        writes = 0
+        for r in records:
+            if r.kind == TX:
+                writes += 1
+            elif r.kind == RX:
+                self._rx.append((r.t, writes, r.data))
+        self._next = 0
+        self._buffer = bytearray()
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.timeout = 0.5
+        self.baudrate = 0
+        self.is_open = True
+        self.drained = threading.Event()
+        if not self._rx:
+            self.drained.set()
+
+    def _release(self) -> None:
+        """Move the RX records that are due (and whose writes happened) into the buffer."""
+        now = self._clock.now()
+        while self._next < len(self._rx):
+            due, writes, data = self._rx[self._next]
+            if due > now or writes > self._writes:
+                break
+            self._buffer.extend(data)
+            self._next += 1
+
+    def _take(self, size, line=False) -> bytes:
+        deadline = time.monotonic() + (self.timeout or 0)
+        while True:
+            with self._lock:
+                self._release()
+                end = self._buffer.find(b"\n") + 1 if line else 0
+                if line and end == 0 and len(self._buffer) >= size:
+                    end = size
+                if not line and self._buffer:
+                    end = min(size, len(self._buffer))
+                if end:
+                    data = bytes(self._buffer[:end])
+                    del self._buffer[:end]
+                    if not self._buffer and self._next == len(self._rx):
+                        self.drained.set()
+                    return data
+            if time.monotonic() >= deadline:
+                return b""
+            time.sleep(POLL_INTERVAL)
+
+    def read(self, size=1) -> bytes:
+        return self._take(size)
+
+    def readline(self, size=65536) -> bytes:
+        return self._take(size, line=True)
+
+    def write(self, data) -> int:
+        with self._lock:
+            self._writes += 1
+        return len(data)
+
+    @property
+    def in_waiting(self) -> int:
+        with self._lock:
+            self._release()
+            return len(self._buffer)
+
+    def reset_input_buffer(self) -> None:
+        with self._lock:
+            self._buffer.clear()
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.is_open = False
+
+
+class ReplayClock:
+    """Capture time as seen by the replay: scaled by `speed`, or always "done" at speed 0."""
+
+    def __init__(self, speed: float):
+        self.speed = speed
+        self._start = None
+
+    def start(self) -> None:
+        self._start = time.monotonic()
+
+    def now(self) -> float:
+        if self._start is None:
+            return -1.0
+        if self.speed <= 0:
+            return float("inf")
+        return (time.monotonic() - self._start) * self.speed
+
+    def wait_until(self, t: float) -> None:
+        if self.speed > 0:
+            delay = self._start + t / self.speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def load(path: str):
+    """Records per channel and each channel's label."""
+    channels: Dict[int, list] = {}
+    labels: Dict[int, str] = {}
+    for record in read_capture(path):
+        if record.kind == OPEN:
+            labels[record.channel] = record.data.decode()
+            channels[record.channel] = []
+        else:
+            channels.setdefault(record.channel, []).append(record)
+    return channels, labels
+
+
+def parse_command(raw: bytes):
+    """A captured "<command>,<value>;" write as a sendQueue command dict."""
+    text = raw.decode("utf-8", errors="replace").strip().rstrip(";")
+    command, _, value = text.partition(",")
+    return {"command": int(command), "value": value}
+
+
+def captured_replies(records):
+    """The reply line the board sent after each write of a commands channel (telemetry removed)."""
+    replies = []
+    rx = None
+    for r in records + [None]:
+        if r is None or r.kind == TX:
+            if rx is not None:
+                lines = _TELEMETRY.sub(b"", rx).decode("utf-8", errors="replace").splitlines()
+                replies.append(next((line.strip() for line in lines if line.strip()), None))
+            rx = b""
+        elif r.kind == RX and rx is not None:
+            rx += r.data
+    return replies
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else float("nan")
+
+
+def replay(path: str, speed: float, timeout: float):
+    channels, labels = load(path)
+    clock = ReplayClock(speed)
+    ports = {label: [ReplaySerial(channels[ch], clock) for ch in sorted(channels) if labels.get(ch) == label]
+             for label in ("telemetry", "commands")}
+    captured_commands = [(r.t, parse_command(r.data)) for ch in sorted(channels) if labels.get(ch) == "commands"
+                         for r in channels[ch] if r.kind == TX]
+    replies = [reply for ch in sorted(channels) if labels.get(ch) == "commands"
+               for reply in captured_replies(channels[ch])]
+    # telemetry packets on any channel: a serial port's one connection carries replies and telemetry
+    packets = {ch: sum(1 for f in _FRAME_END.split(b"".join(r.data for r in channels[ch] if r.kind == RX))
+                       if _PACKET.match(f))
+               for ch in channels}
+    frames = sum(packets.values())
+    commands_carry_telemetry = any(packets[ch] for ch in channels if labels.get(ch) == "commands")
+
+    def opener(label):
+        def open_serial(timeout, settle=0.0, telemetry=True):
+            if not ports[label]:
+                raise OSError(f"no more captured {label} connections")
+            port = ports[label].pop(0)
+            port.timeout = timeout
+            opened[label].append(port)
+            return port
+        return open_serial
+
+    opened = {"telemetry": [], "commands": []}
+    logging.disable(logging.CRITICAL)
+    import readQueue
+    import sendQueue
+    readQueue.open_serial = opener("telemetry")
+    readQueue.is_url = lambda: True  # a captured telemetry channel was a connection of its own
+    sendQueue.open_serial = opener("commands")
+
+    answered_at = {}
+    sendQueue.add_response_listener(
+        lambda command, response: answered_at.setdefault(command.get("response_key"), time.perf_counter()))
+
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        if captured_commands:
+            sendQueue.start_send_queue_processor()
+            while sendQueue._serial is None:
+                time.sleep(0.01)
+            with sendQueue._serial_lock:  # past its start-up read
+                pass
+        clock.start()
+        wall0 = time.perf_counter()
+        if ports["telemetry"]:
+            readQueue.start_read_queue()
+
+        sent_at = {}
+        for i, (t, command) in enumerate(captured_commands):
+            clock.wait_until(t)
+            key = f"replay_{i}"
+            sent_at[key] = time.perf_counter()
+            sendQueue.add_command_to_queue(dict(command, response_key=key))
+
+        deadline = time.monotonic() + timeout
+        telemetry_s = None
+        while time.monotonic() < deadline:
+            telemetry_ports = opened["telemetry"] + (opened["commands"] if commands_carry_telemetry else [])
+            if telemetry_s is None and not ports["telemetry"] and all(p.drained.is_set() for p in telemetry_ports):
+                telemetry_s = time.perf_counter() - wall0
+            if len(answered_at) == len(sent_at) and telemetry_s is not None:
+                break
+            time.sleep(0.001)
+        wall = time.perf_counter() - wall0
+        readQueue.stop_read_queue()
+
+    latencies = sorted(answered_at[k] - sent_at[k] for k in answered_at)
+    stats = readQueue.get_ingest_stats()
+    summary = {
+        "packets": {str(i): s["packets"] for i, s in sorted(stats.items())},
+        "last_values": {str(i): readQueue._recent_values[i][-1][0] for i in sorted(stats)},
+        "replies": [sendQueue.get_last_response(f"replay_{i}") for i in range(len(captured_commands))],
+    }
+    timing = {
+        "wall_s": wall,
+        "telemetry_s": telemetry_s or wall,
+        "frames": frames,
+        "stored": sum(s["packets"] for s in stats.values()),
+        "commands": len(captured_commands),
+        "answered": len(answered_at),
+        "latencies": latencies,
+        "captured_replies": replies,
+    }
+    return summary, timing
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = real time, N = N x, 0 = as fast as possible")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for the replay to drain")
+    parser.add_argument("--save", help="write the deterministic summary (JSON) here")
+    parser.add_argument("--expect", help="compare the summary with one saved by --save; exit 1 on a difference")
+    args = parser.parse_args(argv)
+
+    summary, timing = replay(args.capture, args.speed, args.timeout)
+    wall = timing["wall_s"]
+    print(f"replayed {args.capture} at {'max' if args.speed <= 0 else f'{args.speed:g}x'} speed in {wall:.3f}s")
+    print(f"telemetry: {timing['frames']} frames captured, {timing['stored']} stored in "
+          f"{timing['telemetry_s']:.3f}s ({timing['stored'] / timing['telemetry_s']:.0f} packets/s)")
+    lat = timing["latencies"]
+    if timing["commands"]:
+        print(f"commands:  {timing['answered']}/{timing['commands']} answered, latency p50 "
+              f"{statistics.median(lat) * 1000 if lat else float('nan'):.1f} ms, p95 {percentile(lat, 0.95) * 1000:.1f} ms")
+        if summary["replies"] != timing["captured_replies"][:len(summary["replies"])]:
+            print("commands:  replies differ from the captured ones")
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(summary, f, indent=2)
+    if args.expect:
+        with open(args.expect) as f:
+            expected = json.load(f)
+        if json.loads(json.dumps(summary)) != expected:
+            print(f"FAILED: summary differs from {args.expect}")
+            return 1
+        print(f"ok: summary matches {args.expect}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
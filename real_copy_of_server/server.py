@@ -5,6 +5,7 @@ from resources import register_resources
 from tools import register_tools
 from prompts import register_prompts
 from sendQueue import start_send_queue_processor
+from readQueue import start_read_queue
 import json
 import os
 import threading
@@ -74,16 +75,16 @@ def setup_server() -> FastMCP:
     #     print(f"Error clearing mappings: {e}")
     
     # Register static handlers first
-    #register_resources(mcp)
     register_prompts(mcp)
     
-    # Dynamic tool registration - will be updated when mappings change
+    # Dynamic tool and resource registration - will be updated when mappings change
     def register_dynamic_tools():
         print("DEBUG: register_dynamic_tools() called")
         available_hardware = get_available_hardware()
         print(f"DEBUG: Available hardware result: {available_hardware}")
         register_tools(mcp, available_hardware)
-        print("DEBUG: register_tools() completed")
+        register_resources(mcp, available_hardware)
+        print("DEBUG: register_tools() / register_resources() completed")
     
     # Initial tool registration
     register_dynamic_tools()
@@ -99,6 +100,7 @@ def setup_server() -> FastMCP:
     print("Started mappings file watcher...")
     
     start_send_queue_processor()
+    start_read_queue()
     
     return mcp
 
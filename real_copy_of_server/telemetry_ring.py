@@ -0,0 +1,115 @@
+# telemetry_ring.py
+"""
+Telemetry ring in shared memory: one writer (the hardware daemon), any number
+of reader processes.
+
+Layout (little-endian), in a multiprocessing.shared_memory block:
+
+  header  magic u32 | version u32 | slots u32 | pad u32 | head u64 | pad
+  slot i  seq u64 | telemetry id i32 | flags i32 | value f64 | time f64
+
+`head` counts the records ever written; record n lives in slot n % slots and
+carries seq = n + 1. The writer clears a slot's seq, fills it, then sets seq
+and advances head, so a reader that sees the expected seq before and after
+unpacking has a whole record (a seqlock per slot). Readers unpack straight
+from the shared buffer and keep their own position; a reader that falls more
+than `slots` records behind skips what was overwritten and counts it as lost.
+"""
+
+import struct
+from multiprocessing import resource_tracker, shared_memory
+from typing import Iterator, Tuple
+
+MAGIC = 0x54454C52  # "TELR"
+VERSION = 1
+HEADER = struct.Struct("<IIIIQ")
+HEADER_SIZE = 32
+HEAD = struct.Struct("<Q")
+HEAD_OFFSET = 16
+SLOT = struct.Struct("<Qiidd")  # seq, id, flags, value, time
+SLOT_SIZE = 32
+SEQ = struct.Struct("<Q")
+FLAG_INT = 1  # the value was an integer on the wire
+DEFAULT_SLOTS = 4096
+
+
+class TelemetryRing:
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self._shm = shm
+        self._buf = shm.buf
+        self._owner = owner
+        magic, version, self.slots, _, head = HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"shared memory {shm.name!r} is not a telemetry ring")
+        self._head = head  # writer: records written; reader: next record to read
+        self.lost = 0
+
+    @classmethod
+    def create(cls, name: str, slots: int = DEFAULT_SLOTS) -> "TelemetryRing":
+        """Create (or take over a stale) ring; the creator is the only writer."""
+        size = HEADER_SIZE + slots * SLOT_SIZE
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm.buf[:size] = bytes(size)
+        HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, slots, 0, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str, history: bool = True) -> "TelemetryRing":
+        """
+        Open an existing ring for reading. With `history`, the first read
+        returns what is still in the ring; otherwise only newer records.
+        """
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+            # a reader must not unlink the daemon's block when it exits
+            resource_tracker.unregister(shm._name, "shared_memory")
+        ring = cls(shm, owner=False)
+        head = ring._read_head()
+        ring._head = max(0, head - ring.slots) if history else head
+        return ring
+
+    def _read_head(self) -> int:
+        return HEAD.unpack_from(self._buf, HEAD_OFFSET)[0]
+
+    def publish(self, telemetry_id: int, value, t: float) -> bool:
+        """Append one sample (writer only). Non-numeric values are not published."""
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return False
+        n = self._head
+        offset = HEADER_SIZE + (n % self.slots) * SLOT_SIZE
+        SEQ.pack_into(self._buf, offset, 0)
+        SLOT.pack_into(self._buf, offset, 0, telemetry_id, FLAG_INT if isinstance(value, int) else 0, value, t)
+        SEQ.pack_into(self._buf, offset, n + 1)
+        self._head = n + 1
+        HEAD.pack_into(self._buf, HEAD_OFFSET, self._head)
+        return True
+
+    def read_new(self) -> Iterator[Tuple[int, object, float]]:
+        """(telemetry id, value, time) of every record published since the last call."""
+        head = self._read_head()
+        if head - self._head > self.slots:
+            self.lost += head - self._head - self.slots
+            self._head = head - self.slots
+        while self._head < head:
+            n = self._head
+            offset = HEADER_SIZE + (n % self.slots) * SLOT_SIZE
+            seq, telemetry_id, flags, value, t = SLOT.unpack_from(self._buf, offset)
+            self._head = n + 1
+            if seq != n + 1 or SEQ.unpack_from(self._buf, offset)[0] != n + 1:
+                self.lost += 1  # overwritten while we read it
+                continue
+            yield telemetry_id, (int(value) if flags & FLAG_INT else value), t
+
+    def close(self) -> None:
+        self._buf = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
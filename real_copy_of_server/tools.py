@@ -1,16 +1,18 @@
 # tools.py
 from fastmcp import FastMCP, Context
-from typing import Dict, Any
 from sendQueue import add_command_to_queue, responses
+from schemas import CommandResult
 import asyncio
 import uuid
 
 # --- Tool implementations (not decorated) ---
+# The CommandResult return annotation becomes each tool's output schema.
 
 
-async def piezo_beep_impl(context, duration: int = 500):
+async def piezo_beep_impl(context, duration: int = 500) -> CommandResult:
+    """Beep the piezo buzzer for `duration` milliseconds."""
     if duration <= 0:
-        return {"error": "duration must be > 0"}
+        return {"ok": False, "error": "duration must be > 0"}
     response_key = f"beep_{uuid.uuid4().hex[:8]}"
     command = {"command": 2, "value": duration, "response_key": response_key}
     add_command_to_queue(command)
@@ -20,16 +22,17 @@ async def piezo_beep_impl(context, duration: int = 500):
     while (asyncio.get_event_loop().time() - start) < timeout:
         resp = responses.get(response_key)
         if resp is not None:
-            return {"message": f"Sent beep for {duration}ms", "response": resp}
+            return {"ok": True, "message": f"Sent beep for {duration}ms", "response": resp}
         await asyncio.sleep(0.05)
 
-    return {"message": f"Sent beep for {duration}ms", "response": None, "warning": "no response from Arduino (timeout)"}
+    return {"ok": True, "message": f"Sent beep for {duration}ms", "response": None,
+            "warning": "no response from Arduino (timeout)"}
 
 
-async def control_servo_impl(context: Context, position: int) -> Dict[str, Any]:
+async def control_servo_impl(context: Context, position: int) -> CommandResult:
     """Control servo motor position - position in degrees (0-180)."""
     if not 0 <= position <= 180:
-        return {"error": "Position must be between 0 and 180 degrees"}
+        return {"ok": False, "error": "Position must be between 0 and 180 degrees"}
     servo_command_id = 20
     response_key = f"servo_{uuid.uuid4().hex[:8]}"
     command = {"command": servo_command_id, "value": position, "response_key": response_key}
@@ -40,10 +43,11 @@ async def control_servo_impl(context: Context, position: int) -> Dict[str, Any]:
     while (asyncio.get_event_loop().time() - start) < timeout:
         resp = responses.get(response_key)
         if resp is not None:
-            return {"message": f"Servo set to {position} degrees", "position": position, "response": resp}
+            return {"ok": True, "message": f"Servo set to {position} degrees", "position": position, "response": resp}
         await asyncio.sleep(0.05)
 
     return {
+        "ok": True,
         "message": f"Servo set to {position} degrees",
         "position": position,
         "response": None,